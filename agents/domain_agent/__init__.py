@@ -2,18 +2,24 @@
 Domain Agent 包
 提供域名查询和状态检测功能
 """
-from .domain_agent import DomainAgent
-from .domain_tools import (
-    batch_get_domains_info_sync,
-    batch_check_domains_status_sync,
-    get_batch_domains_info_schema,
-    get_batch_domains_status_schema
-)
+import importlib
 
-__all__ = [
-    'DomainAgent',
-    'batch_get_domains_info_sync',
-    'batch_check_domains_status_sync', 
-    'get_batch_domains_info_schema',
-    'get_batch_domains_status_schema'
-]
\ No newline at end of file
+# 包内对象在首次访问时才导入，避免仅使用域名工具时也导入autogen
+_EXPORTS = {
+    'DomainAgent': '.domain_agent',
+    'batch_get_domains_info_sync': '.domain_tools',
+    'batch_check_domains_status_sync': '.domain_tools',
+    'bulk_process_domains_file_sync': '.domain_bulk',
+    'process_domains_file': '.domain_bulk',
+    'get_batch_domains_info_schema': '.domain_tools',
+    'get_batch_domains_status_schema': '.domain_tools',
+    'get_bulk_domains_schema': '.domain_bulk'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
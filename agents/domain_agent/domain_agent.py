@@ -4,11 +4,10 @@
 """
 from autogen import AssistantAgent
 from .domain_tools import (
-    batch_get_domains_info_sync, 
-    batch_check_domains_status_sync,
     get_batch_domains_info_schema,
     get_batch_domains_status_schema
 )
+from .domain_bulk import get_bulk_domains_schema
 
 
 class DomainAgent:
@@ -16,10 +15,14 @@ class DomainAgent:
     
     def __init__(self, llm_config: dict):
         """初始化Domain Agent"""
+        # 延迟导入，避免工具注册表导入工具模块时形成循环导入
+        from mcp.tools_registry import tools_registry
+        
         self.llm_config = llm_config.copy()
         self.llm_config["functions"] = [
             get_batch_domains_info_schema(),
-            get_batch_domains_status_schema()
+            get_batch_domains_status_schema(),
+            get_bulk_domains_schema()
         ]
         
         self.agent = AssistantAgent(
@@ -31,17 +34,20 @@ class DomainAgent:
 4. 用专业、准确的中文回复查询结果
 5. 支持批量处理，可以同时处理多个域名
 6. 如果域名格式不正确，请提醒用户输入正确的域名格式
-7. 专注于域名相关的问题，其他问题请转交给相关专家
+7. 当用户提供包含大量域名的文件路径时，使用bulk_process_domains_file函数批量处理并告知结果文件位置
+8. 专注于域名相关的问题，其他问题请转交给相关专家
 
 支持的功能：
 - 批量查询域名基础信息（状态、负责人、项目、组织等）
 - 批量检测域名可用性状态（是否可申请）
+- 从文件批量处理大量域名，结果写入JSONL/CSV文件
 - 域名格式验证和建议
 - 域名管理相关咨询""",
             llm_config=self.llm_config,
             function_map={
-                "batch_get_domains_info": batch_get_domains_info_sync,
-                "batch_check_domains_status": batch_check_domains_status_sync
+                "batch_get_domains_info": tools_registry.get_llm_tool_function("domain_info"),
+                "batch_check_domains_status": tools_registry.get_llm_tool_function("domain_status"),
+                "bulk_process_domains_file": tools_registry.get_llm_tool_function("domain_bulk")
             }
         )
     
@@ -59,6 +65,7 @@ class DomainAgent:
             "批量域名基础信息查询",
             "批量域名状态检测",
             "域名可用性分析",
+            "域名文件批量处理",
             "域名管理信息查询",
             "域名格式验证",
             "域名负责人和项目信息查询"
@@ -0,0 +1,361 @@
+"""
+域名批量处理模块
+从文件逐行读取域名，分块并发查询基础信息或检测状态，结果逐批追加写入JSONL/CSV文件，
+每批写入后保存检查点，中断后可从检查点继续
+"""
+import asyncio
+import csv
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterator, List
+
+from common.async_runner import async_runner
+from common.config import config
+from common.paths import resolve_in_directory
+from common.rate_limiter import AdaptiveRateLimiter
+from .domain_tools import (
+    DOMAIN_INFO_FIELDS,
+    DOMAIN_STATUS_FIELDS,
+    DomainAPIClient,
+    _check_domain_status,
+    _describe_error,
+    _domain_key,
+    _fetch_domains_info_chunk,
+    _parse_domain_list
+)
+
+# info：查询域名基础信息（domainsInfo），status：检测域名状态（domainCheck）
+BULK_MODES = ("info", "status")
+
+BULK_FILE_FORMATS = ("jsonl", "csv")
+
+BULK_COLUMNS = {
+    "info": DOMAIN_INFO_FIELDS + ("error",),
+    "status": DOMAIN_STATUS_FIELDS + ("error",)
+}
+
+# 检查点文件名为结果文件名加此后缀
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+
+class BulkProgress:
+    """批量处理进度"""
+    
+    def __init__(self, total: int, skipped: int = 0, succeeded: int = 0, failed: int = 0):
+        """skipped为续跑时跳过的域名数，succeeded和failed包含检查点中已记录的数量"""
+        self.total = total
+        self.skipped = skipped
+        self.succeeded = succeeded
+        self.failed = failed
+        self.started_at = time.monotonic()
+    
+    @property
+    def processed(self) -> int:
+        """已处理的域名数（含续跑时跳过的）"""
+        return self.succeeded + self.failed
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典，速率只统计本次处理的域名"""
+        elapsed = time.monotonic() - self.started_at
+        done = self.processed - self.skipped
+        return {
+            "total": self.total,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "percent": round(self.processed / self.total * 100, 1) if self.total else 100.0,
+            "elapsed_s": round(elapsed, 2),
+            "rate_per_s": round(done / elapsed, 1) if elapsed > 0 else None
+        }
+
+
+def iter_domains(path: str) -> Iterator[str]:
+    """逐行读取域名文件（每行可含多个逗号分隔的域名，#开头的行为注释），按规范形式去重"""
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.lstrip().startswith("#"):
+                continue
+            for domain in _parse_domain_list(line):
+                key = _domain_key(domain)
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+
+def _iter_windows(domains: Iterator[str], size: int) -> Iterator[List[str]]:
+    """将域名流切分为固定大小的批次"""
+    window = []
+    for domain in domains:
+        window.append(domain)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def default_output_path(input_path: str, mode: str, file_format: str = "jsonl") -> str:
+    """默认结果文件路径：输入文件名加模式和格式后缀"""
+    return f"{input_path}.{mode}.{file_format}"
+
+
+def _resolve_file_format(output_path: str, file_format: str = None) -> str:
+    """确定结果文件格式，未指定时按扩展名判断，默认为jsonl"""
+    if not file_format:
+        file_format = "csv" if output_path.lower().endswith(".csv") else "jsonl"
+    if file_format not in BULK_FILE_FORMATS:
+        raise ValueError(f"不支持的结果文件格式: {file_format}，可选: {', '.join(BULK_FILE_FORMATS)}")
+    return file_format
+
+
+def _input_signature(input_path: str) -> Dict[str, Any]:
+    """输入文件的路径、大小和修改时间，记录在检查点中，文件被修改后不再从检查点继续"""
+    stat = os.stat(input_path)
+    return {"input": os.path.abspath(input_path), "input_size": stat.st_size, "input_mtime": stat.st_mtime_ns}
+
+
+def _read_checkpoint(checkpoint_path: str) -> Dict[str, Any]:
+    """读取检查点文件，不存在或不是检查点时返回None"""
+    try:
+        with open(checkpoint_path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(checkpoint, dict) or not {"input", "mode", "offset"} <= checkpoint.keys():
+        return None
+    return checkpoint
+
+
+def _load_checkpoint(checkpoint_path: str, input_path: str, mode: str) -> Dict[str, Any]:
+    """读取与本次输入文件（路径、大小和修改时间）和模式一致的检查点，不存在或不一致时返回None"""
+    checkpoint = _read_checkpoint(checkpoint_path)
+    if checkpoint is None or checkpoint.get("mode") != mode:
+        return None
+    if any(checkpoint.get(key) != value for key, value in _input_signature(input_path).items()):
+        return None
+    return checkpoint
+
+
+def _is_bulk_output(path: str) -> bool:
+    """判断已有文件是否为空文件或本工具写入的结果文件（CSV表头为结果列，JSONL首行为含domain的对象）"""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        first_line = f.readline().strip()
+    if not first_line:
+        return True
+    if first_line.split(",") in [list(columns) for columns in BULK_COLUMNS.values()]:
+        return True
+    try:
+        row = json.loads(first_line)
+    except ValueError:
+        return False
+    return isinstance(row, dict) and "domain" in row
+
+
+def _check_overwrite(input_path: str, output_path: str, checkpoint_path: str):
+    """只允许覆盖本工具的结果文件和检查点，避免截断输入文件或其他文件"""
+    if os.path.realpath(output_path) == os.path.realpath(input_path):
+        raise ValueError(f"结果文件不能与域名文件相同: {output_path}")
+    if os.path.exists(checkpoint_path) and _read_checkpoint(checkpoint_path) is None:
+        raise ValueError(f"拒绝覆盖不是检查点的文件: {checkpoint_path}")
+    if os.path.exists(output_path) and not _is_bulk_output(output_path):
+        raise ValueError(f"拒绝覆盖不是批量处理结果的文件: {output_path}")
+
+
+def _save_checkpoint(checkpoint_path: str, checkpoint: Dict[str, Any]):
+    """原子地保存检查点"""
+    temp_path = checkpoint_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(temp_path, checkpoint_path)
+
+
+class _ResultWriter:
+    """结果文件写入器，以追加方式逐批写入JSONL或CSV"""
+    
+    def __init__(self, path: str, file_format: str, columns: tuple, offset: int = None):
+        """offset为检查点记录的文件长度，续跑时截断其后未被检查点确认的内容；为None时重新写入"""
+        self.path = path
+        self.file_format = file_format
+        self.columns = columns
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if offset is None:
+            self.file = open(path, "w", encoding="utf-8", newline="")
+        else:
+            with open(path, "ab") as f:
+                f.truncate(offset)
+            self.file = open(path, "a", encoding="utf-8", newline="")
+        self._csv = csv.DictWriter(self.file, fieldnames=columns, extrasaction="ignore") if file_format == "csv" else None
+        if self._csv and offset is None:
+            self._csv.writeheader()
+    
+    def write(self, rows: List[Dict[str, Any]]) -> int:
+        """写入一批记录并刷新到磁盘，返回写入后的文件长度"""
+        for row in rows:
+            row = {column: row.get(column) for column in self.columns if row.get(column) not in (None, "")}
+            if self._csv:
+                self._csv.writerow(row)
+            else:
+                self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return os.path.getsize(self.path)
+    
+    def close(self):
+        """关闭文件"""
+        self.file.close()
+
+
+async def _process_info_window(client: DomainAPIClient, window: List[str], chunk_size: int,
+                               semaphore: asyncio.Semaphore) -> List[Dict[str, Any]]:
+    """分块并发查询一批域名的基础信息，按输入顺序返回每个域名一条记录"""
+    async def fetch_chunk(chunk: List[str]) -> Dict[str, Dict]:
+        async with semaphore:
+            return await _fetch_domains_info_chunk(client, chunk)
+    
+    chunks = [window[i:i + chunk_size] for i in range(0, len(window), chunk_size)]
+    chunk_results = await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks), return_exceptions=True)
+    rows = []
+    for chunk, chunk_result in zip(chunks, chunk_results):
+        for domain in chunk:
+            if isinstance(chunk_result, Exception):
+                rows.append({"domain": domain, "error": _describe_error(chunk_result)})
+            elif domain in chunk_result:
+                rows.append({**chunk_result[domain], "domain": domain})
+            else:
+                rows.append({"domain": domain, "error": "未找到域名信息"})
+    return rows
+
+
+async def process_domains_file(input_path: str, mode: str = "info", output_path: str = None,
+                               file_format: str = None, resume: bool = True,
+                               progress: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+    """批量处理域名文件，返回处理汇总
+    
+    域名按DOMAIN_BULK_WINDOW个一批处理：info模式每批按DOMAIN_INFO_CHUNK_SIZE分块并发查询，
+    status模式每批逐个并发检测并共享限流器。每批结果写入后保存检查点并调用progress；
+    resume为True且检查点与输入文件、模式一致时跳过已处理的域名继续写入，全部完成后删除检查点。
+    批量处理不经过单域名信息缓存，避免大批量数据挤出对话中查询的缓存条目。
+    """
+    if mode not in BULK_MODES:
+        raise ValueError(f"不支持的处理模式: {mode}，可选: {', '.join(BULK_MODES)}")
+    output_path = output_path or default_output_path(input_path, mode, file_format or "jsonl")
+    file_format = _resolve_file_format(output_path, file_format)
+    checkpoint_path = output_path + CHECKPOINT_SUFFIX
+    _check_overwrite(input_path, output_path, checkpoint_path)
+    
+    checkpoint = _load_checkpoint(checkpoint_path, input_path, mode) if resume else None
+    if checkpoint and not os.path.exists(output_path):
+        checkpoint = None
+    total = sum(1 for _ in iter_domains(input_path))
+    state = BulkProgress(
+        total,
+        skipped=checkpoint["processed"] if checkpoint else 0,
+        succeeded=checkpoint["succeeded"] if checkpoint else 0,
+        failed=checkpoint["failed"] if checkpoint else 0
+    )
+    
+    domain_config = config.get_domain_config()
+    client = DomainAPIClient()
+    semaphore = asyncio.Semaphore(domain_config["check_concurrency"])
+    limiter = AdaptiveRateLimiter(domain_config["check_rate"])
+    
+    domains = iter_domains(input_path)
+    for _ in range(state.skipped):
+        next(domains, None)
+    
+    signature = _input_signature(input_path)
+    writer = _ResultWriter(output_path, file_format, BULK_COLUMNS[mode], checkpoint["offset"] if checkpoint else None)
+    try:
+        if checkpoint is None:
+            # 新的处理从空文件开始，先记录表头之后的位置
+            _save_checkpoint(checkpoint_path, {
+                **signature, "mode": mode, "processed": 0,
+                "succeeded": 0, "failed": 0, "offset": writer.write([])
+            })
+        for window in _iter_windows(domains, domain_config["bulk_window"]):
+            if mode == "info":
+                rows = await _process_info_window(client, window, domain_config["info_chunk_size"], semaphore)
+            else:
+                rows = await asyncio.gather(
+                    *(_check_domain_status(client, domain, semaphore, limiter) for domain in window)
+                )
+            
+            failed = sum(1 for row in rows if row.get("error"))
+            state.failed += failed
+            state.succeeded += len(rows) - failed
+            offset = writer.write(rows)
+            _save_checkpoint(checkpoint_path, {
+                **signature, "mode": mode, "processed": state.processed,
+                "succeeded": state.succeeded, "failed": state.failed, "offset": offset
+            })
+            if progress:
+                progress(state.to_dict())
+    finally:
+        writer.close()
+    
+    os.remove(checkpoint_path)
+    return {**state.to_dict(), "mode": mode, "input": input_path, "output": output_path, "file_format": file_format}
+
+
+def format_bulk_summary(summary: Dict[str, Any]) -> str:
+    """格式化批量处理汇总"""
+    resumed = f"（从检查点继续，跳过 {summary['skipped']} 个）" if summary["skipped"] else ""
+    return (
+        f"域名批量处理完成: 模式 {summary['mode']}，共 {summary['total']} 个域名{resumed}，"
+        f"成功 {summary['succeeded']}，失败 {summary['failed']}，耗时 {summary['elapsed_s']}s，"
+        f"结果已写入 {summary['output']}"
+    )
+
+
+def bulk_process_domains_file_sync(path: str, mode: str = "info", output: str = "", resume: bool = True) -> str:
+    """同步版本的域名文件批量处理，返回处理汇总而非全部结果
+    
+    路径由LLM或HTTP请求给出，输入和结果文件都必须位于DOMAIN_BULK_DIR内（相对路径相对于该目录）。
+    """
+    try:
+        domain_config = config.get_domain_config()
+        input_path = resolve_in_directory(path, domain_config["bulk_dir"])
+        output_path = resolve_in_directory(output, domain_config["bulk_dir"]) if output else None
+        # 大文件处理时间远超单次工具调用的超时，使用单独的超时
+        summary = async_runner.run(
+            process_domains_file(input_path, mode, output_path, resume=resume),
+            timeout=domain_config["bulk_timeout"]
+        )
+        return format_bulk_summary(summary)
+    except FileNotFoundError:
+        return f"错误: 域名文件不存在: {path}"
+    except asyncio.TimeoutError:
+        return f"错误: 域名批量处理超时，重新调用可从检查点继续: {path}"
+    except Exception as e:
+        return f"错误: 域名批量处理失败: {str(e)}"
+
+
+def get_bulk_domains_schema() -> Dict[str, Any]:
+    """获取域名文件批量处理工具的schema定义"""
+    return {
+        "name": "bulk_process_domains_file",
+        "description": "从文件批量查询域名基础信息或检测域名状态（适用于成千上万个域名），结果写入JSONL/CSV文件，返回处理汇总",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "域名文件路径（相对于批量处理目录），每行一个或多个逗号分隔的域名"
+                },
+                "mode": {
+                    "type": "string",
+                    "enum": list(BULK_MODES),
+                    "description": "info为查询基础信息，status为检测是否可申请，默认info"
+                },
+                "output": {
+                    "type": "string",
+                    "description": "可选，结果文件路径（相对于批量处理目录），以.csv结尾时写入CSV，否则写入JSONL；默认写在域名文件旁"
+                }
+            },
+            "required": ["path"]
+        }
+    }
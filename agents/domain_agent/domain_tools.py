@@ -3,11 +3,52 @@
 提供域名基础信息查询和状态检测功能
 """
 import hashlib
-import httpx
 import asyncio
 import time
 from typing import Dict, Any, List
 
+from common.async_runner import async_runner
+from common.cache import TTLCache, MISSING
+from common.config import config
+from common.http_client import http_client_pool
+from common.rate_limiter import AdaptiveRateLimiter, is_retryable_status, parse_retry_after
+from common.tool_output import check_output_format, parse_fields, render
+
+# 部分分块查询失败时结果以此开头，成功的域名已按域名缓存，整体结果不缓存，下次调用只补查失败的域名
+DOMAIN_INFO_PARTIAL_PREFIX = "部分域名查询失败"
+
+# 查询失败时返回结果的前缀，这类结果不应被缓存
+DOMAIN_INFO_ERROR_PREFIXES = (
+    "错误", "查询失败", "未找到域名信息", "域名信息查询失败", "域名信息查询错误", DOMAIN_INFO_PARTIAL_PREFIX
+)
+
+# 紧凑/JSON输出可选的域名信息字段，fields参数从中选取
+DOMAIN_INFO_FIELDS = (
+    "domain", "status", "status_desc", "service_type", "network", "primary", "app_env",
+    "project_name", "project_id", "owner", "manage_name", "manage_erp", "org_fullname", "remark"
+)
+
+# 紧凑/JSON输出的域名状态字段
+DOMAIN_STATUS_FIELDS = ("domain", "status", "available", "msg")
+
+DOMAIN_STATUS_DESCRIPTIONS = {
+    -1: "可申请 ✅",
+    1: "DNS已解析 🔗", 
+    2: "商家域名 🏪",
+    3: "NP系统预留 🔒"
+}
+
+# 单个域名的信息缓存，批量查询时只向上游请求未命中的域名
+_domain_info_cache = TTLCache(
+    max_size=config.get_cache_config()["domain_entry_max_size"],
+    ttl=config.get_cache_config()["domain_info_ttl"]
+)
+
+
+class DomainAPIError(Exception):
+    """域名API返回错误时抛出的异常"""
+    pass
+
 
 class DomainAPIClient:
     """域名API客户端类，封装鉴权和请求逻辑"""
@@ -16,7 +57,9 @@ class DomainAPIClient:
         self.app_code = app_code
         self.erp = erp
         self.business_id = business_id
-        self.base_url = "http://api-np.jd.local/V1/Dns"
+        domain_config = config.get_domain_config()
+        self.base_url = domain_config["base_url"]
+        self.max_retries = domain_config["max_retries"]
     
     def _generate_auth_headers(self):
         """生成鉴权请求头"""
@@ -32,86 +75,173 @@ class DomainAPIClient:
             "timestamp": timestamp,
             "sign": sign
         }
+    
+    async def request(self, method: str, path: str, limiter: AdaptiveRateLimiter = None, **kwargs):
+        """发送带鉴权的请求，传入限流器时遇到429/5xx会退避重试"""
+        url = f"{self.base_url}/{path}"
+        http_client = http_client_pool.get_client(url)
+        attempts = self.max_retries + 1 if limiter else 1
+        
+        for attempt in range(attempts):
+            if limiter:
+                await limiter.acquire()
+            response = await http_client.request(
+                method,
+                url,
+                headers=self._generate_auth_headers(),
+                timeout=config.get_http_config()["timeout"],
+                **kwargs
+            )
+            if limiter:
+                limiter.on_response(response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+            if not is_retryable_status(response.status_code) or attempt == attempts - 1:
+                return response
+
+
+def _parse_domain_list(domains: str) -> List[str]:
+    """解析域名列表（支持逗号或换行分隔）"""
+    domain_list = []
+    for domain in domains.replace('\n', ',').split(','):
+        domain = domain.strip()
+        if domain:
+            domain_list.append(domain)
+    return domain_list
 
 
-async def batch_get_domains_info(domains: str) -> str:
-    """批量获取域名基础信息"""
+def _domain_key(domain: str) -> str:
+    """域名的规范形式（小写并去除末尾的点）"""
+    return domain.lower().rstrip('.')
+
+
+async def _fetch_domains_info_chunk(client: DomainAPIClient, chunk: List[str]) -> Dict[str, Dict]:
+    """查询一批域名的基础信息，返回以规范域名为键的信息字典"""
+    response = await client.request("POST", "domainsInfo", json={"domains": chunk})
+    if response.status_code != 200:
+        raise DomainAPIError(f"域名信息查询失败，状态码: {response.status_code}")
+    
+    result = response.json()
+    if result.get('resStatus') != 200:
+        raise DomainAPIError(f"查询失败: {result.get('resMsg', '未知错误')}")
+    
+    infos = result.get('data', {}).get('infos', [])
+    return {_domain_key(info.get('domain', '')): info for info in infos}
+
+
+def _describe_error(error: Exception) -> str:
+    """将分块查询异常转换为与单次查询一致的错误描述"""
+    if isinstance(error, DomainAPIError):
+        return str(error)
+    return f"域名信息查询错误: {str(error)}"
+
+
+async def _check_domain_status(client: DomainAPIClient, domain: str, semaphore: asyncio.Semaphore,
+                               limiter: AdaptiveRateLimiter) -> Dict[str, Any]:
+    """在并发限制内检测单个域名状态，失败时返回含error的字典"""
+    async with semaphore:
+        try:
+            response = await client.request("GET", "domainCheck", limiter=limiter, params={"domain": domain})
+            
+            if response.status_code == 200:
+                return _parse_single_domain_status(response.json(), domain)
+            else:
+                return {"domain": domain, "error": f"检测失败 (状态码: {response.status_code})"}
+        
+        except Exception as e:
+            return {"domain": domain, "error": f"检测异常 - {str(e)}"}
+
+
+async def batch_get_domains_info(domains: str, fields: str = "", output_format: str = "text") -> str:
+    """批量获取域名基础信息，已缓存的域名直接返回，其余分块并发查询
+    
+    output_format为compact或json时只输出fields（逗号分隔）指定的字段，fields为空时输出全部字段。
+    """
+    check_output_format(output_format)
     try:
-        # 解析域名列表（支持逗号或换行分隔）
-        domain_list = []
-        for domain in domains.replace('\n', ',').split(','):
-            domain = domain.strip()
-            if domain:
-                domain_list.append(domain)
+        domain_list = _parse_domain_list(domains)
         
         if not domain_list:
             return "错误: 请提供有效的域名列表"
         
-        client = DomainAPIClient()
-        headers = client._generate_auth_headers()
-        url = f"{client.base_url}/domainsInfo"
-        
-        async with httpx.AsyncClient(timeout=30) as http_client:
-            response = await http_client.post(
-                url, 
-                headers=headers, 
-                json={"domains": domain_list}
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return _format_domains_info_result(result, domain_list)
+        keys = list(dict.fromkeys(_domain_key(domain) for domain in domain_list))
+        infos_by_key = {}
+        missing = []
+        for key in keys:
+            info = _domain_info_cache.get(key)
+            if info is MISSING:
+                missing.append(key)
             else:
-                return f"域名信息查询失败，状态码: {response.status_code}"
-                
+                infos_by_key[key] = info
+        
+        errors = []
+        if missing:
+            domain_config = config.get_domain_config()
+            chunk_size = domain_config["info_chunk_size"]
+            semaphore = asyncio.Semaphore(domain_config["check_concurrency"])
+            client = DomainAPIClient()
+            
+            async def fetch_chunk(chunk: List[str]) -> Dict[str, Dict]:
+                async with semaphore:
+                    return await _fetch_domains_info_chunk(client, chunk)
+            
+            chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+            chunk_results = await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks), return_exceptions=True)
+            for chunk_result in chunk_results:
+                if isinstance(chunk_result, Exception):
+                    errors.append(_describe_error(chunk_result))
+                    continue
+                for key, info in chunk_result.items():
+                    _domain_info_cache.set(key, info)
+                    infos_by_key[key] = info
+        
+        if errors and not infos_by_key:
+            return errors[0]
+        
+        # 按输入顺序合并缓存命中和新查询的结果
+        infos = [infos_by_key[key] for key in keys if key in infos_by_key]
+        if output_format != "text":
+            if not infos:
+                return f"未找到域名信息 (查询域名: {', '.join(domain_list)})"
+            result = render(infos, parse_fields(fields, DOMAIN_INFO_FIELDS), output_format)
+        else:
+            result = _format_domains_info_result(
+                {"resStatus": 200, "data": {"count": len(infos), "infos": infos}},
+                domain_list
+            )
+        if errors:
+            # 失败说明放在结果开头，工具注册表据此识别部分失败，不缓存整体结果
+            return f"{DOMAIN_INFO_PARTIAL_PREFIX}: " + "; ".join(errors) + "\n\n" + result
+        return result
+    
     except Exception as e:
         return f"域名信息查询错误: {str(e)}"
 
 
-async def batch_check_domains_status(domains: str) -> str:
-    """批量检测域名状态"""
+async def batch_check_domains_status(domains: str, concurrency: int = None, rate: float = None,
+                                     output_format: str = "text") -> str:
+    """批量检测域名状态，并发检测并按输入顺序返回结果"""
+    check_output_format(output_format)
     try:
-        # 解析域名列表
-        domain_list = []
-        for domain in domains.replace('\n', ',').split(','):
-            domain = domain.strip()
-            if domain:
-                domain_list.append(domain)
+        domain_list = _parse_domain_list(domains)
         
         if not domain_list:
             return "错误: 请提供有效的域名列表"
         
+        domain_config = config.get_domain_config()
         client = DomainAPIClient()
-        headers = client._generate_auth_headers()
-        url = f"{client.base_url}/domainCheck"
-        
-        results = []
-        
-        async with httpx.AsyncClient(timeout=30) as http_client:
-            for i, domain in enumerate(domain_list, 1):
-                try:
-                    response = await http_client.get(
-                        url, 
-                        headers=headers, 
-                        params={"domain": domain}
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        status_info = _format_single_domain_status(result, domain)
-                        results.append(f"[{i}/{len(domain_list)}] {status_info}")
-                    else:
-                        results.append(f"[{i}/{len(domain_list)}] {domain}: 检测失败 (状态码: {response.status_code})")
-                    
-                    # 避免请求过于频繁
-                    if i < len(domain_list):
-                        await asyncio.sleep(0.5)
-                        
-                except Exception as e:
-                    results.append(f"[{i}/{len(domain_list)}] {domain}: 检测异常 - {str(e)}")
-        
-        return f"域名状态批量检测结果:\n{'='*60}\n" + "\n".join(results)
+        # 限制并发数，并用令牌桶控制请求速率，上游限流时自动降速
+        semaphore = asyncio.Semaphore(concurrency or domain_config["check_concurrency"])
+        limiter = AdaptiveRateLimiter(rate or domain_config["check_rate"])
+        total = len(domain_list)
         
+        results = await asyncio.gather(
+            *(_check_domain_status(client, domain, semaphore, limiter) for domain in domain_list)
+        )
+        
+        if output_format != "text":
+            return render(results, DOMAIN_STATUS_FIELDS + ("error",), output_format)
+        lines = [f"[{i}/{total}] {_format_single_domain_status(result)}" for i, result in enumerate(results, 1)]
+        return f"域名状态批量检测结果:\n{'='*60}\n" + "\n".join(lines)
+    
     except Exception as e:
         return f"域名状态检测错误: {str(e)}"
 
@@ -162,35 +292,45 @@ def _format_domains_info_result(response_data: Dict, domains: List[str]) -> str:
     return "\n".join(result_lines)
 
 
-def _format_single_domain_status(response_data: Dict, domain: str) -> str:
-    """格式化单个域名状态检测结果"""
+def _parse_single_domain_status(response_data: Dict, domain: str) -> Dict[str, Any]:
+    """解析单个域名状态检测结果，失败时返回含error的字典"""
     if response_data.get('resStatus') != 200:
-        return f"{domain}: 检测失败 - {response_data.get('resMsg', '未知错误')}"
+        return {"domain": domain, "error": f"检测失败 - {response_data.get('resMsg', '未知错误')}"}
     
     data = response_data.get('data', {})
     status = data.get('status')
-    msg = data.get('msg', '')
-    
-    status_descriptions = {
-        -1: "可申请 ✅",
-        1: "DNS已解析 🔗", 
-        2: "商家域名 🏪",
-        3: "NP系统预留 🔒"
-    }
+    return {"domain": domain, "status": status, "available": status == -1, "msg": data.get('msg', '')}
+
+
+def _format_single_domain_status(result: Dict[str, Any]) -> str:
+    """格式化单个域名状态检测结果"""
+    if result.get("error"):
+        return f"{result['domain']}: {result['error']}"
     
-    availability = status_descriptions.get(status, f"未知状态({status})")
-    return f"{domain}: {msg} - {availability}"
+    status = result["status"]
+    availability = DOMAIN_STATUS_DESCRIPTIONS.get(status, f"未知状态({status})")
+    return f"{result['domain']}: {result['msg']} - {availability}"
 
 
 # 同步版本的函数
-def batch_get_domains_info_sync(domains: str) -> str:
+def batch_get_domains_info_sync(domains: str, fields: str = "", output_format: str = "text") -> str:
     """同步版本的批量域名信息查询"""
-    return asyncio.run(batch_get_domains_info(domains))
+    return async_runner.run(batch_get_domains_info(domains, fields, output_format))
 
 
-def batch_check_domains_status_sync(domains: str) -> str:
+def batch_check_domains_status_sync(domains: str, output_format: str = "text") -> str:
     """同步版本的批量域名状态检测"""
-    return asyncio.run(batch_check_domains_status(domains))
+    return async_runner.run(batch_check_domains_status(domains, output_format=output_format))
+
+
+def normalize_domains_args(domains: str) -> tuple:
+    """规范化域名列表（小写并去除末尾的点），用作缓存键"""
+    return tuple(_domain_key(domain) for domain in _parse_domain_list(domains))
+
+
+def get_domain_cache_stats() -> Dict[str, Any]:
+    """获取单域名信息缓存的统计信息"""
+    return _domain_info_cache.get_stats()
 
 
 # MCP工具schema定义
@@ -205,6 +345,10 @@ def get_batch_domains_info_schema() -> Dict[str, Any]:
                 "domains": {
                     "type": "string",
                     "description": "要查询的域名列表，多个域名用逗号或换行分隔，如: 'example.com,test.jd.local' 或 'example.com\\ntest.jd.local'"
+                },
+                "fields": {
+                    "type": "string",
+                    "description": f"可选，只返回用户关心的字段，多个字段用逗号分隔，可选: {', '.join(DOMAIN_INFO_FIELDS)}"
                 }
             },
             "required": ["domains"]
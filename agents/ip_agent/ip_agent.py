@@ -3,7 +3,8 @@ IP地址查询Agent
 专门处理IP地址归属地查询和相关对话
 """
 from autogen import AssistantAgent
-from .ip_tools import get_ip_location_sync, get_ip_function_schema
+from .ip_batch import get_batch_ip_locations_schema
+from .ip_tools import get_ip_function_schema
 
 
 class IPAgent:
@@ -11,21 +12,26 @@ class IPAgent:
     
     def __init__(self, llm_config: dict):
         """初始化IP Agent"""
+        # 延迟导入，避免工具注册表导入工具模块时形成循环导入
+        from mcp.tools_registry import tools_registry
+        
         self.llm_config = llm_config.copy()
-        self.llm_config["functions"] = [get_ip_function_schema()]
+        self.llm_config["functions"] = [get_ip_function_schema(), get_batch_ip_locations_schema()]
         
         self.agent = AssistantAgent(
             name="ip_assistant",
             system_message="""你是一个专业的IP地址查询助手。你的职责是：
 1. 当用户询问IP地址归属地时，使用get_ip_location函数查询
-2. 提供详细的IP地理位置信息
-3. 用专业、准确的中文回复查询结果
-4. 可以解释IP地址的基本信息和地理位置含义
-5. 如果IP地址格式不正确，请提醒用户输入正确的IP格式
-6. 专注于IP相关的问题，其他问题请转交给相关专家""",
+2. 当用户需要分析大量IP（IP列表、网段或访问日志文件）时，使用batch_get_ip_locations函数汇总统计
+3. 提供详细的IP地理位置信息
+4. 用专业、准确的中文回复查询结果
+5. 可以解释IP地址的基本信息和地理位置含义
+6. 如果IP地址格式不正确，请提醒用户输入正确的IP格式
+7. 专注于IP相关的问题，其他问题请转交给相关专家""",
             llm_config=self.llm_config,
             function_map={
-                "get_ip_location": get_ip_location_sync
+                "get_ip_location": tools_registry.get_llm_tool_function("ip_location"),
+                "batch_get_ip_locations": tools_registry.get_llm_tool_function("ip_batch")
             }
         )
     
@@ -42,6 +48,7 @@ class IPAgent:
         return [
             "IP地址归属地查询",
             "IP地理位置分析",
+            "批量IP归属地统计（IP列表、网段、访问日志）",
             "网络运营商识别",
             "IP地址格式验证"
         ]
\ No newline at end of file
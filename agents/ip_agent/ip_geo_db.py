@@ -0,0 +1,493 @@
+"""
+本地IP地理位置库模块
+将CIDR或起止地址形式的IP段数据集编译为按起始地址排序的定长数组索引文件，
+通过内存映射加载并二分查找，离线回答IPv4和IPv6的归属地查询；也可直接读取MMDB格式的数据库
+"""
+import bisect
+import contextlib
+import csv
+import functools
+import ipaddress
+import json
+import mmap
+import os
+import re
+import socket
+import struct
+import tempfile
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from common.config import config
+
+# 索引文件头：魔数、IPv4段数、IPv6段数、记录数、IPv4段表/IPv6段表/记录偏移表/记录数据的起始位置
+INDEX_MAGIC = b"IPGEO\x00\x01\x00"
+_HEADER = struct.Struct(">8sIII4Q")
+_RECORD_ID = struct.Struct(">I")
+_RECORD_OFFSET = struct.Struct(">Q")
+
+IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+# 严格的点分十进制IPv4：四段，每段0-255且不含前导零
+_IPV4_OCTET = r"(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])"
+_IPV4_PATTERN = re.compile(rf"{_IPV4_OCTET}(?:\.{_IPV4_OCTET}){{3}}")
+
+# 记录字段与ipapi.co返回的字段名一致，便于与远程查询共用格式化逻辑
+RECORD_FIELDS = ("country_name", "region", "city", "org", "timezone", "latitude", "longitude")
+
+# CSV列名的常见别名
+_CSV_ALIASES = {
+    "network": ("network", "cidr", "prefix"),
+    "start": ("start_ip", "ip_start", "start", "ip_from", "range_start"),
+    "end": ("end_ip", "ip_end", "end", "ip_to", "range_end"),
+    "country_name": ("country_name", "country"),
+    "region": ("region", "region_name", "subdivision", "province"),
+    "city": ("city", "city_name"),
+    "org": ("org", "isp", "organization", "as_org", "asn_org"),
+    "timezone": ("timezone", "time_zone", "tz"),
+    "latitude": ("latitude", "lat"),
+    "longitude": ("longitude", "lon", "lng"),
+}
+
+
+class IPGeoDatabaseError(Exception):
+    """本地IP库文件无效或无法加载时抛出的异常"""
+    pass
+
+
+def _parse_address(value: str) -> Tuple[int, int]:
+    """解析IP地址，支持点分/冒号形式和整数形式（不超过32位的整数视为IPv4），返回(版本, 整数值)"""
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        return (4 if number <= 0xFFFFFFFF else 6), number
+    address = ipaddress.ip_address(value)
+    return address.version, int(address)
+
+
+def parse_ipv4(ip: str) -> Optional[int]:
+    """严格解析点分十进制IPv4地址为整数，不是四段、含前导零或超出范围时返回None
+    
+    先用正则校验再交给inet_aton快速转换，inet_aton本身会接受八进制、十六进制和缩写形式（如010.8.8.8）。
+    """
+    if not _IPV4_PATTERN.fullmatch(ip):
+        return None
+    return int.from_bytes(socket.inet_aton(ip), "big")
+
+
+def _parse_ip(ip: str) -> IPAddress:
+    """解析IP地址，点分形式的IPv4走快速解析"""
+    ip = ip.strip()
+    if ":" not in ip:
+        value = parse_ipv4(ip)
+        if value is None:
+            raise ValueError(f"无效的IP地址: {ip}")
+        return ipaddress.IPv4Address(value)
+    return ipaddress.ip_address(ip)
+
+
+def _parse_number(value: Any) -> Optional[float]:
+    """解析经纬度，为空或无效时返回None"""
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_csv_ranges(path: str) -> Iterator[Tuple[int, int, int, Dict[str, Any]]]:
+    """读取CSV格式的IP段数据，逐行返回(版本, 起始地址, 结束地址, 记录)
+    
+    每行使用network列（CIDR）或start_ip/end_ip列（地址或整数）描述IP段，其余列为归属地字段。
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        columns = {name.strip().lower(): name for name in reader.fieldnames or ()}
+        resolved = {
+            field: next((columns[alias] for alias in aliases if alias in columns), None)
+            for field, aliases in _CSV_ALIASES.items()
+        }
+        if not resolved["network"] and not (resolved["start"] and resolved["end"]):
+            raise IPGeoDatabaseError(f"CSV缺少network列或start_ip/end_ip列: {path}")
+        
+        for line, row in enumerate(reader, 2):
+            try:
+                if resolved["network"] and row.get(resolved["network"]):
+                    network = ipaddress.ip_network(row[resolved["network"]].strip(), strict=False)
+                    version, start, end = network.version, int(network.network_address), int(network.broadcast_address)
+                else:
+                    version, start = _parse_address(row[resolved["start"]])
+                    end_version, end = _parse_address(row[resolved["end"]])
+                    if end_version != version or end < start:
+                        raise ValueError("起止地址不匹配")
+            except (TypeError, ValueError) as e:
+                raise IPGeoDatabaseError(f"{path}第{line}行IP段无效: {str(e)}")
+            
+            record = {field: (row.get(resolved[field]) or "").strip() or None
+                      for field in RECORD_FIELDS if resolved[field]}
+            for field in ("latitude", "longitude"):
+                if field in record:
+                    record[field] = _parse_number(record[field])
+            yield version, start, end, record
+
+
+def build_index(ranges: Iterator[Tuple[int, int, int, Dict[str, Any]]], index_path: str) -> Dict[str, int]:
+    """将IP段编译为索引文件，返回各部分的数量
+    
+    IP段按起始地址排序后存为定长条目（起始地址、结束地址、记录编号，均为大端序），
+    相同的记录只保存一次；段之间不应重叠，重叠时查找结果为起始地址不大于查询地址的最后一段。
+    """
+    records, record_ids = [], {}
+    tables = {4: [], 6: []}
+    for version, start, end, record in ranges:
+        encoded = json.dumps(record, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        record_id = record_ids.setdefault(encoded, len(records))
+        if record_id == len(records):
+            records.append(encoded)
+        tables[version].append((start, end, record_id))
+    
+    sections = []
+    for version, width in ((4, 4), (6, 16)):
+        tables[version].sort()
+        sections.append(b"".join(
+            start.to_bytes(width, "big") + end.to_bytes(width, "big") + _RECORD_ID.pack(record_id)
+            for start, end, record_id in tables[version]
+        ))
+    offsets, position = [], 0
+    for encoded in records:
+        offsets.append(_RECORD_OFFSET.pack(position))
+        position += len(encoded)
+    offsets.append(_RECORD_OFFSET.pack(position))
+    
+    offset4 = _HEADER.size
+    offset6 = offset4 + len(sections[0])
+    offset_index = offset6 + len(sections[1])
+    offset_blob = offset_index + _RECORD_OFFSET.size * len(offsets)
+    # 多个进程可能同时编译同一索引，各自写入唯一的临时文件后原子替换，不会读到或覆盖写了一半的文件
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(index_path) + ".", suffix=".tmp",
+                                     dir=os.path.dirname(os.path.abspath(index_path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(INDEX_MAGIC, len(tables[4]), len(tables[6]), len(records),
+                                 offset4, offset6, offset_index, offset_blob))
+            f.write(sections[0])
+            f.write(sections[1])
+            f.write(b"".join(offsets))
+            f.write(b"".join(records))
+        os.replace(temp_path, index_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+    return {"ipv4_ranges": len(tables[4]), "ipv6_ranges": len(tables[6]), "records": len(records)}
+
+
+class _RangeStarts:
+    """索引文件中某一版本段表的起始地址序列，供bisect直接在内存映射上二分查找"""
+    
+    def __init__(self, buffer: mmap.mmap, offset: int, count: int, width: int):
+        self.buffer = buffer
+        self.offset = offset
+        self.count = count
+        self.width = width
+        self.entry_size = width * 2 + _RECORD_ID.size
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def __getitem__(self, index: int) -> bytes:
+        position = self.offset + index * self.entry_size
+        return self.buffer[position:position + self.width]
+    
+    def entry(self, index: int) -> Tuple[bytes, int]:
+        """返回第index段的结束地址和记录编号"""
+        position = self.offset + index * self.entry_size + self.width
+        end = self.buffer[position:position + self.width]
+        return end, _RECORD_ID.unpack_from(self.buffer, position + self.width)[0]
+
+
+class IndexBackend:
+    """编译后索引文件的查询后端"""
+    
+    def __init__(self, index_path: str):
+        with open(index_path, "rb") as f:
+            # 空文件无法内存映射，过短的文件不含完整的文件头
+            if os.fstat(f.fileno()).st_size < _HEADER.size:
+                raise IPGeoDatabaseError(f"不是有效的IP库索引文件（文件为空或不完整）: {index_path}")
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count4, count6, self.record_count, offset4, offset6, self.offset_index, self.offset_blob = \
+            _HEADER.unpack_from(self.buffer)
+        if magic != INDEX_MAGIC:
+            self.buffer.close()
+            raise IPGeoDatabaseError(f"不是有效的IP库索引文件: {index_path}")
+        if not self._is_complete(count4, count6, offset4, offset6):
+            self.buffer.close()
+            raise IPGeoDatabaseError(f"IP库索引文件不完整，请删除后重新编译: {index_path}")
+        self.tables = {4: _RangeStarts(self.buffer, offset4, count4, 4), 6: _RangeStarts(self.buffer, offset6, count6, 16)}
+        # 热点IP段的记录反复被查到，缓存解码后的记录
+        self._record = functools.lru_cache(maxsize=4096)(self._decode_record)
+        self._ipv4_arrays = None
+    
+    def _is_complete(self, count4: int, count6: int, offset4: int, offset6: int) -> bool:
+        """校验各部分的位置与文件头中的数量一致，且文件长度与记录数据的结尾一致"""
+        if (offset4 != _HEADER.size or offset6 != offset4 + count4 * (2 * 4 + _RECORD_ID.size) or
+                self.offset_index != offset6 + count6 * (2 * 16 + _RECORD_ID.size) or
+                self.offset_blob != self.offset_index + _RECORD_OFFSET.size * (self.record_count + 1) or
+                len(self.buffer) < self.offset_blob):
+            return False
+        blob_size = _RECORD_OFFSET.unpack_from(self.buffer, self.offset_blob - _RECORD_OFFSET.size)[0]
+        return len(self.buffer) == self.offset_blob + blob_size
+    
+    def _decode_record(self, record_id: int) -> Dict[str, Any]:
+        start, end = struct.unpack_from(">QQ", self.buffer, self.offset_index + record_id * _RECORD_OFFSET.size)
+        return json.loads(self.buffer[self.offset_blob + start:self.offset_blob + end])
+    
+    def lookup(self, address: IPAddress) -> Optional[Dict[str, Any]]:
+        """查找地址所在的IP段，未收录时返回None"""
+        table = self.tables[address.version]
+        key = address.packed
+        index = bisect.bisect_right(table, key) - 1
+        if index < 0:
+            return None
+        end, record_id = table.entry(index)
+        if key > end:
+            return None
+        return self.record(record_id)
+    
+    def lookup_many_ipv4(self, addresses):
+        """用NumPy向量化查询一批IPv4地址（uint32数组），返回对应的记录编号数组，未收录的为-1
+        
+        首次调用时将段表转换为本机字节序的数组并保留，之后每批查询只需一次searchsorted。
+        """
+        import numpy as np
+        
+        if self._ipv4_arrays is None:
+            table = self.tables[4]
+            entries = np.frombuffer(self.buffer, dtype=[("start", ">u4"), ("end", ">u4"), ("record", ">u4")],
+                                    count=table.count, offset=table.offset)
+            self._ipv4_arrays = (
+                entries["start"].astype(np.uint32), entries["end"].astype(np.uint32), entries["record"].astype(np.int64)
+            )
+            del entries
+        starts, ends, records = self._ipv4_arrays
+        if not len(starts):
+            return np.full(len(addresses), -1, dtype=np.int64)
+        index = np.searchsorted(starts, addresses, side="right") - 1
+        clipped = np.maximum(index, 0)
+        found = (index >= 0) & (addresses <= ends[clipped])
+        return np.where(found, records[clipped], -1)
+    
+    def record(self, record_id: int) -> Dict[str, Any]:
+        """按记录编号读取记录"""
+        return dict(self._record(record_id))
+    
+    def get_stats(self) -> Dict[str, int]:
+        """索引规模"""
+        return {
+            "ipv4_ranges": len(self.tables[4]),
+            "ipv6_ranges": len(self.tables[6]),
+            "records": self.record_count,
+            "index_bytes": len(self.buffer)
+        }
+    
+    def close(self):
+        """释放内存映射"""
+        self.buffer.close()
+
+
+def _localized_name(item: Any) -> Optional[str]:
+    """读取MMDB记录中names的英文名称（与ipapi.co一致）"""
+    if not isinstance(item, dict):
+        return None
+    names = item.get("names") or {}
+    return names.get("en") or next(iter(names.values()), None)
+
+
+class MMDBBackend:
+    """MMDB数据库的查询后端，MMDB本身即为内存映射的前缀树，直接查询无需编译"""
+    
+    def __init__(self, path: str):
+        try:
+            import maxminddb
+        except ImportError:
+            raise IPGeoDatabaseError("读取MMDB文件需要安装maxminddb: pip install maxminddb")
+        self.reader = maxminddb.open_database(path, maxminddb.MODE_MMAP)
+    
+    def lookup(self, address: IPAddress) -> Optional[Dict[str, Any]]:
+        """查找地址的记录，兼容GeoLite2 City/ASN等常见结构，未收录时返回None"""
+        raw = self.reader.get(str(address))
+        if not raw:
+            return None
+        location = raw.get("location") or {}
+        subdivisions = raw.get("subdivisions") or [None]
+        return {
+            "country_name": _localized_name(raw.get("country")) or raw.get("country_name") or raw.get("country"),
+            "region": _localized_name(subdivisions[0]) or raw.get("region"),
+            "city": _localized_name(raw.get("city")) or raw.get("city"),
+            "org": raw.get("autonomous_system_organization") or raw.get("org") or raw.get("isp"),
+            "timezone": location.get("time_zone") or raw.get("timezone"),
+            "latitude": location.get("latitude", raw.get("latitude")),
+            "longitude": location.get("longitude", raw.get("longitude"))
+        }
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """数据库元信息"""
+        metadata = self.reader.metadata()
+        return {"database_type": metadata.database_type, "node_count": metadata.node_count}
+    
+    def close(self):
+        """关闭数据库"""
+        self.reader.close()
+
+
+def _numpy_available() -> bool:
+    """是否安装了NumPy（可选依赖，用于批量查询）"""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class IPGeoDatabase:
+    """本地IP地理位置库，首次查询时加载；CSV数据集会编译为索引文件，数据集更新后自动重新编译"""
+    
+    def __init__(self, geo_config: Dict[str, Any] = None):
+        """初始化本地库，db_path为空时不启用"""
+        geo_config = geo_config or config.get_ip_geo_config()
+        self.db_path = geo_config["db_path"]
+        self.index_path = geo_config["index_path"]
+        self.remote_fallback = geo_config["remote_fallback"]
+        self._backend = None
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+    
+    @property
+    def enabled(self) -> bool:
+        """是否配置了本地库"""
+        return bool(self.db_path)
+    
+    def _resolve_index_path(self) -> str:
+        """CSV数据集对应的索引文件路径"""
+        return self.index_path or os.path.splitext(self.db_path)[0] + ".idx"
+    
+    def _open_backend(self):
+        """按文件类型打开查询后端"""
+        if self.db_path.lower().endswith(".mmdb"):
+            return MMDBBackend(self.db_path)
+        if not self.db_path.lower().endswith(".csv"):
+            return IndexBackend(self.db_path)
+        index_path = self._resolve_index_path()
+        if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(self.db_path):
+            build_index(iter_csv_ranges(self.db_path), index_path)
+        return IndexBackend(index_path)
+    
+    def _get_backend(self):
+        """获取查询后端，首次调用时加载"""
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._open_backend()
+        return self._backend
+    
+    def load(self):
+        """预先加载本地库（例如在服务启动时），避免首次查询时编译CSV"""
+        if self.enabled:
+            self._get_backend()
+    
+    @staticmethod
+    def _lookup_address(backend, ip: str) -> Optional[Dict[str, Any]]:
+        """解析IP并在后端中查找，IP无效时返回None"""
+        try:
+            address = _parse_ip(ip)
+        except ValueError:
+            return None
+        # IPv4映射的IPv6地址按IPv4查询
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        return backend.lookup(address)
+    
+    def lookup(self, ip: str) -> Optional[Dict[str, Any]]:
+        """查询IP的归属地记录，字段同RECORD_FIELDS；IP无效或本地库未收录时返回None"""
+        record = self._lookup_address(self._get_backend(), ip)
+        self.lookups += 1
+        if record is not None:
+            self.hits += 1
+        return record
+    
+    def lookup_many(self, ips: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """批量查询IP的归属地记录，按输入顺序返回，IP无效或未收录的为None
+        
+        编译索引中的点分IPv4地址在安装了NumPy时直接转换为整数数组一次性向量化查找，其余地址逐个查找。
+        """
+        backend = self._get_backend()
+        results = [None] * len(ips)
+        vectorize = isinstance(backend, IndexBackend) and _numpy_available()
+        positions, values = [], []
+        for i, ip in enumerate(ips):
+            value = parse_ipv4(ip.strip()) if vectorize else None
+            if value is not None:
+                values.append(value)
+                positions.append(i)
+                continue
+            results[i] = self._lookup_address(backend, ip)
+        
+        if values:
+            import numpy as np
+            
+            record_ids = backend.lookup_many_ipv4(np.array(values, dtype=np.uint32))
+            for i, record_id in zip(positions, record_ids.tolist()):
+                if record_id >= 0:
+                    results[i] = backend.record(record_id)
+        
+        self.lookups += len(ips)
+        self.hits += sum(1 for result in results if result is not None)
+        return results
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取本地库规模和命中统计，未加载时只返回配置"""
+        stats = {"db_path": self.db_path, "loaded": self._backend is not None,
+                 "lookups": self.lookups, "hits": self.hits}
+        if self._backend is not None:
+            stats.update(self._backend.get_stats())
+        return stats
+    
+    def close(self):
+        """关闭查询后端"""
+        with self._lock:
+            backend, self._backend = self._backend, None
+        if backend is not None:
+            backend.close()
+
+
+# 全局本地IP库实例
+ip_geo_db = IPGeoDatabase()
+
+
+def main():
+    """命令行入口：编译CSV数据集为索引文件，或查询IP"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="本地IP地理位置库")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="将CSV数据集编译为索引文件")
+    build_parser.add_argument("csv", help="CSV数据集")
+    build_parser.add_argument("-o", "--output", help="索引文件路径，默认与CSV同名、扩展名为.idx")
+    lookup_parser = subparsers.add_parser("lookup", help="查询IP")
+    lookup_parser.add_argument("db", help="CSV、.idx或.mmdb文件")
+    lookup_parser.add_argument("ips", nargs="+", help="IP地址")
+    args = parser.parse_args()
+    
+    if args.command == "build":
+        output = args.output or os.path.splitext(args.csv)[0] + ".idx"
+        print(json.dumps({**build_index(iter_csv_ranges(args.csv), output), "index": output}, ensure_ascii=False))
+        return
+    
+    database = IPGeoDatabase({"db_path": args.db, "index_path": "", "remote_fallback": False})
+    for ip in args.ips:
+        print(ip, json.dumps(database.lookup(ip), ensure_ascii=False))
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
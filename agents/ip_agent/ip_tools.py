@@ -2,24 +2,45 @@
 IP地址查询工具模块
 提供IP地址归属地查询功能
 """
-import httpx
-import asyncio
-from typing import Dict, Any
+import ipaddress
+from typing import Dict, Any, Optional
 
+from common.async_runner import async_runner
+from common.config import config
+from common.http_client import http_client_pool
+from common.rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from common.tool_output import check_output_format, render
+from .ip_geo_db import ip_geo_db
 
-async def get_ip_location(ip: str) -> str:
-    """查询IP地址的归属地信息"""
-    try:
-        async with httpx.AsyncClient() as client:
-            # 使用ipapi.co免费API
-            response = await client.get(f"http://ipapi.co/{ip}/json/", timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                
-                if "error" in data:
-                    return f"IP查询失败: {data.get('reason', '未知错误')}"
-                
-                location_info = f"""
+# 查询失败时返回结果的前缀，这类结果不应被缓存
+IP_ERROR_PREFIXES = ("IP查询失败", "IP查询错误")
+
+
+# 紧凑/JSON输出包含的字段
+IP_FIELDS = ("ip", "country", "region", "city", "org", "timezone", "latitude", "longitude")
+
+
+class IPAPIError(Exception):
+    """IP查询API返回错误时抛出的异常"""
+    pass
+
+
+def _format_ip_location(ip: str, data: Dict[str, Any], output_format: str) -> str:
+    """格式化归属地信息，data的字段名同ipapi.co的返回结果"""
+    if output_format != "text":
+        row = {
+            "ip": ip,
+            "country": data.get('country_name'),
+            "region": data.get('region'),
+            "city": data.get('city'),
+            "org": data.get('org'),
+            "timezone": data.get('timezone'),
+            "latitude": data.get('latitude'),
+            "longitude": data.get('longitude')
+        }
+        return render([row], IP_FIELDS, output_format)
+    
+    location_info = f"""
 IP地址: {ip}
 国家: {data.get('country_name', '未知')}
 地区: {data.get('region', '未知')}
@@ -28,16 +49,69 @@ IP地址: {ip}
 时区: {data.get('timezone', '未知')}
 经纬度: {data.get('latitude', '未知')}, {data.get('longitude', '未知')}
 """
-                return location_info
-            else:
-                return f"IP查询失败，状态码: {response.status_code}"
+    return location_info
+
+
+async def _fetch_remote_location(ip: str, limiter: AdaptiveRateLimiter = None) -> Dict[str, Any]:
+    """查询远程API（默认使用ipapi.co免费API），传入限流器时按上游响应调整速率"""
+    url = f"{config.get_api_config()['ip_base_url']}/{ip}/json/"
+    client = http_client_pool.get_client(url)
+    if limiter:
+        await limiter.acquire()
+    response = await client.get(url, timeout=10)
+    if limiter:
+        limiter.on_response(response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+    if response.status_code != 200:
+        raise IPAPIError(f"IP查询失败，状态码: {response.status_code}")
+    
+    data = response.json()
+    if "error" in data:
+        raise IPAPIError(f"IP查询失败: {data.get('reason', '未知错误')}")
+    return data
+
+
+def _lookup_local(ip: str) -> Optional[Dict[str, Any]]:
+    """查询本地IP库，未配置本地库或未收录时返回None；记录中缺失的字段不出现在结果中，与远程结果的缺省值一致"""
+    if not ip_geo_db.enabled:
+        return None
+    record = ip_geo_db.lookup(ip)
+    if record is None:
+        return None
+    return {field: value for field, value in record.items() if value is not None}
+
+
+async def get_ip_location(ip: str, output_format: str = "text") -> str:
+    """查询IP地址的归属地信息，output_format为text、compact或json
+    
+    配置了本地IP库（IP_GEO_DB_PATH）时优先离线查询，未收录的IP在允许时再查询远程API。
+    """
+    check_output_format(output_format)
+    try:
+        data = _lookup_local(ip)
+        if data is not None:
+            return _format_ip_location(ip, data, output_format)
+        if ip_geo_db.enabled and not ip_geo_db.remote_fallback:
+            return f"IP查询失败: 本地IP库中未找到 {ip}"
+        
+        return _format_ip_location(ip, await _fetch_remote_location(ip), output_format)
+    except IPAPIError as e:
+        return str(e)
     except Exception as e:
         return f"IP查询错误: {str(e)}"
 
 
-def get_ip_location_sync(ip: str) -> str:
+def get_ip_location_sync(ip: str, output_format: str = "text") -> str:
     """同步版本的IP查询函数"""
-    return asyncio.run(get_ip_location(ip))
+    return async_runner.run(get_ip_location(ip, output_format))
+
+
+def normalize_ip_args(ip: str) -> str:
+    """规范化IP地址（IPv6压缩表示），用作缓存键"""
+    ip = ip.strip()
+    try:
+        return ipaddress.ip_address(ip).compressed
+    except ValueError:
+        return ip.lower()
 
 
 def get_ip_function_schema() -> Dict[str, Any]:
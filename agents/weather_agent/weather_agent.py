@@ -3,7 +3,7 @@
 专门处理天气相关的查询和对话
 """
 from autogen import AssistantAgent
-from .weather_tools import get_weather_sync, get_weather_function_schema
+from .weather_tools import get_weather_batch_function_schema, get_weather_function_schema
 
 
 class WeatherAgent:
@@ -11,21 +11,25 @@ class WeatherAgent:
     
     def __init__(self, llm_config: dict):
         """初始化天气Agent"""
+        # 延迟导入，避免工具注册表导入工具模块时形成循环导入
+        from mcp.tools_registry import tools_registry
+        
         self.llm_config = llm_config.copy()
-        self.llm_config["functions"] = [get_weather_function_schema()]
+        self.llm_config["functions"] = [get_weather_function_schema(), get_weather_batch_function_schema()]
         
         self.agent = AssistantAgent(
             name="weather_assistant",
             system_message="""你是一个专业的天气查询助手。你的职责是：
 1. 当用户询问天气时，使用get_weather函数查询指定城市的天气
-2. 如果用户询问多个城市，请逐个查询并汇总结果
+2. 如果用户询问多个城市，请使用get_weather_batch函数一次查询全部城市，再根据对比表格汇总结果
 3. 用友好、专业的中文回复天气信息
 4. 可以提供穿衣建议、出行建议等额外信息
 5. 如果城市名称不明确，请询问用户具体的城市名称
 6. 专注于天气相关的问题，其他问题请转交给相关专家""",
             llm_config=self.llm_config,
             function_map={
-                "get_weather": get_weather_sync
+                "get_weather": tools_registry.get_llm_tool_function("weather"),
+                "get_weather_batch": tools_registry.get_llm_tool_function("weather_batch")
             }
         )
     
@@ -2,15 +2,46 @@
 天气查询工具模块
 提供天气相关的API调用功能
 """
-import httpx
 import asyncio
-from typing import Dict, Any
+import re
+from typing import Dict, Any, List
 
+from common.async_runner import async_runner
+from common.cache import TTLCache, MISSING
+from common.config import config
+from common.http_client import http_client_pool
+from common.tool_output import check_output_format, render
 
-async def get_weather(city: str) -> str:
-    """查询指定城市的天气信息"""
-    api_key = "becab1d22273f6792a96265302e1057b"
-    base_url = "https://api.openweathermap.org/data/2.5/weather"
+# 多城市查询中部分城市失败时结果以此开头，成功的城市已按城市缓存，整体结果不缓存，下次调用只补查失败的城市
+WEATHER_PARTIAL_PREFIX = "部分城市天气查询失败"
+
+# 查询失败时返回结果的前缀，这类结果不应被缓存
+WEATHER_ERROR_PREFIXES = ("获取天气信息失败", "天气查询错误", WEATHER_PARTIAL_PREFIX)
+
+
+# 紧凑/JSON输出包含的字段
+WEATHER_FIELDS = ("city", "weather", "temp_c", "humidity", "wind_speed")
+
+# 单个城市的天气缓存，多城市查询时只向上游请求未命中的城市
+_weather_cache = TTLCache(
+    max_size=config.get_cache_config()["max_size"],
+    ttl=config.get_cache_config()["weather_ttl"]
+)
+
+
+class WeatherAPIError(Exception):
+    """天气API返回错误时抛出的异常"""
+    pass
+
+
+async def _fetch_weather(city: str) -> Dict[str, Any]:
+    """查询单个城市的天气，返回WEATHER_FIELDS字段的记录；优先使用单城市缓存，查询成功后写入缓存"""
+    row = _weather_cache.get(normalize_weather_args(city))
+    if row is not MISSING:
+        return row
+    
+    api_key = config.get_weather_api_key()
+    base_url = config.get_api_config()["weather_base_url"]
     
     params = {
         "q": city,
@@ -19,27 +50,115 @@ async def get_weather(city: str) -> str:
         "lang": "zh_cn"
     }
     
+    client = http_client_pool.get_client(base_url)
+    resp = await client.get(base_url, params=params, timeout=10)
+    if resp.status_code != 200:
+        raise WeatherAPIError(f"获取天气信息失败: {resp.status_code}")
+    data = resp.json()
+    row = {
+        "city": data.get('name', city),
+        "weather": data['weather'][0]['description'],
+        "temp_c": data['main']['temp'],
+        "humidity": data['main']['humidity'],
+        "wind_speed": data['wind']['speed']
+    }
+    _weather_cache.set(normalize_weather_args(city), row)
+    return row
+
+
+async def get_weather(city: str, output_format: str = "text") -> str:
+    """查询指定城市的天气信息，output_format为text、compact或json"""
+    check_output_format(output_format)
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(base_url, params=params, timeout=10)
-            if resp.status_code == 200:
-                data = resp.json()
-                return f"""
-城市: {data.get('name', city)}
-天气: {data['weather'][0]['description']}
-温度: {data['main']['temp']}°C
-湿度: {data['main']['humidity']}%
-风速: {data['wind']['speed']} m/s
+        row = await _fetch_weather(city)
+        if output_format != "text":
+            return render([row], WEATHER_FIELDS, output_format)
+        return f"""
+城市: {row['city']}
+天气: {row['weather']}
+温度: {row['temp_c']}°C
+湿度: {row['humidity']}%
+风速: {row['wind_speed']} m/s
 """
-            else:
-                return f"获取天气信息失败: {resp.status_code}"
+    except WeatherAPIError as e:
+        return str(e)
+    except Exception as e:
+        return f"天气查询错误: {str(e)}"
+
+
+def _parse_city_list(cities: str) -> List[str]:
+    """解析城市列表（支持逗号、顿号、分号或换行分隔），按规范化名称去重并保持顺序"""
+    parsed = {}
+    for city in re.split(r"[,，、;；\n]", cities):
+        city = " ".join(city.split())
+        if city:
+            parsed.setdefault(normalize_weather_args(city), city)
+    return list(parsed.values())
+
+
+async def get_weather_batch(cities: str, output_format: str = "text") -> str:
+    """并发查询多个城市的天气并返回对比表格，已缓存的城市直接使用缓存结果
+    
+    所有城市共用连接池中同一主机的连接，一次工具调用代替逐个城市查询的多轮LLM函数调用。
+    """
+    check_output_format(output_format)
+    try:
+        city_list = _parse_city_list(cities)
+        if not city_list:
+            return "天气查询错误: 请提供至少一个城市名称"
+        
+        semaphore = asyncio.Semaphore(config.get_api_config()["weather_batch_concurrency"])
+        
+        async def fetch_one(city: str) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return await _fetch_weather(city)
+                except WeatherAPIError as e:
+                    return {"city": city, "error": str(e)}
+                except Exception as e:
+                    return {"city": city, "error": f"天气查询错误: {str(e)}"}
+        
+        rows = await asyncio.gather(*(fetch_one(city) for city in city_list))
+        failed = [row["city"] for row in rows if row.get("error")]
+        if len(failed) == len(rows):
+            return rows[0]["error"]
+        if output_format != "text":
+            result = render(rows, WEATHER_FIELDS + ("error",), output_format)
+        else:
+            lines = [f"多城市天气对比 (共 {len(rows)} 个城市)", "=" * 60, "城市 | 天气 | 温度(°C) | 湿度(%) | 风速(m/s)"]
+            for row in rows:
+                if row.get("error"):
+                    lines.append(f"{row['city']} | {row['error']}")
+                else:
+                    lines.append(f"{row['city']} | {row['weather']} | {row['temp_c']} | {row['humidity']} | {row['wind_speed']}")
+            result = "\n".join(lines)
+        if failed:
+            # 失败说明放在结果开头，工具注册表据此识别部分失败，不缓存整体结果
+            return f"{WEATHER_PARTIAL_PREFIX}: {', '.join(failed)}\n\n" + result
+        return result
+    
     except Exception as e:
         return f"天气查询错误: {str(e)}"
 
 
-def get_weather_sync(city: str) -> str:
+def get_weather_sync(city: str, output_format: str = "text") -> str:
     """同步版本的天气查询函数"""
-    return asyncio.run(get_weather(city))
+    return async_runner.run(get_weather(city, output_format))
+
+
+def get_weather_batch_sync(cities: str, output_format: str = "text") -> str:
+    """同步版本的多城市天气查询函数"""
+    return async_runner.run(get_weather_batch(cities, output_format))
+
+
+def normalize_weather_args(city: str) -> str:
+    """规范化城市名称（去除多余空白并忽略大小写），用作缓存键"""
+    return " ".join(city.split()).casefold()
+
+
+def normalize_weather_batch_args(cities: str) -> tuple:
+    """规范化城市列表（去重并保持顺序），用作缓存键"""
+    return tuple(normalize_weather_args(city) for city in _parse_city_list(cities))
 
 
 def get_weather_function_schema() -> Dict[str, Any]:
@@ -57,4 +176,22 @@ def get_weather_function_schema() -> Dict[str, Any]:
             },
             "required": ["city"]
         }
+    }
+
+
+def get_weather_batch_function_schema() -> Dict[str, Any]:
+    """获取多城市天气查询函数的schema定义"""
+    return {
+        "name": "get_weather_batch",
+        "description": "一次并发查询多个城市的天气信息，返回各城市天气的对比表格",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "cities": {
+                    "type": "string",
+                    "description": "城市名称列表，多个城市用逗号分隔，如 'Beijing,Shanghai,New York'"
+                }
+            },
+            "required": ["cities"]
+        }
     }
\ No newline at end of file
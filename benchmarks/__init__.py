@@ -0,0 +1,4 @@
+"""
+性能基准测试包
+使用本地桩服务测量各工具和Agent流程的性能
+"""
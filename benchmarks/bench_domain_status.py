@@ -0,0 +1,68 @@
+"""
+域名状态批量检测基准测试
+对比顺序检测与并发检测在本地桩服务上的吞吐量
+
+用法: python -m benchmarks.bench_domain_status --domains 200 --latency 0.05
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.stub_servers import DomainAPIStub
+
+# 旧实现每个请求之间固定休眠的秒数，用于估算旧版耗时
+LEGACY_SLEEP = 0.5
+
+
+def run_benchmark(domain_count: int, latency: float, concurrency: int, rate: float, throttle_every: int) -> dict:
+    """启动桩服务并分别以顺序和并发方式检测同一批域名"""
+    with DomainAPIStub(latency=latency, throttle_every=throttle_every) as stub:
+        # 配置在首次导入时读取，必须在导入工具模块前设置
+        os.environ["DOMAIN_API_BASE_URL"] = f"{stub.base_url}/V1/Dns"
+        from agents.domain_agent.domain_tools import batch_check_domains_status
+        from common.async_runner import async_runner
+        
+        domains = ",".join(f"bench-{i}.example.com" for i in range(domain_count))
+        results = {}
+        for mode, mode_concurrency in (("sequential", 1), ("concurrent", concurrency)):
+            stub.request_count = 0
+            start = time.perf_counter()
+            output = async_runner.run(
+                batch_check_domains_status(domains, concurrency=mode_concurrency, rate=rate),
+                timeout=0
+            )
+            elapsed = time.perf_counter() - start
+            ok = sum(1 for line in output.splitlines() if line.startswith("[") and "未被占用" in line)
+            results[mode] = {
+                "concurrency": mode_concurrency,
+                "wall_time_s": round(elapsed, 3),
+                "throughput_rps": round(domain_count / elapsed, 2),
+                "upstream_requests": stub.request_count,
+                "succeeded": ok,
+            }
+        async_runner.shutdown()
+    
+    results["legacy_estimate_s"] = round(domain_count * (latency + LEGACY_SLEEP) - LEGACY_SLEEP, 3)
+    results["speedup_vs_sequential"] = round(
+        results["sequential"]["wall_time_s"] / results["concurrent"]["wall_time_s"], 2
+    )
+    return results
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="域名状态批量检测基准测试")
+    parser.add_argument("--domains", type=int, default=200, help="检测的域名数量")
+    parser.add_argument("--latency", type=float, default=0.05, help="桩服务单次请求延迟（秒）")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发模式的并发上限")
+    parser.add_argument("--rate", type=float, default=200, help="令牌桶速率（每秒请求数）")
+    parser.add_argument("--throttle-every", type=int, default=0, help="每N个请求返回一次429")
+    args = parser.parse_args()
+    
+    results = run_benchmark(args.domains, args.latency, args.concurrency, args.rate, args.throttle_every)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+多意图查询基准测试
+在本地LLM桩服务和工具API桩服务上对比群组聊天与规划并发模式的轮数、LLM调用次数和耗时
+
+用法: python -m benchmarks.bench_fanout --llm-latency 0.5 --repeat 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from benchmarks.stub_servers import DomainAPIStub, IPAPIStub, MockLLMStub, WeatherAPIStub
+
+DEFAULT_QUERY = "请帮我查询北京天气、8.8.8.8的IP信息和当前日期"
+
+
+async def run_mode(manager, mode: str, query: str, llm: MockLLMStub, repeat: int) -> dict:
+    """以指定模式重复运行同一查询，统计轮数、LLM调用次数和耗时"""
+    runs = []
+    for _ in range(repeat):
+        calls_before = dict(llm.calls_by_kind)
+        start = time.perf_counter()
+        if mode == "group_chat":
+            result = await manager.arun_group_chat(query)
+            rounds = len(result.transcript)
+        else:
+            result = await manager.afanout_chat(query)
+            # 全部子任务并发执行为一轮，汇总为一轮
+            rounds = 1 + int(result.metadata.get("summarized", False))
+        elapsed = time.perf_counter() - start
+        calls = {kind: llm.calls_by_kind[kind] - calls_before[kind] for kind in calls_before}
+        runs.append({
+            "wall_time_s": elapsed,
+            "rounds": rounds,
+            "llm_calls": sum(calls.values()),
+            "llm_calls_by_kind": calls,
+            "error": result.error,
+        })
+    
+    summary = {
+        "wall_time_s": round(statistics.median(run["wall_time_s"] for run in runs), 3),
+        "rounds": statistics.median(run["rounds"] for run in runs),
+        "llm_calls": statistics.median(run["llm_calls"] for run in runs),
+        "llm_calls_by_kind": runs[-1]["llm_calls_by_kind"],
+        "errors": [run["error"] for run in runs if run["error"]],
+    }
+    if mode == "fanout":
+        summary["plan"] = result.metadata.get("plan")
+    return summary
+
+
+def run_benchmark(query: str, llm_latency: float, api_latency: float, repeat: int) -> dict:
+    """启动桩服务并分别以群组聊天和规划并发模式运行查询"""
+    llm = MockLLMStub(latency=llm_latency).start()
+    stubs = [
+        WeatherAPIStub(latency=api_latency).start(),
+        IPAPIStub(latency=api_latency).start(),
+        DomainAPIStub(latency=api_latency).start(),
+    ]
+    try:
+        # 配置在首次导入时读取，必须在导入Agent管理器前设置
+        os.environ["LLM_BASE_URL"] = f"{llm.base_url}/v1"
+        os.environ["WEATHER_API_BASE_URL"] = f"{stubs[0].base_url}/data/2.5/weather"
+        os.environ["IP_API_BASE_URL"] = stubs[1].base_url
+        os.environ["DOMAIN_API_BASE_URL"] = f"{stubs[2].base_url}/V1/Dns"
+        # 关闭LLM响应缓存，保证重复运行时每次LLM调用都到达桩服务
+        os.environ["LLM_CACHE_ENABLED"] = "false"
+        from common.agent_manager import agent_manager
+        from common.config import config
+        from mcp.tools_registry import tools_registry
+        
+        # 关闭AutoGen的磁盘缓存，保证每次LLM调用都到达桩服务
+        config.llm_config["cache_seed"] = None
+        
+        results = {"query": query, "llm_latency_s": llm_latency, "api_latency_s": api_latency, "repeat": repeat}
+        for mode in ("group_chat", "fanout"):
+            # 每种模式从空的工具缓存开始
+            tools_registry.clear_cache()
+            results[mode] = asyncio.run(run_mode(agent_manager, mode, query, llm, repeat))
+        agent_manager.shutdown()
+    finally:
+        llm.stop()
+        for stub in stubs:
+            stub.stop()
+    
+    results["speedup"] = round(results["group_chat"]["wall_time_s"] / results["fanout"]["wall_time_s"], 2)
+    results["llm_calls_saved"] = results["group_chat"]["llm_calls"] - results["fanout"]["llm_calls"]
+    return results
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="多意图查询基准测试：群组聊天 vs 规划并发")
+    parser.add_argument("--query", default=DEFAULT_QUERY, help="测试查询")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="LLM桩服务单次调用延迟（秒）")
+    parser.add_argument("--api-latency", type=float, default=0.1, help="工具API桩服务单次请求延迟（秒）")
+    parser.add_argument("--repeat", type=int, default=3, help="每种模式重复运行次数")
+    args = parser.parse_args()
+    
+    results = run_benchmark(args.query, args.llm_latency, args.api_latency, args.repeat)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
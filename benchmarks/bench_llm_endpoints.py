@@ -0,0 +1,118 @@
+"""
+LLM多端点负载均衡基准测试
+启动多个OpenAI兼容的LLM桩服务（其中一个较慢），对比单端点、负载均衡和负载均衡+对冲请求的延迟，
+并可在运行中让一个端点持续返回500以验证熔断和故障转移
+
+用法: python -m benchmarks.bench_llm_endpoints --endpoints 3 --requests 60 --concurrency 6
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_servers import MockLLMStub
+
+
+def percentile(values: list, p: float) -> float:
+    """计算p分位数"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def run_mode(http_client, base_url: str, requests: int, concurrency: int) -> dict:
+    """并发发送请求，统计延迟分布和错误数"""
+    from autogen import OpenAIWrapper
+    
+    client = OpenAIWrapper(config_list=[{
+        "model": "stub-model",
+        "api_key": "stub",
+        "base_url": base_url,
+        "http_client": http_client,
+        "cache_seed": None,
+    }])
+    
+    def call(i: int):
+        start = time.perf_counter()
+        try:
+            client.create(messages=[{"role": "user", "content": f"request {i}"}])
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, type(e).__name__
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(call, range(requests)))
+    latencies = [latency for latency, _ in results]
+    return {
+        "wall_time_s": round(time.perf_counter() - start, 3),
+        "p50_s": round(statistics.median(latencies), 4),
+        "p95_s": round(percentile(latencies, 95), 4),
+        "p99_s": round(percentile(latencies, 99), 4),
+        "errors": sum(1 for _, error in results if error),
+    }
+
+
+def run_benchmark(endpoints: int, requests: int, concurrency: int, latency: float, slow_latency: float,
+                  fail_endpoint: bool) -> dict:
+    """分别以单端点、负载均衡和负载均衡+对冲模式运行"""
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    from common.config import config
+    from common.llm_balancer import BALANCER_BASE_URL, LLMLoadBalancer
+    
+    # 第一个端点较慢，模拟拥塞的上游
+    stubs = [MockLLMStub(latency=slow_latency if i == 0 else latency).start() for i in range(endpoints)]
+    try:
+        policy = config.get_llm_endpoints_config()
+        policy["endpoints"] = [
+            {"name": f"stub-{i + 1}", "base_url": f"{stub.base_url}/v1", "api_key": "stub", "weight": 1.0}
+            for i, stub in enumerate(stubs)
+        ]
+        policy.update(hedge_min_samples=5, hedge_percentile=90)
+        
+        results = {
+            "endpoints": endpoints,
+            "requests": requests,
+            "concurrency": concurrency,
+            "latency_s": latency,
+            "slow_latency_s": slow_latency,
+        }
+        results["single"] = run_mode(None, f"{stubs[0].base_url}/v1", requests, concurrency)
+        for mode, hedge in (("balanced", False), ("balanced_hedged", True)):
+            balancer = LLMLoadBalancer({**policy, "hedge": hedge})
+            results[mode] = run_mode(balancer.http_client, BALANCER_BASE_URL, requests, concurrency)
+            results[mode]["balancer"] = balancer.get_stats()
+            balancer.close()
+        
+        if fail_endpoint:
+            # 最后一个端点持续返回500，请求应转移到其余端点且该端点被熔断
+            stubs[-1].fail_status = 500
+            balancer = LLMLoadBalancer(policy)
+            results["failover"] = run_mode(balancer.http_client, BALANCER_BASE_URL, requests, concurrency)
+            results["failover"]["balancer"] = balancer.get_stats()
+            balancer.close()
+    finally:
+        for stub in stubs:
+            stub.stop()
+    return results
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="LLM多端点负载均衡基准测试")
+    parser.add_argument("--endpoints", type=int, default=3, help="LLM桩服务数量")
+    parser.add_argument("--requests", type=int, default=60, help="每种模式的请求数")
+    parser.add_argument("--concurrency", type=int, default=6, help="并发请求数")
+    parser.add_argument("--latency", type=float, default=0.05, help="正常端点的响应延迟（秒）")
+    parser.add_argument("--slow-latency", type=float, default=0.5, help="慢端点的响应延迟（秒）")
+    parser.add_argument("--no-failover", action="store_true", help="跳过故障转移测试")
+    args = parser.parse_args()
+    
+    results = run_benchmark(args.endpoints, args.requests, args.concurrency, args.latency, args.slow_latency,
+                            not args.no_failover)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+启动耗时基准测试
+在全新的子进程中分别测量导入、首次获取单个Agent、创建全部Agent的耗时
+
+用法: python -m benchmarks.bench_startup --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# 在子进程中执行的测量脚本，结果以JSON输出到标准输出
+PROBE = r"""
+import json, sys, time, warnings
+warnings.filterwarnings("ignore")
+timings = {}
+start = time.perf_counter()
+from common.agent_manager import agent_manager
+from mcp.tools_registry import tools_registry
+timings["import_s"] = time.perf_counter() - start
+timings["autogen_loaded_after_import"] = "autogen" in sys.modules
+timings["modules_after_import"] = len(sys.modules)
+
+start = time.perf_counter()
+tools_registry.get_tools_info()
+timings["tools_info_s"] = time.perf_counter() - start
+
+start = time.perf_counter()
+agent_manager.get_agent(sys.argv[1])
+timings["first_agent_s"] = time.perf_counter() - start
+
+start = time.perf_counter()
+agent_manager.preload()
+timings["remaining_agents_s"] = time.perf_counter() - start
+timings["modules_after_preload"] = len(sys.modules)
+print(json.dumps(timings))
+"""
+
+
+def run_probe(agent_type: str) -> dict:
+    """在全新的Python进程中运行一次测量"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, agent_type],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_benchmark(repeat: int, agent_type: str) -> dict:
+    """重复测量并汇总各阶段耗时的中位数"""
+    runs = [run_probe(agent_type) for _ in range(repeat)]
+    summary = {"repeat": repeat, "agent_type": agent_type}
+    for key in ("import_s", "tools_info_s", "first_agent_s", "remaining_agents_s"):
+        values = [run[key] for run in runs]
+        summary[key] = {
+            "median": round(statistics.median(values), 4),
+            "min": round(min(values), 4),
+            "max": round(max(values), 4)
+        }
+    summary["startup_to_first_agent_s"] = round(
+        summary["import_s"]["median"] + summary["first_agent_s"]["median"], 4
+    )
+    summary["autogen_loaded_after_import"] = any(run["autogen_loaded_after_import"] for run in runs)
+    summary["modules_after_import"] = runs[-1]["modules_after_import"]
+    summary["modules_after_preload"] = runs[-1]["modules_after_preload"]
+    return summary
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="启动耗时基准测试")
+    parser.add_argument("--repeat", type=int, default=5, help="重复测量次数")
+    parser.add_argument("--agent", default="weather", help="首次获取的Agent类型")
+    args = parser.parse_args()
+    
+    results = run_benchmark(args.repeat, args.agent)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+端到端基准测试套件
+在本地LLM桩服务（按请求返回函数调用、发言者选择或文本回答）和天气、IP、域名API桩服务上，
+以不同并发度运行单Agent对话、智能路由对话和群组聊天，统计耗时、吞吐量、LLM调用次数和token数，
+结果以JSON输出，可用--compare与之前保存的结果对比
+
+用法: python -m benchmarks.bench_suite --concurrency 1,4,16 --requests 32 --output results.json
+      python -m benchmarks.bench_suite --compare results.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from benchmarks.stub_servers import DomainAPIStub, IPAPIStub, MockLLMStub, WeatherAPIStub
+
+SCENARIOS = ("chat", "route", "group")
+
+CITIES = ("北京", "上海", "广州", "深圳", "杭州", "成都", "武汉", "西安")
+
+# 智能路由的查询覆盖三条路径：可直接映射为工具调用的快速路径、本地规则分派给专业Agent、交给LLM路由助手
+ROUTE_QUERIES = (
+    "{ip}",
+    "明天天气怎么样，适合出门吗",
+    "帮我检测 bench{i}.com 是否可申请",
+    "你好，你能帮我做些什么",
+)
+
+
+def percentile(values: list, p: float) -> float:
+    """计算p分位数"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def build_query(scenario: str, i: int) -> str:
+    """第i个请求的查询，城市和IP轮换使用，避免全部命中工具缓存"""
+    city = CITIES[i % len(CITIES)]
+    ip = f"8.8.{i // 256 % 256}.{i % 256}"
+    if scenario == "chat":
+        return f"{city}天气怎么样"
+    if scenario == "route":
+        return ROUTE_QUERIES[i % len(ROUTE_QUERIES)].format(city=city, ip=ip, i=i)
+    return f"请查询{city}的天气和{ip}的归属地"
+
+
+def run_scenario(manager, scenario: str, query: str):
+    """运行一次对话，返回对话结果协程"""
+    if scenario == "chat":
+        return manager.achat_with_agent("weather", query)
+    if scenario == "route":
+        return manager.aroute_chat(query)
+    return manager.arun_group_chat(query)
+
+
+async def run_level(manager, scenario: str, concurrency: int, requests: int, llm: MockLLMStub,
+                    stubs: list) -> dict:
+    """以指定并发度运行requests次对话，统计耗时、吞吐量、LLM调用和token数"""
+    from agents.weather_agent import weather_tools
+    from common.llm_metrics import llm_metrics
+    from common.tracing import tracer
+    from mcp.tools_registry import tools_registry
+    
+    # 每个并发度从空的工具缓存（含天气批量查询共享的单城市缓存）和指标开始
+    tools_registry.clear_cache()
+    weather_tools._weather_cache.clear()
+    llm_metrics.reset()
+    tracer.reset()
+    routing_before = manager.get_routing_stats()
+    calls_before = dict(llm.calls_by_kind)
+    api_before = sum(stub.request_count for stub in stubs)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def run_one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await run_scenario(manager, scenario, build_query(scenario, i))
+            return time.perf_counter() - start, result
+    
+    start = time.perf_counter()
+    runs = await asyncio.gather(*(run_one(i) for i in range(requests)))
+    wall_time = time.perf_counter() - start
+    
+    latencies = [latency for latency, _ in runs]
+    errors = [result.error for _, result in runs if result.error]
+    roles = llm_metrics.get_stats()
+    calls = {kind: llm.calls_by_kind[kind] - calls_before[kind] for kind in calls_before}
+    prompt_tokens = sum(role["prompt_tokens"] for role in roles.values())
+    completion_tokens = sum(role["completion_tokens"] for role in roles.values())
+    level = {
+        "concurrency": concurrency,
+        "requests": requests,
+        "wall_time_s": round(wall_time, 3),
+        "throughput_per_s": round(requests / wall_time, 2),
+        "latency_s": {
+            "p50": round(statistics.median(latencies), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(max(latencies), 4),
+        },
+        "llm_calls": sum(calls.values()),
+        "llm_calls_by_kind": calls,
+        "llm_calls_per_request": round(sum(calls.values()) / requests, 2),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "tokens_per_request": round((prompt_tokens + completion_tokens) / requests, 1),
+        "api_requests": sum(stub.request_count for stub in stubs) - api_before,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+    }
+    # 按span类型汇总的延迟分布（取各类型中调用次数最多的span），开启追踪时才有
+    breakdown = {}
+    for name, histogram in tracer.get_histograms().items():
+        kind = histogram["kind"]
+        if kind in ("llm", "tool", "http") and histogram["count"] > breakdown.get(kind, {}).get("count", 0):
+            breakdown[kind] = {"span": name, "count": histogram["count"],
+                               "p50_ms": histogram["p50_ms"], "p95_ms": histogram["p95_ms"]}
+    if breakdown:
+        level["span_latency"] = breakdown
+    if scenario == "route":
+        routing = manager.get_routing_stats()
+        level["routing"] = {key: routing[key] - routing_before[key] for key in ("local", "llm_fallback", "fast_path")}
+    return level
+
+
+def compare_results(baseline: dict, current: dict) -> dict:
+    """按场景和并发度对比两次运行的吞吐量和p95延迟，变化为相对baseline的百分比"""
+    comparison = {}
+    for scenario, levels in current["scenarios"].items():
+        baseline_levels = {level["concurrency"]: level for level in baseline.get("scenarios", {}).get(scenario, [])}
+        rows = []
+        for level in levels:
+            before = baseline_levels.get(level["concurrency"])
+            if before is None:
+                continue
+            rows.append({
+                "concurrency": level["concurrency"],
+                "throughput_per_s": [before["throughput_per_s"], level["throughput_per_s"]],
+                "throughput_change_pct": round(
+                    (level["throughput_per_s"] / before["throughput_per_s"] - 1) * 100, 1
+                ) if before["throughput_per_s"] else None,
+                "p95_s": [before["latency_s"]["p95"], level["latency_s"]["p95"]],
+                "p95_change_pct": round(
+                    (level["latency_s"]["p95"] / before["latency_s"]["p95"] - 1) * 100, 1
+                ) if before["latency_s"]["p95"] else None,
+                "llm_calls_per_request": [before["llm_calls_per_request"], level["llm_calls_per_request"]],
+            })
+        if rows:
+            comparison[scenario] = rows
+    return comparison
+
+
+def run_benchmark(scenarios: list, concurrency_levels: list, requests: int, llm_latency: float,
+                  api_latency: float) -> dict:
+    """启动桩服务，依次以各并发度运行各场景"""
+    llm = MockLLMStub(latency=llm_latency).start()
+    stubs = [
+        WeatherAPIStub(latency=api_latency).start(),
+        IPAPIStub(latency=api_latency).start(),
+        DomainAPIStub(latency=api_latency).start(),
+    ]
+    try:
+        # 配置在首次导入时读取，必须在导入Agent管理器前设置
+        os.environ["LLM_BASE_URL"] = f"{llm.base_url}/v1"
+        os.environ["WEATHER_API_BASE_URL"] = f"{stubs[0].base_url}/data/2.5/weather"
+        os.environ["IP_API_BASE_URL"] = stubs[1].base_url
+        os.environ["DOMAIN_API_BASE_URL"] = f"{stubs[2].base_url}/V1/Dns"
+        # 关闭LLM响应缓存，保证每次LLM调用都到达桩服务；对话并发上限不低于测试的最大并发度
+        os.environ["LLM_CACHE_ENABLED"] = "false"
+        os.environ["MAX_CONCURRENT_CHATS"] = str(max(concurrency_levels))
+        from common.agent_manager import agent_manager
+        from common.config import config
+        
+        # 关闭AutoGen的磁盘缓存，保证每次LLM调用都到达桩服务
+        config.llm_config["cache_seed"] = None
+        
+        async def run_all() -> dict:
+            results = {}
+            for scenario in scenarios:
+                # 预热：首次对话包含模块导入和Agent创建，不计入统计；智能路由对每类查询各预热一次
+                for i in range(len(ROUTE_QUERIES) if scenario == "route" else 1):
+                    await run_scenario(agent_manager, scenario, build_query(scenario, i))
+                results[scenario] = [
+                    await run_level(agent_manager, scenario, concurrency, requests, llm, stubs)
+                    for concurrency in concurrency_levels
+                ]
+            return results
+        
+        results = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "llm_latency_s": llm_latency,
+            "api_latency_s": api_latency,
+            "scenarios": asyncio.run(run_all()),
+        }
+        agent_manager.shutdown()
+    finally:
+        llm.stop()
+        for stub in stubs:
+            stub.stop()
+    return results
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="端到端基准测试套件：单Agent对话、智能路由对话和群组聊天")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"逗号分隔的场景，可选: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,4,16", help="逗号分隔的并发度")
+    parser.add_argument("--requests", type=int, default=32, help="每个并发度运行的对话数")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="LLM桩服务单次调用延迟（秒）")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="工具API桩服务单次请求延迟（秒）")
+    parser.add_argument("--output", help="将结果JSON写入文件，供之后--compare使用")
+    parser.add_argument("--compare", help="与之前保存的结果JSON对比吞吐量和p95延迟")
+    args = parser.parse_args()
+    
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()]
+    unknown = [scenario for scenario in scenarios if scenario not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+    
+    # AutoGen执行函数调用时的输出改写到stderr，stdout只输出结果JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run_benchmark(scenarios, concurrency_levels, args.requests, args.llm_latency, args.api_latency)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            results["comparison"] = compare_results(json.load(f), results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+本地桩服务
+在后台线程中模拟上游API，供基准测试使用
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubServer:
+    """本地HTTP桩服务基类，子类实现handle方法返回响应"""
+    
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        """初始化桩服务，latency为每个请求的模拟延迟（秒）"""
+        self.latency = latency
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+    
+    @property
+    def base_url(self) -> str:
+        """桩服务根地址"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def handle(self, method: str, path: str, query: Dict[str, list], body: bytes) -> Tuple[int, Any, Dict[str, str]]:
+        """处理请求，返回(状态码, JSON负载或原始字节, 额外响应头)"""
+        return 404, {"error": "not found"}, {}
+    
+    def _next_request(self) -> int:
+        """记录请求数并返回当前序号"""
+        with self._count_lock:
+            self.request_count += 1
+            return self.request_count
+    
+    def _make_handler(self):
+        """构造绑定到当前桩服务的请求处理类"""
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 缓冲响应头和响应体一次写出，避免Nagle算法带来的额外延迟
+            wbufsize = 64 * 1024
+            
+            def _dispatch(self, method: str):
+                parsed = urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, payload, headers = stub.handle(method, parsed.path, parse_qs(parsed.query), body)
+                if isinstance(payload, bytes):
+                    data = payload
+                else:
+                    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                if "Content-Type" not in headers:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def do_GET(self):
+                self._dispatch("GET")
+            
+            def do_POST(self):
+                self._dispatch("POST")
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    def start(self) -> "StubServer":
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """停止服务"""
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def __enter__(self) -> "StubServer":
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class DomainAPIStub(StubServer):
+    """域名API桩服务，模拟domainsInfo和domainCheck接口"""
+    
+    def __init__(self, latency: float = 0.0, throttle_every: int = 0, fail_domains=(), **kwargs):
+        """throttle_every大于0时每N个请求返回一次429；domainsInfo请求包含fail_domains中的域名时整批返回失败"""
+        super().__init__(latency=latency, **kwargs)
+        self.throttle_every = throttle_every
+        self.fail_domains = set(fail_domains)
+    
+    def handle(self, method, path, query, body):
+        seq = self._next_request()
+        if self.throttle_every and seq % self.throttle_every == 0:
+            return 429, {"resStatus": 429, "resMsg": "too many requests"}, {"Retry-After": "0.05"}
+        
+        if path.endswith("/domainCheck"):
+            domain = query.get("domain", [""])[0]
+            return 200, {"resStatus": 200, "data": {"status": -1, "msg": f"{domain} 未被占用"}}, {}
+        
+        if path.endswith("/domainsInfo"):
+            domains = json.loads(body or b"{}").get("domains", [])
+            if self.fail_domains.intersection(domains):
+                return 200, {"resStatus": 500, "resMsg": "stub failure"}, {}
+            infos = [
+                {
+                    "domain": domain,
+                    "status": 1,
+                    "status_desc": "正常",
+                    "service_type": "web",
+                    "network": "public",
+                    "primary": "normal",
+                    "app_env": "prod",
+                    "owner": "stub",
+                }
+                for domain in domains
+            ]
+            return 200, {"resStatus": 200, "data": {"count": len(infos), "infos": infos}}, {}
+        
+        return super().handle(method, path, query, body)
+
+
+class WeatherAPIStub(StubServer):
+    """天气API桩服务，按OpenWeatherMap的响应格式返回固定天气"""
+    
+    def __init__(self, latency: float = 0.0, fail_cities=(), **kwargs):
+        """查询fail_cities中的城市时返回404"""
+        super().__init__(latency=latency, **kwargs)
+        self.fail_cities = set(fail_cities)
+    
+    def handle(self, method, path, query, body):
+        self._next_request()
+        city = query.get("q", ["Beijing"])[0]
+        if city in self.fail_cities:
+            return 404, {"cod": "404", "message": "city not found"}, {}
+        return 200, {
+            "name": city,
+            "weather": [{"description": "晴"}],
+            "main": {"temp": 21.5, "humidity": 40},
+            "wind": {"speed": 3.2},
+        }, {}
+
+
+class IPAPIStub(StubServer):
+    """IP归属地API桩服务，按ipapi.co的响应格式返回固定归属地"""
+    
+    def handle(self, method, path, query, body):
+        self._next_request()
+        ip = path.strip("/").split("/")[0]
+        return 200, {
+            "ip": ip,
+            "country_name": "United States",
+            "region": "California",
+            "city": "Mountain View",
+            "org": "STUB-ORG",
+            "timezone": "America/Los_Angeles",
+            "latitude": 37.4,
+            "longitude": -122.1,
+        }, {}
+
+
+class MockLLMStub(StubServer):
+    """OpenAI兼容的LLM桩服务
+    
+    提供函数定义且上一条不是函数结果时返回函数调用（参数从对话中提取），
+    GroupChat的发言者选择请求返回尚未发言的第一个Agent，其余请求返回文本回答；
+    请求中stream为true时以server-sent events分块返回。
+    """
+    
+    SELECT_SPEAKER_PATTERN = re.compile(r"select the next role from \[(.*?)\] to play")
+    
+    def __init__(self, latency: float = 0.0, fail_status: int = 0, **kwargs):
+        """fail_status不为0时所有请求都返回该状态码，可在运行中修改以模拟端点故障"""
+        super().__init__(latency=latency, **kwargs)
+        self.fail_status = fail_status
+        self.calls_by_kind = {"function_call": 0, "speaker_selection": 0, "text": 0}
+        self.prompt_tokens = 0
+        self.models = {}
+    
+    def handle(self, method, path, query, body):
+        self._next_request()
+        if self.fail_status:
+            return self.fail_status, {"error": {"message": "stub failure", "type": "server_error"}}, {}
+        request = json.loads(body or b"{}")
+        with self._count_lock:
+            model = request.get("model", "stub")
+            self.models[model] = self.models.get(model, 0) + 1
+        messages = request.get("messages", [])
+        text = "\n".join(str(message.get("content") or "") for message in messages)
+        functions = request.get("functions") or [tool["function"] for tool in request.get("tools") or []]
+        last_role = messages[-1].get("role") if messages else None
+        
+        selection = self.SELECT_SPEAKER_PATTERN.search(text)
+        if selection:
+            kind = "speaker_selection"
+            message = {"role": "assistant", "content": self._select_speaker(selection.group(1), messages)}
+        elif functions and last_role not in ("function", "tool"):
+            kind = "function_call"
+            function = functions[0]
+            required = function.get("parameters", {}).get("required", [])
+            arguments = {name: self._extract_argument(name, text) for name in required}
+            message = {
+                "role": "assistant",
+                "content": None,
+                "function_call": {"name": function["name"], "arguments": json.dumps(arguments, ensure_ascii=False)},
+            }
+        else:
+            kind = "text"
+            last = str(messages[-1].get("content") or "") if messages else ""
+            message = {"role": "assistant", "content": f"mock answer: {last.strip()[:80]}"}
+        
+        with self._count_lock:
+            self.calls_by_kind[kind] += 1
+            prompt_tokens = len(text) // 4
+            self.prompt_tokens += prompt_tokens
+        
+        finish_reason = "function_call" if message.get("function_call") else "stop"
+        if request.get("stream"):
+            return 200, self._stream_chunks(request, message, finish_reason), {"Content-Type": "text/event-stream"}
+        return 200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 10, "total_tokens": prompt_tokens + 10},
+        }, {}
+    
+    @staticmethod
+    def _select_speaker(agent_list: str, messages: list) -> str:
+        """选择尚未发言的第一个Agent（跳过用户代理）"""
+        names = [name.strip(" '\"") for name in agent_list.split(",")]
+        spoken = {message.get("name") for message in messages}
+        candidates = [name for name in names if name != "user_proxy"] or names
+        for name in candidates:
+            if name not in spoken:
+                return name
+        return candidates[0]
+    
+    @staticmethod
+    def _extract_argument(name: str, text: str) -> str:
+        """从对话文本中提取函数参数"""
+        from common.intent_router import extract_cities, extract_domains, extract_ips
+        
+        if name == "city":
+            return (extract_cities(text) or ["Beijing"])[0]
+        if name == "ip":
+            return (extract_ips(text) or ["8.8.8.8"])[0]
+        if name in ("domains", "domain"):
+            return ",".join(extract_domains(text) or ["example.com"])
+        return "stub"
+    
+    @staticmethod
+    def _stream_chunks(request: dict, message: dict, finish_reason: str) -> bytes:
+        """将完整回复拆分为流式分块"""
+        base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request.get("model", "stub")}
+        if message.get("function_call"):
+            deltas = [{"role": "assistant", "function_call": message["function_call"]}]
+        else:
+            deltas = [{"role": "assistant", "content": word + " "} for word in message["content"].split(" ")]
+        chunks = [{**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]} for delta in deltas]
+        chunks.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]})
+        data = b"".join(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n" for chunk in chunks)
+        return data + b"data: [DONE]\n\n"
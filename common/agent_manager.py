@@ -2,86 +2,209 @@
 Agent管理器
 统一管理和协调所有Agent
 """
-from typing import Dict, List, Any
-from autogen import AssistantAgent, UserProxyAgent, GroupChat, GroupChatManager
+import asyncio
+import contextlib
+import functools
+import importlib
+import json
+import threading
+from typing import TYPE_CHECKING, Dict, List, Any, AsyncIterator, Callable, Iterator
 
-from agents.weather_agent.weather_agent import WeatherAgent
-from agents.ip_agent.ip_agent import IPAgent
-from agents.domain_agent.domain_agent import DomainAgent
 from .config import config
+from .async_runner import async_runner
+from .conversation import ConversationRecorder, ConversationResult
+from .history_compaction import add_history_compaction, merge_compaction_stats
+from .intent_router import intent_router
+from .llm_metrics import llm_metrics
+from .planner import query_planner
+from .speaker_selection import SpeakerSelector
+from .streaming import ConversationStream, StreamEvent
+from .tracing import tracer
+from mcp.tools_registry import tools_registry
 
+if TYPE_CHECKING:
+    from autogen import AssistantAgent, UserProxyAgent
 
-class AgentManager:
-    """Agent管理器类"""
-    
-    def __init__(self):
-        """初始化Agent管理器"""
-        self.llm_config = config.get_llm_config()
-        self.agents = {}
-        self.user_proxy = None
-        self._initialize_agents()
-    
-    def _initialize_agents(self):
-        """初始化所有Agent"""
-        # 初始化天气Agent
-        self.weather_agent = WeatherAgent(self.llm_config)
-        self.agents["weather"] = self.weather_agent
-        
-        # 初始化IP查询Agent
-        self.ip_agent = IPAgent(self.llm_config)
-        self.agents["ip"] = self.ip_agent
-        
-        # 初始化域名查询Agent
-        self.domain_agent = DomainAgent(self.llm_config)
-        self.agents["domain"] = self.domain_agent
-        
-        # 初始化通用助手Agent
-        self.general_agent = AssistantAgent(
-            name="general_assistant",
-            system_message="""你是一个通用助手，负责协调和回答一般性问题。你的职责是：
+# autogen及各Agent模块导入耗时较长，均在首次使用时才导入
+
+
+def _create_general_agent(llm_config: dict) -> "AssistantAgent":
+    """创建通用助手Agent"""
+    from autogen import AssistantAgent
+    return AssistantAgent(
+        name="general_assistant",
+        system_message="""你是一个通用助手，负责协调和回答一般性问题。你的职责是：
 2. 识别用户需求并将其路由到专业助手
 3. 当用户询问天气时，请转交给weather_assistant
 4. 当用户询问IP地址时，请转交给ip_assistant
 5. 当用户询问域名查询或域名状态时，请转交给domain_assistant
 6. 协调多个专业助手的工作。""",
-            llm_config=self.llm_config
-        )
-        self.agents["general"] = self.general_agent
-        
-        # 初始化路由助手Agent
-        self.router_agent = AssistantAgent(
-            name="router_assistant",
-            system_message="""你是一个智能路由助手，负责分析用户意图并将任务分配给合适的专家。
+        llm_config=llm_config
+    )
+
+
+def _create_router_agent(llm_config: dict) -> "AssistantAgent":
+    """创建路由助手Agent"""
+    from autogen import AssistantAgent
+    return AssistantAgent(
+        name="router_assistant",
+        system_message="""你是一个智能路由助手，负责分析用户意图并将任务分配给合适的专家。
 根据问题类型选择专家：
 - 天气相关：转给weather_assistant
 - IP归属地：转给ip_assistant
 - 域名查询、域名状态检测：转给domain_assistant
 
 请先分析用户问题，然后决定由哪个专家处理""",
-            llm_config=self.llm_config
-        )
-        self.agents["router"] = self.router_agent
-        
-        # 初始化用户代理
-        self.user_proxy = UserProxyAgent(
-            "user_proxy",
-            code_execution_config=False,
-            human_input_mode="ALWAYS"
-        )
+        llm_config=llm_config
+    )
+
+
+def _to_async_function(function: Callable) -> Callable:
+    """将同步工具函数包装为在线程池中执行的协程函数，避免阻塞事件循环"""
+    @functools.wraps(function)
+    async def async_function(*args, **kwargs):
+        return await asyncio.to_thread(function, *args, **kwargs)
+    return async_function
+
+
+def _summarize_tool_output(message: str, output: str) -> str:
+    """用一次简短的LLM调用将工具输出整理为对用户问题的回答"""
+    from autogen import OpenAIWrapper
+    
+    llm_metrics.install()
+    client = OpenAIWrapper(**config.get_llm_config("summary"))
+    llm_metrics.register_wrapper(client, "summary")
+    try:
+        response = client.create(messages=[
+            {"role": "system", "content": "根据工具查询结果，用简洁友好的中文回答用户的问题，不要编造结果中没有的信息。"},
+            {"role": "user", "content": f"用户问题：{message}\n\n工具查询结果：\n{output}"}
+        ])
+    finally:
+        llm_metrics.unregister_wrapper(client)
+    return client.extract_text_or_completion_object(response)[0]
+
+
+@contextlib.contextmanager
+def _trace_conversation(result: ConversationResult) -> Iterator:
+    """为对话创建调用链路的根span（嵌套在规划并发对话中时为子span），对话出错时标记为失败"""
+    with tracer.span(f"conversation.{result.mode}", "conversation", conversation_id=result.conversation_id,
+                     agent_type=result.agent_type) as span:
+        yield span
+        if span is not None:
+            result.metadata["trace_id"] = span.trace_id
+            if result.error:
+                span.set_error(result.error)
+
+
+def _is_final_reply(message: Dict[str, Any]) -> bool:
+    """判断收到的消息是否为Agent的最终文本回答（非函数调用）"""
+    return bool(message.get("content")) and not message.get("function_call") and not message.get("tool_calls")
+
+
+class AgentManager:
+    """Agent管理器类"""
+    
+    # Agent类型到构造函数的映射，构造函数接收llm_config；
+    # 字符串形式为"模块路径:属性名"，在首次使用时才导入
+    AGENT_FACTORIES = {
+        "weather": "agents.weather_agent.weather_agent:WeatherAgent",
+        "ip": "agents.ip_agent.ip_agent:IPAgent",
+        "domain": "agents.domain_agent.domain_agent:DomainAgent",
+        "general": _create_general_agent,
+        "router": _create_router_agent,
+    }
+    
+    # Agent类型使用的模型角色，路由和通用助手只做简单的分类和协调
+    AGENT_ROLES = {
+        "weather": "specialist",
+        "ip": "specialist",
+        "domain": "specialist",
+        "general": "router",
+        "router": "router",
+    }
+    
+    def __init__(self):
+        """初始化Agent管理器，Agent在首次获取时才创建"""
+        self.agents = {}
+        self._user_proxy = None
+        self._chat_semaphores = {}
+        self._lock = threading.RLock()
+        self.fast_path_count = 0
+    
+    def _get_factory(self, agent_type: str) -> Callable:
+        """获取Agent构造函数，必要时导入其所在模块"""
+        factory = self.AGENT_FACTORIES[agent_type]
+        if isinstance(factory, str):
+            module_name, attr = factory.split(":")
+            factory = getattr(importlib.import_module(module_name), attr)
+        return factory
+    
+    @staticmethod
+    def _get_llm_config(role: str) -> Dict[str, Any]:
+        """获取指定角色的LLM配置，并确保LLM调用指标已开始记录"""
+        llm_metrics.install()
+        return config.get_llm_config(role)
+    
+    def _build_agent_obj(self, agent_type: str, llm_config: Dict[str, Any]):
+        """创建Agent对象（可能是包装类），并登记其模型角色"""
+        agent_obj = self._get_factory(agent_type)(llm_config)
+        agent = agent_obj.get_agent() if hasattr(agent_obj, 'get_agent') else agent_obj
+        llm_metrics.register_agent(agent.name, self.AGENT_ROLES.get(agent_type, "specialist"))
+        tracer.instrument_agent(agent)
+        return agent_obj
+    
+    def _create_agent(self, agent_type: str):
+        """创建不与其他对话共享的Agent实例"""
+        agent_obj = self._build_agent_obj(agent_type, self._get_llm_config(self.AGENT_ROLES.get(agent_type, "specialist")))
+        return agent_obj.get_agent() if hasattr(agent_obj, 'get_agent') else agent_obj
+    
+    def _get_agent_obj(self, agent_type: str):
+        """获取共享的Agent对象（可能是包装类），首次获取时创建"""
+        agent_obj = self.agents.get(agent_type)
+        if agent_obj is None and agent_type in self.AGENT_FACTORIES:
+            with self._lock:
+                agent_obj = self.agents.get(agent_type)
+                if agent_obj is None:
+                    agent_obj = self._build_agent_obj(
+                        agent_type, self._get_llm_config(self.AGENT_ROLES.get(agent_type, "specialist"))
+                    )
+                    self.agents[agent_type] = agent_obj
+        return agent_obj
+    
+    @property
+    def user_proxy(self) -> "UserProxyAgent":
+        """交互式用户代理，首次使用时创建"""
+        if self._user_proxy is None:
+            from autogen import UserProxyAgent
+            with self._lock:
+                if self._user_proxy is None:
+                    self._user_proxy = tracer.instrument_agent(UserProxyAgent(
+                        "user_proxy",
+                        code_execution_config=False,
+                        human_input_mode="ALWAYS"
+                    ))
+        return self._user_proxy
+    
+    def preload(self, agent_types: List[str] = None):
+        """预先创建指定（默认全部）Agent，用于需要预热的长驻服务"""
+        for agent_type in agent_types or self.AGENT_FACTORIES:
+            self._get_agent_obj(agent_type)
+        if config.get_ip_geo_config()["db_path"]:
+            # 本地IP库为CSV时首次加载需要编译索引，在启动时完成
+            from agents.ip_agent.ip_geo_db import ip_geo_db
+            ip_geo_db.load()
     
     def get_agent(self, agent_type: str):
         """获取指定类型的Agent"""
-        if agent_type in self.agents:
-            agent_obj = self.agents[agent_type]
-            if hasattr(agent_obj, 'get_agent'):
-                return agent_obj.get_agent()
-            return agent_obj
-        return None
+        agent_obj = self._get_agent_obj(agent_type)
+        if agent_obj is not None and hasattr(agent_obj, 'get_agent'):
+            return agent_obj.get_agent()
+        return agent_obj
     
     def get_all_agents(self) -> List:
         """获取所有Agent实例"""
         agent_list = [self.user_proxy]
-        for agent_key in self.agents:
+        for agent_key in self.AGENT_FACTORIES:
             agent = self.get_agent(agent_key)
             if agent:
                 agent_list.append(agent)
@@ -91,33 +214,355 @@ class AgentManager:
         """与指定Agent对话"""
         agent = self.get_agent(agent_type)
         if agent and self.user_proxy:
-            self.user_proxy.initiate_chat(agent, message=message)
+            with tracer.span("conversation.chat", "conversation", agent_type=agent_type, interactive=True):
+                self.user_proxy.initiate_chat(agent, message=message)
         else:
             print(f"Agent '{agent_type}' 不存在或用户代理未初始化")
     
+    def route_chat(self, message: str):
+        """智能路由对话：意图明确时由本地规则直接分派给专业Agent，否则交给路由助手"""
+        decision = intent_router.route(message)
+        tool_calls = self._plan_fast_path(decision, message)
+        if tool_calls:
+            # 快速路径中的工具调用各自占用运行器的并发名额，外层调用不占名额
+            result = async_runner.run(
+                self._run_fast_path(decision.agent_type, message, tool_calls),
+                timeout=config.get_chat_config()["timeout"],
+                limited=False
+            )
+            print(result.final_answer or result.error)
+            return
+        self.chat_with_agent(decision.agent_type if decision.is_local else "router", message)
+    
     def start_group_chat(self, message: str = None):
         """启动群组聊天"""
-        agents = self.get_all_agents()
+        from autogen import GroupChat, GroupChatManager
+        
+        # 每次群组聊天使用独立的Agent实例，历史压缩不会影响之后与单个Agent的对话
+        agents = [self.user_proxy] + [self._create_agent(agent_type) for agent_type in self.AGENT_FACTORIES]
+        selector = self._create_speaker_selector()
+        compactors = []
+        if config.get_compaction_config()["enabled"]:
+            compactors = [add_history_compaction(agent) for agent in agents[1:]]
         
-        group_chat = GroupChat(
+        group_chat = tracer.instrument_group_chat(GroupChat(
             agents=agents,
             messages=[],
-            max_round=10
-        )
+            max_round=config.get_chat_config()["group_max_round"],
+            speaker_selection_method=selector or "auto"
+        ))
         
-        manager = GroupChatManager(
+        # GroupChatManager的LLM只用于选择发言者
+        manager = tracer.instrument_agent(GroupChatManager(
             groupchat=group_chat,
-            llm_config=self.llm_config
-        )
+            llm_config=self._get_llm_config("speaker_selection")
+        ))
         
         default_message = message 
         
-        self.user_proxy.initiate_chat(manager, message=default_message)
+        with tracer.span("conversation.group_chat", "conversation", interactive=True):
+            self.user_proxy.initiate_chat(manager, message=default_message)
+        if selector:
+            stats = selector.get_stats()
+            print(f"\n🎯 发言者选择: 本地 {stats['local']} 次 / LLM {stats['llm_fallback']} 次，"
+                  f"节省LLM调用 {stats['llm_calls_saved']} 次")
+        if compactors:
+            total = merge_compaction_stats(compactors)["total"]
+            print(f"🗜️ 历史压缩: 约 {total['tokens_before']} -> {total['tokens_after']} tokens，"
+                  f"截断工具输出 {total['truncated']} 条，丢弃消息 {total['dropped']} 条")
+    
+    @staticmethod
+    def _create_speaker_selector() -> SpeakerSelector:
+        """按配置创建本地发言者选择器，配置为auto时返回None"""
+        if config.get_chat_config()["speaker_selection"] != "local":
+            return None
+        return SpeakerSelector()
+    
+    def _create_conversation_agent(self, agent_type: str, stream: bool = False) -> "AssistantAgent":
+        """为单次对话创建独立的Agent实例，工具函数改为异步执行"""
+        llm_config = self._get_llm_config(self.AGENT_ROLES.get(agent_type, "specialist"))
+        if stream:
+            llm_config["stream"] = True
+        agent_obj = self._build_agent_obj(agent_type, llm_config)
+        agent = agent_obj.get_agent() if hasattr(agent_obj, 'get_agent') else agent_obj
+        # 直接在function_map中替换为异步版本：register_function会为每个已注册的函数名发出覆盖警告
+        for name, function in list(agent.function_map.items()):
+            agent.function_map[name] = _to_async_function(function)
+        return agent
+    
+    def _create_auto_user_proxy(self, function_map: Dict[str, Callable] = None) -> "UserProxyAgent":
+        """创建非交互式用户代理，收到最终文本回答后结束对话"""
+        from autogen import UserProxyAgent
+        
+        chat_config = config.get_chat_config()
+        return tracer.instrument_agent(UserProxyAgent(
+            "user_proxy",
+            code_execution_config=False,
+            human_input_mode="NEVER",
+            max_consecutive_auto_reply=chat_config["max_auto_reply"],
+            default_auto_reply="TERMINATE",
+            is_termination_msg=_is_final_reply,
+            function_map=function_map
+        ))
+    
+    def _get_chat_semaphore(self) -> asyncio.Semaphore:
+        """获取当前事件循环上限制并发对话数的信号量"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._chat_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(config.get_chat_config()["max_concurrent_chats"])
+            self._chat_semaphores = {l: s for l, s in self._chat_semaphores.items() if not l.is_closed()}
+            self._chat_semaphores[loop] = semaphore
+        return semaphore
+    
+    async def _run_conversation(self, result: ConversationResult, recorder: ConversationRecorder,
+                                chat, timeout: float = None, stream: ConversationStream = None) -> ConversationResult:
+        """在并发限制和超时控制下运行对话，出错时保留已产生的对话记录"""
+        from autogen.io import IOStream
+        
+        timeout = config.get_chat_config()["timeout"] if timeout is None else timeout
+        error = None
+        # 流式模式下将AutoGen的输出流替换为当前对话的事件流，仅对本对话的任务生效
+        output = IOStream.set_default(stream) if stream else contextlib.nullcontext()
+        tracer.bind_loop()
+        with _trace_conversation(result):
+            async with self._get_chat_semaphore():
+                try:
+                    with output:
+                        await asyncio.wait_for(chat, timeout)
+                except asyncio.TimeoutError:
+                    error = f"对话超时（{timeout}秒）"
+                except Exception as e:
+                    error = f"对话错误: {str(e)}"
+            result.finish(recorder, error)
+        return result
+    
+    async def achat_with_agent(self, agent_type: str, message: str, timeout: float = None,
+                               stream: ConversationStream = None) -> ConversationResult:
+        """非交互式地与指定Agent对话，多个对话可在同一事件循环中并发运行"""
+        if agent_type not in self.AGENT_FACTORIES:
+            raise ValueError(f"Agent '{agent_type}' 不存在")
+        
+        result = ConversationResult("chat", message, agent_type)
+        agent = self._create_conversation_agent(agent_type, stream=stream is not None)
+        # 用户代理负责执行Agent建议的函数调用
+        user_proxy = self._create_auto_user_proxy(function_map=agent.function_map)
+        recorder = ConversationRecorder(exclude_from_answer=(user_proxy.name,))
+        recorder.attach([user_proxy, agent])
+        if stream:
+            stream.attach([user_proxy, agent])
+        
+        chat = user_proxy.a_initiate_chat(agent, message=message, silent=True)
+        return await self._run_conversation(result, recorder, chat, timeout, stream)
+    
+    def _plan_fast_path(self, decision, message: str) -> list:
+        """判断本地路由结果能否直接映射为工具调用，返回(工具名, 参数)列表"""
+        if not decision.is_local or not config.get_routing_config()["fast_path"]:
+            return []
+        return tools_registry.plan_fast_path(decision.agent_type, decision.entities, message)
+    
+    @staticmethod
+    async def _call_tool(recorder: ConversationRecorder, stream: ConversationStream, caller: str,
+                         name: str, arguments: Dict[str, Any], for_llm: bool = False) -> str:
+        """不经LLM直接调用工具，并像Agent函数调用一样记录调用和结果
+        
+        for_llm为True时结果还要交给LLM汇总，按该工具送入LLM上下文的格式输出，否则按展示格式输出。
+        """
+        schema_name = tools_registry.get_tool_schema(name)["name"]
+        function_call = {"name": schema_name, "arguments": json.dumps(arguments, ensure_ascii=False)}
+        recorder.record(caller, "user_proxy", {"content": None, "function_call": function_call})
+        if stream:
+            stream.emit(StreamEvent("tool_call", agent=caller, data=function_call))
+        if for_llm:
+            function = tools_registry.get_llm_tool_function(name)
+        else:
+            function = tools_registry.get_tool_function(name, tools_registry.get_display_output_format())
+        output = await _to_async_function(function)(**arguments)
+        recorder.record("user_proxy", caller, {"role": "function", "name": schema_name, "content": output})
+        if stream:
+            stream.emit(StreamEvent("tool_result", agent="user_proxy", content=output, data={"name": schema_name}))
+        return output
+    
+    @staticmethod
+    async def _run_local(result: ConversationResult, recorder: ConversationRecorder, run: Callable,
+                         timeout: float = None) -> ConversationResult:
+        """在超时控制下运行本地编排的流程，run返回最终回答，出错时保留已产生的记录"""
+        timeout = config.get_chat_config()["timeout"] if timeout is None else timeout
+        error = None
+        tracer.bind_loop()
+        with _trace_conversation(result):
+            try:
+                await asyncio.wait_for(run(), timeout)
+            except asyncio.TimeoutError:
+                error = f"对话超时（{timeout}秒）"
+            except Exception as e:
+                error = f"对话错误: {str(e)}"
+            result.finish(recorder, error)
+        return result
+    
+    async def _run_fast_path(self, agent_type: str, message: str, tool_calls: list, timeout: float = None,
+                             stream: ConversationStream = None) -> ConversationResult:
+        """跳过LLM直接执行工具调用，返回工具的格式化输出（可选用LLM简短润色）"""
+        summarize = config.get_routing_config()["fast_path_summarize"]
+        result = ConversationResult("fast_path", message, agent_type)
+        result.metadata["fast_path"] = {
+            "tool_calls": [{"name": name, "arguments": arguments} for name, arguments in tool_calls],
+            "summarized": summarize
+        }
+        recorder = ConversationRecorder(exclude_from_answer=("user_proxy",))
+        
+        async def run():
+            outputs = await asyncio.gather(*(
+                self._call_tool(recorder, stream, "fast_path", name, arguments, summarize)
+                for name, arguments in tool_calls
+            ))
+            answer = "\n\n".join(output.strip() for output in outputs)
+            if summarize:
+                answer = await asyncio.to_thread(_summarize_tool_output, message, answer)
+            recorder.record("fast_path", "user_proxy", answer)
+            if stream:
+                stream.emit(StreamEvent("message", agent="fast_path", content=answer, data={"recipient": "user_proxy"}))
+        
+        with self._lock:
+            self.fast_path_count += 1
+        return await self._run_local(result, recorder, run, timeout)
+    
+    async def afanout_chat(self, message: str, timeout: float = None,
+                           stream: ConversationStream = None) -> ConversationResult:
+        """规划并发模式：一次性分解查询，各子任务并发执行后做一次汇总；无法分解时退回智能路由"""
+        plan = query_planner.plan(message)
+        if not plan:
+            result = await self.aroute_chat(message, timeout, stream)
+            result.metadata["plan"] = []
+            return result
+        
+        summarize = config.get_routing_config()["fanout_summarize"]
+        result = ConversationResult("fanout", message)
+        result.metadata["plan"] = [task.to_dict() for task in plan]
+        result.metadata["summarized"] = summarize
+        recorder = ConversationRecorder(exclude_from_answer=("user_proxy",))
+        
+        async def run_subtask(task) -> str:
+            if task.kind == "tool":
+                outputs = await asyncio.gather(*(
+                    self._call_tool(recorder, stream, "planner", name, arguments, summarize)
+                    for name, arguments in task.tool_calls
+                ))
+                return "\n\n".join(output.strip() for output in outputs)
+            if task.kind == "agent":
+                sub_result = await self.achat_with_agent(task.agent_type, task.message, timeout, stream)
+                recorder.messages.extend(sub_result.transcript)
+                return sub_result.final_answer or sub_result.error or ""
+            return task.function()
+        
+        async def run():
+            outputs = await asyncio.gather(*(run_subtask(task) for task in plan))
+            answer = "\n\n".join(f"【{task.label}】\n{output.strip()}" for task, output in zip(plan, outputs))
+            if summarize:
+                answer = await asyncio.to_thread(_summarize_tool_output, message, answer)
+            recorder.record("planner", "user_proxy", answer)
+            if stream:
+                stream.emit(StreamEvent("message", agent="planner", content=answer, data={"recipient": "user_proxy"}))
+        
+        return await self._run_local(result, recorder, run, timeout)
+    
+    async def aroute_chat(self, message: str, timeout: float = None,
+                          stream: ConversationStream = None) -> ConversationResult:
+        """非交互式地进行智能路由对话，意图明确时跳过路由助手直接与专业Agent对话，
+        可直接映射为工具调用时跳过LLM直接调用工具"""
+        decision = intent_router.route(message)
+        tool_calls = self._plan_fast_path(decision, message)
+        if tool_calls:
+            result = await self._run_fast_path(decision.agent_type, message, tool_calls, timeout, stream)
+        else:
+            agent_type = decision.agent_type if decision.is_local else "router"
+            result = await self.achat_with_agent(agent_type, message, timeout, stream)
+        result.mode = "route"
+        result.metadata["route"] = decision.to_dict()
+        return result
+    
+    async def arun_group_chat(self, message: str, timeout: float = None,
+                              stream: ConversationStream = None) -> ConversationResult:
+        """非交互式地运行群组聊天，每次调用使用独立的Agent实例"""
+        from autogen import GroupChat, GroupChatManager
+        
+        result = ConversationResult("group_chat", message)
+        user_proxy = self._create_auto_user_proxy()
+        participants = [user_proxy] + [
+            self._create_conversation_agent(agent_type, stream=stream is not None)
+            for agent_type in self.AGENT_FACTORIES
+        ]
+        
+        compactors = []
+        if config.get_compaction_config()["enabled"]:
+            compactors = [add_history_compaction(agent) for agent in participants[1:]]
+        selector = self._create_speaker_selector()
+        group_chat = tracer.instrument_group_chat(GroupChat(
+            agents=participants,
+            messages=[],
+            max_round=config.get_chat_config()["group_max_round"],
+            speaker_selection_method=selector or "auto"
+        ))
+        manager = tracer.instrument_agent(GroupChatManager(
+            groupchat=group_chat,
+            llm_config=self._get_llm_config("speaker_selection"),
+            silent=True
+        ))
+        recorder = ConversationRecorder(exclude_from_answer=(user_proxy.name,))
+        recorder.attach(participants)
+        if stream:
+            stream.attach(participants)
+        
+        chat = user_proxy.a_initiate_chat(manager, message=message, silent=True)
+        result = await self._run_conversation(result, recorder, chat, timeout, stream)
+        if selector:
+            result.metadata["speaker_selection"] = selector.get_stats()
+        if compactors:
+            result.metadata["history_compaction"] = merge_compaction_stats(compactors)
+        return result
+    
+    async def _astream(self, run: Callable) -> AsyncIterator[StreamEvent]:
+        """运行对话并逐个产出事件，最后产出包含完整对话结果的done事件"""
+        stream = ConversationStream()
+        task = asyncio.create_task(run(stream))
+        task.add_done_callback(lambda _: stream.close())
+        try:
+            async for event in stream.events():
+                yield event
+            result = await task
+            yield StreamEvent("done", data=result.to_dict())
+        finally:
+            # 调用方提前停止迭代时取消对话
+            if not task.done():
+                task.cancel()
+    
+    def astream_chat(self, agent_type: str, message: str, timeout: float = None) -> AsyncIterator[StreamEvent]:
+        """流式地与指定Agent对话，返回事件的异步迭代器"""
+        if agent_type not in self.AGENT_FACTORIES:
+            raise ValueError(f"Agent '{agent_type}' 不存在")
+        return self._astream(lambda stream: self.achat_with_agent(agent_type, message, timeout, stream))
+    
+    def astream_route_chat(self, message: str, timeout: float = None) -> AsyncIterator[StreamEvent]:
+        """流式地进行智能路由对话"""
+        return self._astream(lambda stream: self.aroute_chat(message, timeout, stream))
+    
+    def astream_group_chat(self, message: str, timeout: float = None) -> AsyncIterator[StreamEvent]:
+        """流式地运行群组聊天"""
+        return self._astream(lambda stream: self.arun_group_chat(message, timeout, stream))
+    
+    def astream_fanout_chat(self, message: str, timeout: float = None) -> AsyncIterator[StreamEvent]:
+        """流式地运行规划并发对话"""
+        return self._astream(lambda stream: self.afanout_chat(message, timeout, stream))
+    
+    def stream_chat(self, agent_type: str, message: str, timeout: float = None) -> Iterator[StreamEvent]:
+        """流式地与指定Agent对话，返回事件的同步生成器"""
+        return async_runner.iterate(self.astream_chat(agent_type, message, timeout))
     
     def get_agent_info(self) -> Dict[str, Any]:
         """获取所有Agent信息"""
         info = {}
-        for agent_type, agent_obj in self.agents.items():
+        for agent_type in self.AGENT_FACTORIES:
+            agent_obj = self._get_agent_obj(agent_type)
             if hasattr(agent_obj, 'get_capabilities'):
                 info[agent_type] = {
                     "name": agent_obj.get_name(),
@@ -129,7 +574,67 @@ class AgentManager:
                     "capabilities": ["通用对话", "任务协调"]
                 }
         return info
+    
+    def get_routing_stats(self) -> Dict[str, Any]:
+        """获取本地规则路由统计信息，fast_path为跳过LLM直接调用工具的请求数"""
+        stats = intent_router.get_stats()
+        stats["fast_path"] = self.fast_path_count
+        return stats
+    
+    def get_llm_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """按模型角色获取LLM调用的延迟和token统计"""
+        return llm_metrics.get_stats()
+    
+    def get_llm_cache_stats(self) -> Dict[str, Any]:
+        """获取LLM响应缓存统计信息，未开启缓存时返回None"""
+        if not config.get_llm_cache_config()["enabled"]:
+            return None
+        from .llm_cache import llm_cache
+        return llm_cache.get_stats()
+    
+    def get_llm_endpoint_stats(self) -> Dict[str, Any]:
+        """获取LLM多端点负载均衡统计信息，未配置多端点时返回None"""
+        if not config.get_llm_endpoints_config()["endpoints"]:
+            return None
+        from .llm_balancer import llm_balancer
+        return llm_balancer.get_stats()
+    
+    def get_latency_histograms(self) -> Dict[str, Dict[str, Any]]:
+        """按span名称获取对话、LLM调用、工具调用和HTTP请求的延迟分布（p50/p95/p99）"""
+        return tracer.get_histograms()
+    
+    def get_recent_traces(self, limit: int = None) -> List[Dict[str, Any]]:
+        """获取最近完成的对话调用链路，最新的在前"""
+        return tracer.get_recent_traces(limit)
+    
+    def get_tracing_stats(self) -> Dict[str, Any]:
+        """获取调用链路追踪统计信息"""
+        return tracer.get_stats()
+    
+    def get_ip_geo_stats(self) -> Dict[str, Any]:
+        """获取本地IP库统计信息，未配置本地库时返回None"""
+        if not config.get_ip_geo_config()["db_path"]:
+            return None
+        from agents.ip_agent.ip_geo_db import ip_geo_db
+        return ip_geo_db.get_stats()
+    
+    def shutdown(self):
+        """关闭Agent管理器，释放共享的HTTP连接、LLM响应缓存、LLM端点连接、本地IP库、追踪导出器和后台事件循环"""
+        from .http_client import http_client_pool
+        
+        http_client_pool.close()
+        if config.get_llm_cache_config()["enabled"]:
+            from .llm_cache import llm_cache
+            llm_cache.close()
+        if config.get_llm_endpoints_config()["endpoints"]:
+            from .llm_balancer import llm_balancer
+            llm_balancer.close()
+        if config.get_ip_geo_config()["db_path"]:
+            from agents.ip_agent.ip_geo_db import ip_geo_db
+            ip_geo_db.close()
+        tracer.close()
+        async_runner.shutdown()
 
 
 # 全局Agent管理器实例
-agent_manager = AgentManager()
\ No newline at end of file
+agent_manager = AgentManager()
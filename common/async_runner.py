@@ -0,0 +1,138 @@
+"""
+后台事件循环运行器
+在常驻后台线程中运行事件循环，供同步工具函数提交协程
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import queue
+import threading
+from typing import Any, AsyncIterable, Awaitable, Dict, Iterator
+
+from .config import config
+
+
+class AsyncRunner:
+    """后台事件循环运行器类，限制并发并为每次调用设置超时"""
+    
+    def __init__(self, runner_config: Dict[str, Any] = None):
+        """初始化运行器，事件循环在首次提交时启动"""
+        runner_config = runner_config or config.get_runner_config()
+        self.max_concurrency = runner_config["max_concurrency"]
+        self.default_timeout = runner_config["default_timeout"]
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+    
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        """确保后台线程和事件循环已启动"""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                thread = threading.Thread(
+                    target=self._run_loop,
+                    args=(loop, ready),
+                    name="async-runner",
+                    daemon=True
+                )
+                thread.start()
+                ready.wait()
+                self._loop = loop
+                self._thread = thread
+            return self._loop
+    
+    def _run_loop(self, loop: asyncio.AbstractEventLoop, ready: threading.Event):
+        """后台线程入口"""
+        asyncio.set_event_loop(loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        loop.call_soon(ready.set)
+        loop.run_forever()
+    
+    @staticmethod
+    async def _run_in_context(coro: Awaitable, context: contextvars.Context) -> Any:
+        """在任务中恢复提交方线程的上下文变量（如当前追踪span）后执行协程"""
+        for var, value in context.items():
+            var.set(value)
+        return await coro
+    
+    async def _run_limited(self, coro: Awaitable) -> Any:
+        """在并发限制内执行协程"""
+        async with self._semaphore:
+            return await coro
+    
+    def submit(self, coro: Awaitable, timeout: float = None, limited: bool = True) -> concurrent.futures.Future:
+        """提交协程到后台事件循环，返回concurrent.futures.Future"""
+        loop = self._ensure_started()
+        timeout = self.default_timeout if timeout is None else timeout
+        coro = self._run_in_context(coro, contextvars.copy_context())
+        # 超时包含排队等待并发名额的时间
+        if limited:
+            coro = self._run_limited(coro)
+        wrapped = asyncio.wait_for(coro, timeout if timeout > 0 else None)
+        return asyncio.run_coroutine_threadsafe(wrapped, loop)
+    
+    def run(self, coro: Awaitable, timeout: float = None, limited: bool = True) -> Any:
+        """同步执行协程并返回结果，可在已运行事件循环的线程中调用
+        
+        协程内部还会通过run提交工具调用时应传入limited=False，只让内层调用占用并发名额，避免外层调用占满名额后互相等待。
+        """
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("不能在运行器线程内同步等待协程，请直接await")
+        return self.submit(coro, timeout, limited).result()
+    
+    def iterate(self, async_iterable: AsyncIterable) -> Iterator:
+        """在后台事件循环中消费异步迭代器，以同步生成器的形式逐个返回元素"""
+        items = queue.Queue()
+        
+        async def pump():
+            try:
+                async for item in async_iterable:
+                    items.put((True, item))
+                items.put((False, None))
+            except BaseException as e:
+                items.put((False, e))
+                raise
+        
+        # 长时间运行的迭代不占用工具调用的并发名额，避免与其内部的工具调用相互等待
+        future = self.submit(pump(), timeout=0, limited=False)
+        try:
+            while True:
+                has_item, item = items.get()
+                if not has_item:
+                    if item is not None:
+                        raise item
+                    return
+                yield item
+        finally:
+            future.cancel()
+    
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        """获取后台事件循环"""
+        return self._ensure_started()
+    
+    def shutdown(self, timeout: float = 5):
+        """取消未完成的任务并停止后台事件循环"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = None
+            self._thread = None
+        if loop is None or loop.is_closed():
+            return
+        
+        async def _cancel_pending():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        asyncio.run_coroutine_threadsafe(_cancel_pending(), loop).result(timeout)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        loop.close()
+
+
+# 全局后台事件循环运行器实例
+async_runner = AsyncRunner()
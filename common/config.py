@@ -2,6 +2,7 @@
 配置管理模块
 统一管理所有Agent的配置信息
 """
+import json
 import os
 from dotenv import load_dotenv
 from typing import Dict, Any
@@ -17,6 +18,22 @@ class Config:
         """初始化配置"""
         self.llm_config = self._get_llm_config()
         self.weather_api_key = self._get_weather_api_key()
+        self.http_config = self._get_http_config()
+        self.runner_config = self._get_runner_config()
+        self.domain_config = self._get_domain_config()
+        self.cache_config = self._get_cache_config()
+        self.chat_config = self._get_chat_config()
+        self.server_config = self._get_server_config()
+        self.routing_config = self._get_routing_config()
+        self.api_config = self._get_api_config()
+        self.compaction_config = self._get_compaction_config()
+        self.tool_output_config = self._get_tool_output_config()
+        self.llm_cache_config = self._get_llm_cache_config()
+        self.llm_endpoints_config = self._get_llm_endpoints_config()
+        self.llm_roles_config = self._get_llm_roles_config()
+        self.ip_geo_config = self._get_ip_geo_config()
+        self.ip_batch_config = self._get_ip_batch_config()
+        self.tracing_config = self._get_tracing_config()
     
     def _get_llm_config(self) -> Dict[str, Any]:
         """获取LLM配置"""
@@ -35,13 +52,325 @@ class Config:
         """获取天气API密钥"""
         return os.getenv("WEATHER_API_KEY", "becab1d22273f6792a96265302e1057b")
     
-    def get_llm_config(self) -> Dict[str, Any]:
-        """获取LLM配置"""
-        return self.llm_config.copy()
+    def _get_http_config(self) -> Dict[str, Any]:
+        """获取HTTP连接池配置"""
+        return {
+            "timeout": float(os.getenv("HTTP_TIMEOUT", "30")),
+            "max_connections_per_host": int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "20")),
+            "max_keepalive_connections": int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10")),
+            "keepalive_expiry": float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60")),
+            "http2": os.getenv("HTTP_ENABLE_HTTP2", "true").lower() == "true",
+        }
+    
+    def _get_runner_config(self) -> Dict[str, Any]:
+        """获取后台事件循环运行器配置"""
+        return {
+            "max_concurrency": int(os.getenv("ASYNC_RUNNER_MAX_CONCURRENCY", "32")),
+            "default_timeout": float(os.getenv("TOOL_CALL_TIMEOUT", "60")),
+        }
+    
+    def _get_domain_config(self) -> Dict[str, Any]:
+        """获取域名API配置"""
+        return {
+            "base_url": os.getenv("DOMAIN_API_BASE_URL", "http://api-np.jd.local/V1/Dns"),
+            "check_concurrency": int(os.getenv("DOMAIN_CHECK_CONCURRENCY", "10")),
+            "check_rate": float(os.getenv("DOMAIN_CHECK_RATE", "10")),
+            "info_chunk_size": int(os.getenv("DOMAIN_INFO_CHUNK_SIZE", "50")),
+            "bulk_window": int(os.getenv("DOMAIN_BULK_WINDOW", "500")),
+            # 域名文件批量处理工具只能读写此目录内的文件，单次处理的超时（秒）
+            "bulk_dir": os.getenv("DOMAIN_BULK_DIR", "data/domains"),
+            "bulk_timeout": float(os.getenv("DOMAIN_BULK_TIMEOUT", "3600")),
+            "max_retries": int(os.getenv("MAX_RETRIES", "3")),
+        }
+    
+    def _get_cache_config(self) -> Dict[str, Any]:
+        """获取工具结果缓存配置（TTL单位为秒）"""
+        return {
+            "max_size": int(os.getenv("TOOL_CACHE_MAX_SIZE", "1024")),
+            "weather_ttl": float(os.getenv("WEATHER_CACHE_TTL", "600")),
+            "ip_ttl": float(os.getenv("IP_CACHE_TTL", "259200")),
+            "domain_info_ttl": float(os.getenv("DOMAIN_INFO_CACHE_TTL", "21600")),
+            "domain_entry_max_size": int(os.getenv("DOMAIN_ENTRY_CACHE_MAX_SIZE", "10000")),
+        }
+    
+    def _get_chat_config(self) -> Dict[str, Any]:
+        """获取非交互式对话配置"""
+        return {
+            "max_concurrent_chats": int(os.getenv("MAX_CONCURRENT_CHATS", "16")),
+            "timeout": float(os.getenv("CHAT_TIMEOUT", "300")),
+            "max_auto_reply": int(os.getenv("CHAT_MAX_AUTO_REPLY", "10")),
+            "group_max_round": int(os.getenv("GROUP_CHAT_MAX_ROUND", "10")),
+            # 群组聊天发言者选择方式：local为本地规则（无法判断时退回LLM），auto为全部由LLM选择
+            "speaker_selection": os.getenv("GROUP_CHAT_SPEAKER_SELECTION", "local"),
+        }
+    
+    def _get_server_config(self) -> Dict[str, Any]:
+        """获取HTTP服务配置"""
+        return {
+            "host": os.getenv("SERVER_HOST", "0.0.0.0"),
+            "port": int(os.getenv("SERVER_PORT", "8000")),
+            "workers": int(os.getenv("SERVER_WORKERS", "1")),
+            "max_concurrency": int(os.getenv("SERVER_MAX_CONCURRENCY", "16")),
+            "max_queue": int(os.getenv("SERVER_MAX_QUEUE", "64")),
+            "shutdown_timeout": float(os.getenv("SERVER_SHUTDOWN_TIMEOUT", "30")),
+            "max_body_bytes": int(os.getenv("SERVER_MAX_BODY_BYTES", "1048576")),
+        }
+    
+    def _get_routing_config(self) -> Dict[str, Any]:
+        """获取本地规则路由配置"""
+        return {
+            "enabled": os.getenv("LOCAL_ROUTING_ENABLED", "true").lower() == "true",
+            "confidence_threshold": float(os.getenv("LOCAL_ROUTING_CONFIDENCE", "0.5")),
+            # 意图明确且可直接映射为工具调用时跳过LLM，直接返回工具输出
+            "fast_path": os.getenv("FAST_PATH_ENABLED", "true").lower() == "true",
+            # 直接调用工具后再用一次简短的LLM调用润色结果
+            "fast_path_summarize": os.getenv("FAST_PATH_SUMMARIZE", "false").lower() == "true",
+            # 规划并发模式在子任务完成后用一次LLM调用汇总结果
+            "fanout_summarize": os.getenv("FANOUT_SUMMARIZE", "true").lower() == "true",
+        }
+    
+    def _get_api_config(self) -> Dict[str, Any]:
+        """获取第三方查询API地址配置，weather_batch_concurrency为多城市天气查询的并发数"""
+        return {
+            "weather_base_url": os.getenv("WEATHER_API_BASE_URL", "https://api.openweathermap.org/data/2.5/weather"),
+            "ip_base_url": os.getenv("IP_API_BASE_URL", "http://ipapi.co"),
+            "weather_batch_concurrency": int(os.getenv("WEATHER_BATCH_CONCURRENCY", "10")),
+        }
+    
+    def _get_compaction_config(self) -> Dict[str, Any]:
+        """获取群组聊天历史压缩配置"""
+        return {
+            "enabled": os.getenv("HISTORY_COMPACTION_ENABLED", "true").lower() == "true",
+            "max_tokens": int(os.getenv("HISTORY_MAX_TOKENS", "3000")),
+            "keep_recent": int(os.getenv("HISTORY_KEEP_RECENT", "4")),
+            "tool_output_max_chars": int(os.getenv("HISTORY_TOOL_OUTPUT_MAX_CHARS", "500")),
+            "relevant_only": os.getenv("HISTORY_RELEVANT_ONLY", "true").lower() == "true",
+        }
+    
+    def _get_tool_output_config(self) -> Dict[str, Any]:
+        """获取工具输出格式配置"""
+        # 按工具单独指定送入LLM上下文的格式，如 "domain_info=json,weather=text"
+        overrides = {}
+        for item in os.getenv("TOOL_LLM_OUTPUT_FORMATS", "").split(","):
+            if "=" in item:
+                name, output_format = item.split("=", 1)
+                overrides[name.strip()] = output_format.strip()
+        return {
+            # 面向用户展示时的格式
+            "display_format": os.getenv("TOOL_DISPLAY_FORMAT", "text"),
+            # Agent函数调用结果送入LLM上下文时的默认格式
+            "llm_format": os.getenv("TOOL_LLM_OUTPUT_FORMAT", "compact"),
+            "llm_formats": overrides,
+        }
+    
+    def _get_llm_cache_config(self) -> Dict[str, Any]:
+        """获取LLM响应缓存配置"""
+        return {
+            "enabled": os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true",
+            "path": os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite"),
+            "ttl": float(os.getenv("LLM_CACHE_TTL", "86400")),
+            "max_entries": int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000")),
+            # 近似匹配：提示词文本向量的余弦相似度不低于阈值时复用响应
+            "semantic": os.getenv("LLM_CACHE_SEMANTIC", "false").lower() == "true",
+            "similarity_threshold": float(os.getenv("LLM_CACHE_SIMILARITY", "0.95")),
+            "semantic_candidates": int(os.getenv("LLM_CACHE_SEMANTIC_CANDIDATES", "500")),
+            # local为内置的字符n-gram向量，其余值作为OpenAI兼容embeddings接口的模型名
+            "embedding_model": os.getenv("LLM_CACHE_EMBEDDING_MODEL", "local"),
+            "embedding_base_url": os.getenv("LLM_CACHE_EMBEDDING_BASE_URL", ""),
+            "embedding_api_key": os.getenv("LLM_CACHE_EMBEDDING_API_KEY", ""),
+        }
+    
+    def _get_llm_endpoints_config(self) -> Dict[str, Any]:
+        """获取LLM多端点负载均衡配置
+        
+        端点列表来自LLM_ENDPOINTS（JSON）或LLM_ENDPOINTS_FILE（JSON文件），每项为端点地址字符串或
+        {"base_url", "api_key", "model", "models", "weight", "name"}，缺省的密钥取LLM_API_KEY；
+        models为请求模型名到该端点模型名的映射，model是{LLM_MODEL: model}的简写，未映射的模型名保持不变。
+        """
+        raw = os.getenv("LLM_ENDPOINTS", "")
+        path = os.getenv("LLM_ENDPOINTS_FILE", "")
+        if not raw and path:
+            with open(path, encoding="utf-8") as f:
+                raw = f.read()
+        endpoints = []
+        for i, endpoint in enumerate(json.loads(raw) if raw else []):
+            if isinstance(endpoint, str):
+                endpoint = {"base_url": endpoint}
+            endpoints.append({
+                "name": endpoint.get("name") or f"endpoint-{i + 1}",
+                "base_url": endpoint["base_url"],
+                "api_key": endpoint.get("api_key") or self.llm_config["config_list"][0]["api_key"],
+                "models": {
+                    **({self.llm_config["config_list"][0]["model"]: endpoint["model"]} if endpoint.get("model") else {}),
+                    **endpoint.get("models", {})
+                },
+                "weight": float(endpoint.get("weight", 1.0)),
+            })
+        return {
+            "endpoints": endpoints,
+            # least_outstanding：选择进行中请求数（按权重折算）最少的端点；weighted：按权重随机选择
+            "strategy": os.getenv("LLM_BALANCING", "least_outstanding"),
+            "failure_threshold": int(os.getenv("LLM_CIRCUIT_FAILURES", "3")),
+            "reset_timeout": float(os.getenv("LLM_CIRCUIT_RESET", "30")),
+            # 对冲请求：超过端点延迟的hedge_percentile分位数仍未返回时，向另一个端点再发一次
+            "hedge": os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true",
+            "hedge_percentile": float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+            "hedge_min_samples": int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+            "hedge_min_delay": float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.1")),
+        }
+    
+    def _get_llm_roles_config(self) -> Dict[str, Any]:
+        """获取按角色划分的模型配置
+        
+        角色：router（路由和通用助手）、speaker_selection（群组聊天发言者选择）、specialist（专业Agent）、
+        summary（结果汇总）。LLM_<角色>_MODEL/BASE_URL/API_KEY为空时使用默认LLM配置；
+        router和speaker_selection只做简单分类，默认使用LLM_SMALL_MODEL（未设置时同样使用默认模型）。
+        """
+        small_model = os.getenv("LLM_SMALL_MODEL", "")
+        roles = {}
+        for role in ("router", "speaker_selection", "specialist", "summary"):
+            prefix = f"LLM_{role.upper()}"
+            default_model = small_model if role in ("router", "speaker_selection") else ""
+            roles[role] = {
+                "model": os.getenv(f"{prefix}_MODEL", default_model),
+                "base_url": os.getenv(f"{prefix}_BASE_URL", ""),
+                "api_key": os.getenv(f"{prefix}_API_KEY", ""),
+            }
+        return roles
+    
+    def _get_ip_geo_config(self) -> Dict[str, Any]:
+        """获取本地IP地理位置库配置
+        
+        IP_GEO_DB_PATH为CSV（首次使用时编译为可内存映射的索引文件）、编译好的.idx或.mmdb文件，为空时不使用本地库；
+        IP_GEO_REMOTE_FALLBACK为true时本地库未收录的IP再查询远程API。
+        """
+        return {
+            "db_path": os.getenv("IP_GEO_DB_PATH", ""),
+            "index_path": os.getenv("IP_GEO_INDEX_PATH", ""),
+            "remote_fallback": os.getenv("IP_GEO_REMOTE_FALLBACK", "true").lower() == "true",
+        }
+    
+    def _get_ip_batch_config(self) -> Dict[str, Any]:
+        """获取IP批量查询配置：远程查询的并发数、速率（每秒请求数）、单次最多处理的不同IP数、
+        日志文件所在目录（工具只能读取此目录内的文件）和单次查询的超时（秒）"""
+        return {
+            "concurrency": int(os.getenv("IP_BATCH_CONCURRENCY", "10")),
+            "rate": float(os.getenv("IP_BATCH_RATE", "10")),
+            "max_addresses": int(os.getenv("IP_BATCH_MAX_ADDRESSES", "100000")),
+            "input_dir": os.getenv("IP_BATCH_INPUT_DIR", "data/logs"),
+            "timeout": float(os.getenv("IP_BATCH_TIMEOUT", "1800")),
+        }
+    
+    def _get_tracing_config(self) -> Dict[str, Any]:
+        """获取调用链路追踪配置
+        
+        TRACING_EXPORTER为none时只在内存中保留最近的调用链路和延迟分布，json为追加写入TRACING_JSON_PATH，
+        otlp为以OTLP/HTTP发送到TRACING_OTLP_ENDPOINT（默认读取OTEL_EXPORTER_OTLP_ENDPOINT）。
+        """
+        return {
+            "enabled": os.getenv("TRACING_ENABLED", "true").lower() == "true",
+            "exporter": os.getenv("TRACING_EXPORTER", "none").lower(),
+            "json_path": os.getenv("TRACING_JSON_PATH", ".cache/traces.jsonl"),
+            "otlp_endpoint": os.getenv("TRACING_OTLP_ENDPOINT",
+                                       os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")),
+            "service_name": os.getenv("TRACING_SERVICE_NAME", "multi-agent-assistant"),
+            "histogram_window": int(os.getenv("TRACING_HISTOGRAM_WINDOW", "1000")),
+            "max_traces": int(os.getenv("TRACING_MAX_TRACES", "50")),
+        }
+    
+    def get_llm_config(self, role: str = None) -> Dict[str, Any]:
+        """获取LLM配置，指定role时使用该角色的模型配置
+        
+        开启LLM响应缓存时附带共享的缓存实例（取代AutoGen按cache_seed的磁盘缓存）；
+        配置了多个端点时经负载均衡器发送请求，单独指定了地址的角色直接访问该地址。
+        """
+        llm_config = self.llm_config.copy()
+        endpoint = dict(self.llm_config["config_list"][0])
+        role_config = self.llm_roles_config.get(role, {})
+        if role_config.get("model"):
+            endpoint["model"] = role_config["model"]
+        if role_config.get("base_url"):
+            endpoint["base_url"] = role_config["base_url"]
+            endpoint["api_key"] = role_config["api_key"] or endpoint["api_key"]
+        elif self.llm_endpoints_config["endpoints"]:
+            from .llm_balancer import BALANCER_BASE_URL, llm_balancer
+            endpoint["base_url"] = BALANCER_BASE_URL
+            endpoint["http_client"] = llm_balancer.http_client
+        llm_config["config_list"] = [endpoint]
+        if self.llm_cache_config["enabled"]:
+            from .llm_cache import llm_cache
+            llm_config["cache"] = llm_cache
+        return llm_config
     
     def get_weather_api_key(self) -> str:
         """获取天气API密钥"""
         return self.weather_api_key
+    
+    def get_http_config(self) -> Dict[str, Any]:
+        """获取HTTP连接池配置"""
+        return self.http_config.copy()
+    
+    def get_runner_config(self) -> Dict[str, Any]:
+        """获取后台事件循环运行器配置"""
+        return self.runner_config.copy()
+    
+    def get_domain_config(self) -> Dict[str, Any]:
+        """获取域名API配置"""
+        return self.domain_config.copy()
+    
+    def get_cache_config(self) -> Dict[str, Any]:
+        """获取工具结果缓存配置"""
+        return self.cache_config.copy()
+    
+    def get_chat_config(self) -> Dict[str, Any]:
+        """获取非交互式对话配置"""
+        return self.chat_config.copy()
+    
+    def get_server_config(self) -> Dict[str, Any]:
+        """获取HTTP服务配置"""
+        return self.server_config.copy()
+    
+    def get_routing_config(self) -> Dict[str, Any]:
+        """获取本地规则路由配置"""
+        return self.routing_config.copy()
+    
+    def get_api_config(self) -> Dict[str, Any]:
+        """获取第三方查询API地址配置"""
+        return self.api_config.copy()
+    
+    def get_compaction_config(self) -> Dict[str, Any]:
+        """获取群组聊天历史压缩配置"""
+        return self.compaction_config.copy()
+    
+    def get_tool_output_config(self) -> Dict[str, Any]:
+        """获取工具输出格式配置"""
+        output_config = self.tool_output_config.copy()
+        output_config["llm_formats"] = dict(output_config["llm_formats"])
+        return output_config
+    
+    def get_llm_cache_config(self) -> Dict[str, Any]:
+        """获取LLM响应缓存配置"""
+        return self.llm_cache_config.copy()
+    
+    def get_llm_endpoints_config(self) -> Dict[str, Any]:
+        """获取LLM多端点负载均衡配置"""
+        return self.llm_endpoints_config.copy()
+    
+    def get_llm_roles_config(self) -> Dict[str, Any]:
+        """获取按角色划分的模型配置"""
+        return {role: role_config.copy() for role, role_config in self.llm_roles_config.items()}
+    
+    def get_ip_geo_config(self) -> Dict[str, Any]:
+        """获取本地IP地理位置库配置"""
+        return self.ip_geo_config.copy()
+    
+    def get_ip_batch_config(self) -> Dict[str, Any]:
+        """获取IP批量查询配置"""
+        return self.ip_batch_config.copy()
+    
+    def get_tracing_config(self) -> Dict[str, Any]:
+        """获取调用链路追踪配置"""
+        return self.tracing_config.copy()
 
 
 # 全局配置实例
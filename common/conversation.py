@@ -0,0 +1,102 @@
+"""
+对话记录模块
+记录非交互式对话的消息并封装对话结果
+"""
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+
+class ConversationRecorder:
+    """对话记录器类，通过发送前钩子记录参与者发出的每条消息"""
+    
+    def __init__(self, exclude_from_answer: tuple = ()):
+        """初始化记录器，exclude_from_answer中的发送者不参与最终回答提取"""
+        self.messages: List[Dict[str, Any]] = []
+        self.exclude_from_answer = set(exclude_from_answer)
+    
+    def attach(self, agents: list):
+        """为参与对话的Agent注册消息钩子"""
+        for agent in agents:
+            agent.register_hook("process_message_before_send", self._on_send)
+    
+    def _on_send(self, sender, message, recipient, silent):
+        """记录一条发出的消息，原样返回消息"""
+        self.record(sender.name, recipient.name, message)
+        return message
+    
+    def record(self, name: str, recipient: str, message):
+        """记录一条消息，message可以是字符串或AutoGen消息字典"""
+        entry = {"name": name, "recipient": recipient}
+        default_role = "user" if name in self.exclude_from_answer else "assistant"
+        if isinstance(message, str):
+            entry.update({"role": default_role, "content": message})
+        else:
+            entry.update({
+                "role": message.get("role", default_role),
+                "content": message.get("content"),
+            })
+            if message.get("function_call"):
+                entry["function_call"] = message["function_call"]
+            if message.get("tool_calls"):
+                entry["tool_calls"] = message["tool_calls"]
+            if message.get("role") == "function":
+                entry["function_name"] = message.get("name")
+        self.messages.append(entry)
+    
+    def final_answer(self) -> Optional[str]:
+        """提取最终回答：最后一条由Agent给出的非函数调用文本消息"""
+        for entry in reversed(self.messages):
+            if entry["name"] in self.exclude_from_answer or entry["role"] == "function":
+                continue
+            content = (entry.get("content") or "").strip()
+            if content.endswith("TERMINATE"):
+                content = content[:-len("TERMINATE")].strip()
+            if content and not entry.get("function_call") and not entry.get("tool_calls"):
+                return content
+        return None
+
+
+class ConversationResult:
+    """对话结果类，包含对话记录和最终回答"""
+    
+    def __init__(self, mode: str, message: str, agent_type: str = None):
+        """初始化对话结果"""
+        self.conversation_id = uuid.uuid4().hex
+        self.mode = mode
+        self.agent_type = agent_type
+        self.message = message
+        self.transcript: List[Dict[str, Any]] = []
+        self.final_answer: Optional[str] = None
+        self.error: Optional[str] = None
+        self.metadata: Dict[str, Any] = {}
+        self.started_at = time.time()
+        self.duration = 0.0
+    
+    def finish(self, recorder: ConversationRecorder, error: str = None) -> "ConversationResult":
+        """根据记录器内容完成对话结果"""
+        self.transcript = list(recorder.messages)
+        self.final_answer = recorder.final_answer()
+        self.error = error
+        self.duration = time.time() - self.started_at
+        return self
+    
+    @property
+    def succeeded(self) -> bool:
+        """对话是否成功完成"""
+        return self.error is None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        return {
+            "conversation_id": self.conversation_id,
+            "mode": self.mode,
+            "agent_type": self.agent_type,
+            "message": self.message,
+            "final_answer": self.final_answer,
+            "transcript": self.transcript,
+            "error": self.error,
+            "metadata": self.metadata,
+            "started_at": self.started_at,
+            "duration": round(self.duration, 3),
+        }
@@ -0,0 +1,167 @@
+"""
+对话历史压缩模块
+在Agent生成回复前压缩其看到的历史消息，限制群组聊天中随轮数增长的提示词长度
+"""
+import json
+import re
+import threading
+from typing import Any, Dict, List, Tuple
+
+from .config import config
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数：中日韩字符按每字1个token，其余按每4个字符1个token
+    
+    不使用tiktoken，避免首次使用时下载编码文件；用于预算控制和前后对比已足够。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def count_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    """估算消息列表的token数（含每条消息的固定开销）"""
+    total = 0
+    for message in messages:
+        total += 4 + estimate_tokens(str(message.get("content") or ""))
+        if message.get("function_call"):
+            total += estimate_tokens(json.dumps(message["function_call"], ensure_ascii=False))
+        if message.get("tool_calls"):
+            total += estimate_tokens(json.dumps(message["tool_calls"], ensure_ascii=False))
+    return total
+
+
+def _called_functions(message: Dict[str, Any]) -> List[str]:
+    """获取消息中发起调用的函数名"""
+    if message.get("function_call"):
+        return [message["function_call"].get("name")]
+    return [call.get("function", {}).get("name") for call in message.get("tool_calls") or []]
+
+
+def _is_tool_message(message: Dict[str, Any]) -> bool:
+    """判断消息是否属于函数调用或函数结果"""
+    return message.get("role") in ("function", "tool") or bool(_called_functions(message))
+
+
+class HistoryCompactor:
+    """对话历史压缩类，实现AutoGen MessageTransform协议（apply_transform/get_logs）
+    
+    压缩策略（首条消息和最近keep_recent条消息始终原样保留）：
+    1. relevant_only时，丢弃其他Agent的函数调用及其结果，只保留与本Agent工具相关的调用和各方的文本回答
+    2. 较早的函数结果截断到tool_output_max_chars个字符
+    3. 总token数仍超过max_tokens时，从最早的消息开始丢弃
+    """
+    
+    def __init__(self, agent_name: str, function_names: List[str] = (), policy: Dict[str, Any] = None):
+        """初始化压缩器，policy缺省时使用配置中的压缩策略"""
+        policy = policy or config.get_compaction_config()
+        self.agent_name = agent_name
+        self.function_names = set(function_names)
+        self.max_tokens = policy["max_tokens"]
+        self.keep_recent = policy["keep_recent"]
+        self.tool_output_max_chars = policy["tool_output_max_chars"]
+        self.relevant_only = policy["relevant_only"]
+        self._lock = threading.Lock()
+        self.applied = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.truncated = 0
+        self.dropped = 0
+    
+    def _is_relevant(self, message: Dict[str, Any]) -> bool:
+        """判断较早的消息对本Agent是否有用"""
+        if not _is_tool_message(message):
+            return True
+        if message.get("role") in ("function", "tool"):
+            # function消息的name为函数名；tool消息无函数名，随其调用消息一起判断
+            return message.get("role") == "tool" or message.get("name") in self.function_names
+        return message.get("name") == self.agent_name or bool(self.function_names & set(_called_functions(message)))
+    
+    def _truncate(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """截断过长的函数结果"""
+        content = str(message.get("content") or "")
+        if message.get("role") not in ("function", "tool") or len(content) <= self.tool_output_max_chars:
+            return message
+        message = dict(message)
+        omitted = len(content) - self.tool_output_max_chars
+        message["content"] = f"{content[:self.tool_output_max_chars]}…[已截断{omitted}个字符]"
+        return message
+    
+    def apply_transform(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """压缩消息列表，返回新的列表，不修改传入的消息"""
+        before = count_message_tokens(messages)
+        recent_start = max(1, len(messages) - self.keep_recent)
+        head, middle, recent = messages[:1], messages[1:recent_start], messages[recent_start:]
+        
+        kept, truncated = [], 0
+        for message in middle:
+            if self.relevant_only and not self._is_relevant(message):
+                continue
+            # 丢弃了调用消息的tool结果也一并丢弃，避免孤立的tool消息
+            if message.get("role") == "tool" and not (kept and _is_tool_message(kept[-1])):
+                continue
+            compacted = self._truncate(message)
+            truncated += compacted is not message
+            kept.append(compacted)
+        
+        # 超出预算时从最早的消息开始丢弃，调用消息与其后的tool结果一起丢弃
+        while kept and count_message_tokens(head + kept + recent) > self.max_tokens:
+            kept.pop(0)
+            while kept and kept[0].get("role") == "tool":
+                kept.pop(0)
+        
+        result = head + kept + recent
+        after = count_message_tokens(result)
+        with self._lock:
+            self.applied += 1
+            self.tokens_before += before
+            self.tokens_after += after
+            self.truncated += truncated
+            self.dropped += len(middle) - len(kept)
+        return result
+    
+    def get_logs(self, pre_transform_messages: List[Dict[str, Any]],
+                 post_transform_messages: List[Dict[str, Any]]) -> Tuple[str, bool]:
+        """返回压缩日志和是否产生了效果"""
+        before = count_message_tokens(pre_transform_messages)
+        after = count_message_tokens(post_transform_messages)
+        had_effect = before != after or len(pre_transform_messages) != len(post_transform_messages)
+        logs = (f"[{self.agent_name}] 历史压缩: {len(pre_transform_messages)} -> {len(post_transform_messages)} 条消息, "
+                f"约 {before} -> {after} tokens")
+        return logs, had_effect
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取压缩统计信息，token数为各次压缩前后的累计值"""
+        with self._lock:
+            return {
+                "applied": self.applied,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": self.tokens_before - self.tokens_after,
+                "truncated": self.truncated,
+                "dropped": self.dropped
+            }
+
+
+def add_history_compaction(agent, policy: Dict[str, Any] = None) -> HistoryCompactor:
+    """为Agent注册历史压缩，返回压缩器以便读取统计信息"""
+    from autogen.agentchat.contrib.capabilities.transform_messages import TransformMessages
+    
+    compactor = HistoryCompactor(agent.name, list(agent.function_map), policy)
+    TransformMessages(transforms=[compactor], verbose=False).add_to_agent(agent)
+    return compactor
+
+
+def merge_compaction_stats(compactors: List[HistoryCompactor]) -> Dict[str, Any]:
+    """按Agent汇总压缩统计，并附加总计"""
+    stats = {compactor.agent_name: compactor.get_stats() for compactor in compactors}
+    total = {}
+    for agent_stats in stats.values():
+        for key, value in agent_stats.items():
+            total[key] = total.get(key, 0) + value
+    stats["total"] = total
+    return stats
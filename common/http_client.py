@@ -0,0 +1,128 @@
+"""
+HTTP客户端连接池
+为所有工具模块提供进程级共享、按主机复用连接的httpx.AsyncClient
+"""
+import asyncio
+import importlib.util
+import threading
+from typing import Dict, Any
+from urllib.parse import urlsplit
+
+import httpx
+
+from .config import config
+from .tracing import tracer
+
+
+class _TracingTransport(httpx.AsyncBaseTransport):
+    """为每个HTTP请求记录一个span的传输层包装"""
+    
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        with tracer.span(f"http.{request.url.host}", "http", method=request.method,
+                         url=str(request.url.copy_with(query=None))) as span:
+            response = await self._transport.handle_async_request(request)
+            span.set_attribute("status_code", response.status_code)
+            if response.status_code >= 400:
+                span.set_error(f"HTTP {response.status_code}")
+            return response
+    
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class HTTPClientPool:
+    """HTTP客户端连接池类，统一管理长连接的创建和关闭"""
+    
+    def __init__(self, http_config: Dict[str, Any] = None):
+        """初始化连接池"""
+        self.http_config = http_config or config.get_http_config()
+        # httpx.AsyncClient绑定在创建它的事件循环上，因此按事件循环分组保存
+        self._clients: Dict[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]] = {}
+        self._lock = threading.Lock()
+        self._http2 = self.http_config["http2"] and importlib.util.find_spec("h2") is not None
+    
+    def _create_client(self) -> httpx.AsyncClient:
+        """创建带连接数限制和keep-alive的客户端，开启追踪时每个请求记录一个span"""
+        limits = httpx.Limits(
+            max_connections=self.http_config["max_connections_per_host"],
+            max_keepalive_connections=self.http_config["max_keepalive_connections"],
+            keepalive_expiry=self.http_config["keepalive_expiry"]
+        )
+        if tracer.enabled:
+            # 自定义传输层时客户端的limits和http2参数不生效，需传给内部的传输层
+            transport = httpx.AsyncHTTPTransport(limits=limits, http2=self._http2)
+            return httpx.AsyncClient(transport=_TracingTransport(transport), timeout=self.http_config["timeout"])
+        return httpx.AsyncClient(
+            limits=limits,
+            timeout=self.http_config["timeout"],
+            http2=self._http2
+        )
+    
+    @staticmethod
+    def _host_key(url: str) -> str:
+        """提取URL的scheme和主机作为连接池键"""
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+    
+    def get_client(self, url: str) -> httpx.AsyncClient:
+        """获取目标主机的共享客户端，必须在事件循环中调用"""
+        loop = asyncio.get_running_loop()
+        key = self._host_key(url)
+        with self._lock:
+            # 清理已关闭事件循环上的客户端，它们的连接已不可用
+            for stale_loop in [l for l in self._clients if l.is_closed()]:
+                del self._clients[stale_loop]
+            
+            clients = self._clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None or client.is_closed:
+                client = self._create_client()
+                clients[key] = client
+            return client
+    
+    async def aclose(self):
+        """关闭当前事件循环上的所有客户端"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._clients.pop(loop, {})
+        for client in clients.values():
+            await client.aclose()
+    
+    def close(self):
+        """关闭所有事件循环上的客户端"""
+        with self._lock:
+            loops = list(self._clients)
+        try:
+            current_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            current_loop = None
+        
+        for loop in loops:
+            if loop.is_closed():
+                with self._lock:
+                    self._clients.pop(loop, None)
+            elif loop is current_loop:
+                # 在同一事件循环内无法阻塞等待，改为调度关闭任务
+                loop.create_task(self.aclose())
+            elif loop.is_running():
+                future = asyncio.run_coroutine_threadsafe(self.aclose(), loop)
+                future.result(timeout=self.http_config["timeout"])
+            else:
+                loop.run_until_complete(self.aclose())
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接池统计信息"""
+        with self._lock:
+            hosts = sorted({host for clients in self._clients.values() for host in clients})
+            return {
+                "event_loops": len(self._clients),
+                "hosts": hosts,
+                "http2": self._http2
+            }
+
+
+# 全局HTTP连接池实例
+http_client_pool = HTTPClientPool()
@@ -0,0 +1,220 @@
+"""
+本地规则路由模块
+用正则、城市词表和关键词识别意图明确的请求，直接分派给专业Agent，避免一次LLM路由调用
+"""
+import ipaddress
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from .config import config
+
+# 城市词表：中文名/常用英文名 -> 天气API使用的英文名
+CITY_GAZETTEER = {
+    "北京": "Beijing", "上海": "Shanghai", "广州": "Guangzhou", "深圳": "Shenzhen",
+    "天津": "Tianjin", "重庆": "Chongqing", "杭州": "Hangzhou", "南京": "Nanjing",
+    "苏州": "Suzhou", "武汉": "Wuhan", "成都": "Chengdu", "西安": "Xi'an",
+    "长沙": "Changsha", "郑州": "Zhengzhou", "济南": "Jinan", "青岛": "Qingdao",
+    "沈阳": "Shenyang", "大连": "Dalian", "哈尔滨": "Harbin", "长春": "Changchun",
+    "石家庄": "Shijiazhuang", "太原": "Taiyuan", "合肥": "Hefei", "福州": "Fuzhou",
+    "厦门": "Xiamen", "南昌": "Nanchang", "昆明": "Kunming", "贵阳": "Guiyang",
+    "南宁": "Nanning", "海口": "Haikou", "三亚": "Sanya", "兰州": "Lanzhou",
+    "西宁": "Xining", "银川": "Yinchuan", "乌鲁木齐": "Urumqi", "拉萨": "Lhasa",
+    "呼和浩特": "Hohhot", "宁波": "Ningbo", "无锡": "Wuxi", "佛山": "Foshan",
+    "东莞": "Dongguan", "珠海": "Zhuhai", "香港": "Hong Kong", "澳门": "Macau",
+    "台北": "Taipei", "东京": "Tokyo", "首尔": "Seoul", "新加坡": "Singapore",
+    "伦敦": "London", "巴黎": "Paris", "纽约": "New York", "洛杉矶": "Los Angeles",
+    "旧金山": "San Francisco", "悉尼": "Sydney", "莫斯科": "Moscow", "柏林": "Berlin",
+}
+CITY_GAZETTEER.update({name.lower(): name for name in CITY_GAZETTEER.values()})
+
+IPV4_PATTERN = re.compile(r"(?<![\d.])(?:\d{1,3}\.){3}\d{1,3}(?![\d.])")
+# IPv6候选串，再由ipaddress校验
+IPV6_PATTERN = re.compile(r"(?<![0-9A-Fa-f:])[0-9A-Fa-f]{0,4}(?::[0-9A-Fa-f]{0,4}){2,7}(?![0-9A-Fa-f:])")
+DOMAIN_PATTERN = re.compile(
+    r"(?<![A-Za-z0-9.@-])(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}(?![A-Za-z0-9-])"
+)
+# 常见的数据、日志、源代码、文档和配置文件扩展名，以此结尾的词是文件名而不是域名
+# （py、md、sh、rs、zip等同时是顶级域名，但在查询中几乎总是指文件）
+FILE_EXTENSIONS = frozenset((
+    # 数据和日志
+    "txt", "log", "csv", "tsv", "json", "jsonl", "ndjson", "xml", "dat", "out", "err", "bak", "tmp",
+    "sqlite", "db", "parquet",
+    # 配置
+    "yaml", "yml", "toml", "ini", "conf", "cfg", "env", "properties", "lock",
+    # 源代码和脚本
+    "py", "pyi", "ipynb", "sh", "bash", "zsh", "bat", "ps1", "js", "mjs", "cjs", "ts", "tsx", "jsx",
+    "html", "htm", "css", "scss", "vue", "java", "kt", "cpp", "hpp", "cs", "go", "rs", "rb", "php",
+    "swift", "sql",
+    # 文档
+    "md", "rst", "pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx",
+    # 压缩包
+    "gz", "bz2", "xz", "tar", "tgz", "zip", "7z", "rar"
+))
+FILE_NAME_PATTERN = re.compile(
+    r"(?<![A-Za-z0-9_.-])[A-Za-z0-9_.-]*\.(?:" + "|".join(sorted(FILE_EXTENSIONS)) + r")(?![A-Za-z0-9_-])",
+    re.IGNORECASE
+)
+# 文件路径：至少两级的Unix路径（可带~、.、..前缀）或Windows盘符路径，URL中的路径前面有字母或冒号，不会匹配
+FILE_PATH_PATTERN = re.compile(
+    r"(?<![A-Za-z0-9_:/.~-])(?:~|\.{1,2})?(?:/[A-Za-z0-9_.-]+){2,}|(?<![A-Za-z0-9])[A-Za-z]:\\[^\s]+"
+)
+_CITY_PATTERN = re.compile(
+    "|".join(sorted((re.escape(name) for name in CITY_GAZETTEER), key=len, reverse=True)),
+    re.IGNORECASE
+)
+
+# 各意图的关键词
+INTENT_KEYWORDS = {
+    "weather": re.compile(r"天气|气温|温度|下雨|降雨|下雪|湿度|风力|晴|阴天|weather|forecast|temperature", re.IGNORECASE),
+    "ip": re.compile(r"(?<![A-Za-z])ip(?![A-Za-z])|归属地|IP地址", re.IGNORECASE),
+    "domain": re.compile(r"域名|whois|注册信息|注册商|可申请|被占用|domain", re.IGNORECASE),
+}
+
+# 各信号对意图置信度的贡献
+ENTITY_SCORE = 0.6
+CITY_SCORE = 0.3
+KEYWORD_SCORE = 0.5
+
+
+def extract_ips(text: str) -> List[str]:
+    """提取文本中合法的IPv4/IPv6地址（去重并保持顺序）"""
+    found = []
+    for pattern in (IPV4_PATTERN, IPV6_PATTERN):
+        for match in pattern.findall(text):
+            try:
+                ip = ipaddress.ip_address(match).compressed
+            except ValueError:
+                continue
+            if ip not in found:
+                found.append(ip)
+    return found
+
+
+def extract_domains(text: str) -> List[str]:
+    """提取文本中的域名（去重并保持顺序），跳过以文件扩展名结尾的文件名"""
+    found = []
+    for match in DOMAIN_PATTERN.findall(text):
+        domain = match.lower()
+        if domain.rsplit(".", 1)[-1] in FILE_EXTENSIONS:
+            continue
+        if domain not in found:
+            found.append(domain)
+    return found
+
+
+def extract_files(text: str) -> List[str]:
+    """提取文本中的文件路径和文件名（去重并保持顺序）"""
+    found = []
+    for pattern in (FILE_PATH_PATTERN, FILE_NAME_PATTERN):
+        for match in pattern.findall(text):
+            if match not in found and not any(match in path for path in found):
+                found.append(match)
+    return found
+
+
+def extract_cities(text: str) -> List[str]:
+    """提取文本中词表内的城市，返回天气API使用的英文名"""
+    found = []
+    for match in _CITY_PATTERN.findall(text):
+        city = CITY_GAZETTEER.get(match) or CITY_GAZETTEER.get(match.lower())
+        if city and city not in found:
+            found.append(city)
+    return found
+
+
+class RouteDecision:
+    """路由决策，agent_type为None表示需要交给LLM路由"""
+    
+    def __init__(self, agent_type: Optional[str], confidence: float, reason: str,
+                 scores: Dict[str, float] = None, entities: Dict[str, List[str]] = None):
+        self.agent_type = agent_type
+        self.confidence = confidence
+        self.reason = reason
+        self.scores = scores or {}
+        self.entities = entities or {}
+    
+    @property
+    def is_local(self) -> bool:
+        """是否已由本地规则确定目标Agent"""
+        return self.agent_type is not None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        return {
+            "agent_type": self.agent_type,
+            "confidence": round(self.confidence, 3),
+            "reason": self.reason,
+            "scores": {k: round(v, 3) for k, v in self.scores.items()},
+            "entities": self.entities
+        }
+
+
+class IntentRouter:
+    """本地规则路由器类，只有单一意图的置信度达到阈值时才在本地分派"""
+    
+    def __init__(self, routing_config: Dict[str, Any] = None):
+        """初始化路由器"""
+        routing_config = routing_config or config.get_routing_config()
+        self.enabled = routing_config["enabled"]
+        self.threshold = routing_config["confidence_threshold"]
+        self._lock = threading.Lock()
+        self._counters = {"total": 0, "local": 0, "ambiguous": 0, "no_match": 0, "disabled": 0}
+        self._by_agent = {}
+    
+    def classify(self, message: str) -> RouteDecision:
+        """对消息进行意图打分，不更新计数"""
+        entities = {
+            "ips": extract_ips(message),
+            "domains": extract_domains(message),
+            "cities": extract_cities(message),
+            "files": extract_files(message)
+        }
+        scores = {
+            "weather": CITY_SCORE * bool(entities["cities"]),
+            "ip": ENTITY_SCORE * bool(entities["ips"]),
+            "domain": ENTITY_SCORE * bool(entities["domains"])
+        }
+        for intent, pattern in INTENT_KEYWORDS.items():
+            if pattern.search(message):
+                scores[intent] += KEYWORD_SCORE
+        scores = {intent: min(score, 1.0) for intent, score in scores.items()}
+        
+        confident = [intent for intent, score in scores.items() if score >= self.threshold]
+        if len(confident) == 1:
+            intent = confident[0]
+            return RouteDecision(intent, scores[intent], "matched", scores, entities)
+        if confident:
+            return RouteDecision(None, max(scores.values()), "ambiguous", scores, entities)
+        return RouteDecision(None, max(scores.values()), "no_match", scores, entities)
+    
+    def route(self, message: str) -> RouteDecision:
+        """路由消息并更新计数"""
+        if not self.enabled:
+            decision = RouteDecision(None, 0.0, "disabled")
+        else:
+            decision = self.classify(message)
+        
+        with self._lock:
+            self._counters["total"] += 1
+            if decision.is_local:
+                self._counters["local"] += 1
+                self._by_agent[decision.agent_type] = self._by_agent.get(decision.agent_type, 0) + 1
+            else:
+                self._counters[decision.reason] += 1
+        return decision
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取路由统计信息，local_ratio为本地路由请求的占比"""
+        with self._lock:
+            total = self._counters["total"]
+            return {
+                **self._counters,
+                "llm_fallback": total - self._counters["local"],
+                "local_ratio": round(self._counters["local"] / total, 4) if total else 0.0,
+                "by_agent": dict(self._by_agent)
+            }
+
+
+# 全局本地规则路由器实例
+intent_router = IntentRouter()
@@ -0,0 +1,372 @@
+"""
+LLM多端点负载均衡模块
+在OpenAI客户端的HTTP传输层将请求分发到多个OpenAI兼容端点，提供熔断、故障转移和对冲请求
+"""
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .config import config
+from .rate_limiter import is_retryable_status
+
+# 客户端配置中使用的占位地址，实际地址由传输层按所选端点替换
+BALANCER_BASE_URL = "http://llm-balancer"
+
+
+class CircuitBreaker:
+    """熔断器类：连续失败达到阈值后熔断，经过reset_timeout秒后放行一个探测请求"""
+    
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        """初始化熔断器"""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened = 0
+    
+    def available(self, now: float) -> bool:
+        """判断当前能否放行请求（不改变状态）"""
+        if self.state == "closed":
+            return True
+        return self.state == "open" and now - self.opened_at >= self.reset_timeout
+    
+    def on_acquire(self):
+        """放行请求；熔断超时后的首个请求作为探测请求，结果返回前不再放行其他请求"""
+        if self.state == "open":
+            self.state = "half_open"
+    
+    def on_success(self):
+        """请求成功，恢复为关闭状态"""
+        self.state = "closed"
+        self.failures = 0
+    
+    def on_failure(self, now: float):
+        """请求失败，达到阈值或探测失败时熔断"""
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened += 1
+            self.state = "open"
+            self.opened_at = now
+
+
+class LLMEndpoint:
+    """LLM端点类，记录进行中的请求数、熔断状态和最近的响应延迟"""
+    
+    def __init__(self, name: str, base_url: str, api_key: str, models: Dict[str, str] = None, weight: float = 1.0,
+                 breaker: CircuitBreaker = None, window: int = 200):
+        """初始化端点，models为请求模型名到该端点模型名的映射"""
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.models = models or {}
+        self.weight = weight
+        self.breaker = breaker or CircuitBreaker()
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=window)
+    
+    def percentile(self, p: float) -> Optional[float]:
+        """最近响应延迟（到收到响应头为止）的p分位数，无数据时返回None"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取端点统计信息"""
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "base_url": self.base_url,
+            "models": self.models,
+            "weight": self.weight,
+            "state": self.breaker.state,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "circuit_opened": self.breaker.opened,
+            "p50_s": round(p50, 4) if p50 is not None else None,
+            "p95_s": round(p95, 4) if p95 is not None else None
+        }
+
+
+class _TrackedStream(httpx.SyncByteStream):
+    """包装响应体，在响应关闭时结束端点的进行中计数（流式响应要读完才算结束）"""
+    
+    def __init__(self, stream: httpx.SyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+    
+    def __iter__(self):
+        yield from self._stream
+    
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close:
+                on_close()
+
+
+class BalancedTransport(httpx.BaseTransport):
+    """负载均衡传输层：选择端点并改写请求地址、密钥和模型名，失败时转移到其他端点"""
+    
+    def __init__(self, balancer: "LLMLoadBalancer", transport: httpx.BaseTransport = None):
+        self.balancer = balancer
+        self._transport = transport or httpx.HTTPTransport()
+    
+    def _build_request(self, request: httpx.Request, endpoint: LLMEndpoint) -> httpx.Request:
+        """按端点改写请求"""
+        path = request.url.raw_path.decode("ascii")
+        headers = dict(request.headers)
+        headers.pop("host", None)
+        headers["authorization"] = f"Bearer {endpoint.api_key}"
+        content = request.content
+        if endpoint.models and path.split("?")[0].endswith("/chat/completions") and content:
+            body = json.loads(content)
+            if body.get("model") in endpoint.models:
+                body["model"] = endpoint.models[body["model"]]
+                content = json.dumps(body).encode("utf-8")
+                headers.pop("content-length", None)
+        return httpx.Request(
+            request.method, endpoint.base_url + path, headers=headers, content=content,
+            extensions=request.extensions
+        )
+    
+    def _send(self, request: httpx.Request, endpoint: LLMEndpoint) -> httpx.Response:
+        """向指定端点发送请求并更新端点状态"""
+        start = time.perf_counter()
+        try:
+            response = self._transport.handle_request(self._build_request(request, endpoint))
+        except Exception:
+            self.balancer.release(endpoint, ok=False)
+            raise
+        
+        ok = not is_retryable_status(response.status_code)
+        latency = time.perf_counter() - start if ok else None
+        response.stream = _TrackedStream(response.stream, lambda: self.balancer.release(endpoint, ok, latency))
+        return response
+    
+    @staticmethod
+    def _succeeded(future) -> bool:
+        """判断请求是否成功返回了不需要重试的响应"""
+        return future.exception() is None and not is_retryable_status(future.result().status_code)
+    
+    @staticmethod
+    def _discard(future):
+        """丢弃对冲请求中落后的响应"""
+        if future.exception() is None:
+            future.result().close()
+    
+    def _send_hedged(self, request: httpx.Request, endpoint: LLMEndpoint, tried: set) -> httpx.Response:
+        """发送请求；超过延迟分位数仍未返回时向另一个端点发出对冲请求，取先成功的结果"""
+        delay = self.balancer.hedge_delay(request)
+        if delay is None:
+            return self._send(request, endpoint)
+        
+        executor = self.balancer.executor()
+        primary = executor.submit(self._send, request, endpoint)
+        done, _ = wait([primary], timeout=delay)
+        hedge_endpoint = None if done else self.balancer.acquire(exclude=tried | {endpoint.name})
+        if hedge_endpoint is None:
+            return primary.result()
+        
+        tried.add(hedge_endpoint.name)
+        self.balancer.on_hedge()
+        pending = {primary, executor.submit(self._send, request, hedge_endpoint)}
+        first = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if first is None or (not self._succeeded(first) and self._succeeded(future)):
+                    if first is not None:
+                        self._discard(first)
+                    first = future
+                else:
+                    self._discard(future)
+            if self._succeeded(first):
+                break
+        for future in pending:
+            future.add_done_callback(self._discard)
+        if first is not primary and self._succeeded(first):
+            self.balancer.on_hedge_win()
+        return first.result()
+    
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        """选择端点发送请求，连接失败或返回429/5xx时转移到下一个可用端点"""
+        request.read()
+        tried = set()
+        last_error = None
+        while True:
+            endpoint = self.balancer.acquire(exclude=tried)
+            if endpoint is None:
+                break
+            tried.add(endpoint.name)
+            try:
+                response = self._send_hedged(request, endpoint, tried)
+            except httpx.TransportError as e:
+                last_error = e
+            else:
+                if not is_retryable_status(response.status_code) or not self.balancer.has_available(tried):
+                    return response
+                response.close()
+            self.balancer.on_failover()
+        
+        if last_error is not None:
+            raise last_error
+        raise httpx.ConnectError("没有可用的LLM端点（全部处于熔断状态）", request=request)
+    
+    def close(self):
+        self._transport.close()
+
+
+class BalancedHTTPClient(httpx.Client):
+    """使用负载均衡传输层的HTTP客户端；Agent会深拷贝llm_config，深拷贝时返回自身以共享端点状态"""
+    
+    def __deepcopy__(self, memo) -> "BalancedHTTPClient":
+        return self
+
+
+class LLMLoadBalancer:
+    """LLM负载均衡器类，按最少进行中请求数或权重随机选择未熔断的端点"""
+    
+    def __init__(self, policy: Dict[str, Any] = None):
+        """初始化负载均衡器，policy缺省时使用配置中的端点和策略"""
+        policy = policy or config.get_llm_endpoints_config()
+        self.strategy = policy["strategy"]
+        self.hedge = policy["hedge"]
+        self.hedge_percentile = policy["hedge_percentile"]
+        self.hedge_min_samples = policy["hedge_min_samples"]
+        self.hedge_min_delay = policy["hedge_min_delay"]
+        self.endpoints: List[LLMEndpoint] = [
+            LLMEndpoint(
+                name=endpoint["name"],
+                base_url=endpoint["base_url"],
+                api_key=endpoint["api_key"],
+                models=endpoint.get("models"),
+                weight=endpoint["weight"],
+                breaker=CircuitBreaker(policy["failure_threshold"], policy["reset_timeout"])
+            )
+            for endpoint in policy["endpoints"]
+        ]
+        # 全部端点最近的响应延迟，用于计算对冲请求的等待时间
+        self.latencies = deque(maxlen=500)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._http_client = None
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+    
+    @property
+    def http_client(self) -> BalancedHTTPClient:
+        """供OpenAI客户端使用的共享HTTP客户端"""
+        with self._lock:
+            if self._http_client is None:
+                self._http_client = BalancedHTTPClient(transport=BalancedTransport(self), timeout=None)
+            return self._http_client
+    
+    def executor(self) -> ThreadPoolExecutor:
+        """对冲请求使用的线程池"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(4, 4 * len(self.endpoints)),
+                                                    thread_name_prefix="llm-hedge")
+            return self._executor
+    
+    def has_available(self, exclude: set = frozenset()) -> bool:
+        """判断除exclude外是否还有可用端点"""
+        now = time.monotonic()
+        with self._lock:
+            return any(e.name not in exclude and e.breaker.available(now) for e in self.endpoints)
+    
+    def acquire(self, exclude: set = frozenset()) -> Optional[LLMEndpoint]:
+        """选择一个端点并计入进行中请求，没有可用端点时返回None"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.name not in exclude and e.breaker.available(now)]
+            if not candidates:
+                return None
+            if self.strategy == "weighted":
+                endpoint = random.choices(candidates, weights=[e.weight for e in candidates])[0]
+            else:
+                lowest = min((e.outstanding + 1) / e.weight for e in candidates)
+                endpoint = random.choice([e for e in candidates if (e.outstanding + 1) / e.weight == lowest])
+            endpoint.breaker.on_acquire()
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+    
+    def release(self, endpoint: LLMEndpoint, ok: bool, latency: float = None):
+        """请求结束，更新进行中计数、熔断状态和延迟记录"""
+        with self._lock:
+            endpoint.outstanding -= 1
+            if ok:
+                endpoint.breaker.on_success()
+                if latency is not None:
+                    endpoint.latencies.append(latency)
+                    self.latencies.append(latency)
+            else:
+                endpoint.failures += 1
+                endpoint.breaker.on_failure(time.monotonic())
+    
+    def hedge_delay(self, request: httpx.Request) -> Optional[float]:
+        """对冲请求的等待时间：全部端点最近响应延迟的分位数；未开启、样本不足、流式请求或只有一个端点时返回None"""
+        if not self.hedge or len(self.endpoints) < 2 or len(self.latencies) < self.hedge_min_samples:
+            return None
+        try:
+            if json.loads(request.content or b"{}").get("stream"):
+                return None
+        except ValueError:
+            return None
+        with self._lock:
+            ordered = sorted(self.latencies)
+        delay = ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))]
+        return max(delay, self.hedge_min_delay)
+    
+    def on_hedge(self):
+        with self._lock:
+            self.hedged += 1
+    
+    def on_hedge_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+    
+    def on_failover(self):
+        with self._lock:
+            self.failovers += 1
+    
+    def close(self):
+        """关闭HTTP客户端和对冲线程池"""
+        with self._lock:
+            client, self._http_client = self._http_client, None
+            executor, self._executor = self._executor, None
+        if client is not None:
+            client.close()
+        if executor is not None:
+            executor.shutdown(wait=False)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取负载均衡统计信息"""
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "hedge": self.hedge,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "failovers": self.failovers,
+                "endpoints": {endpoint.name: endpoint.get_stats() for endpoint in self.endpoints}
+            }
+
+
+# 全局LLM负载均衡器实例（未配置多端点时不会被导入）
+llm_balancer = LLMLoadBalancer()
@@ -0,0 +1,335 @@
+"""
+LLM响应缓存模块
+在模型接口前缓存LLM响应，支持精确匹配和基于向量相似度的近似匹配，数据保存在本地SQLite中
+"""
+import hashlib
+import json
+import math
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import config
+
+# 参与精确匹配缓存键计算的请求参数
+KEY_FIELDS = (
+    "model", "messages", "functions", "tools", "tool_choice", "function_call",
+    "temperature", "top_p", "max_tokens", "stop", "n", "response_format"
+)
+
+# 本地向量的维度
+LOCAL_EMBEDDING_DIM = 256
+
+
+def local_embedding(text: str) -> List[float]:
+    """不依赖外部服务的文本向量：字符一元和二元组按哈希分桶计数后归一化，适合判断近似重复的提示词"""
+    vector = [0.0] * LOCAL_EMBEDDING_DIM
+    text = text.lower()
+    grams = list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+    for gram in grams:
+        bucket = int.from_bytes(hashlib.md5(gram.encode("utf-8")).digest()[:4], "little") % LOCAL_EMBEDDING_DIM
+        vector[bucket] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def openai_embedding(model: str, base_url: str, api_key: str, http_client=None) -> Callable[[str], List[float]]:
+    """创建调用OpenAI兼容embeddings接口的向量函数"""
+    from openai import OpenAI
+    
+    client = OpenAI(base_url=base_url, api_key=api_key, http_client=http_client)
+    
+    def embed(text: str) -> List[float]:
+        vector = client.embeddings.create(model=model, input=text).data[0].embedding
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+    
+    return embed
+
+
+def _parse_request(key: str) -> Optional[Dict[str, Any]]:
+    """AutoGen以JSON序列化的请求参数作为缓存键，解析失败时返回None"""
+    try:
+        request = json.loads(key)
+    except (TypeError, ValueError):
+        return None
+    return request if isinstance(request, dict) else None
+
+
+def _hash(data: Any) -> str:
+    """计算可JSON序列化数据的摘要"""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _split_request(request: Dict[str, Any]) -> Tuple[str, str]:
+    """将请求拆分为近似匹配的范围和待比较的文本
+    
+    模型、函数定义、采样参数、系统消息和消息的角色序列必须完全相同才会近似匹配，
+    只比较其余消息的文本内容。
+    """
+    messages = request.get("messages") or []
+    scope = {field: request.get(field) for field in KEY_FIELDS if field != "messages"}
+    scope["system"] = [message.get("content") for message in messages if message.get("role") == "system"]
+    scope["roles"] = [(message.get("role"), message.get("name")) for message in messages]
+    text = "\n".join(
+        f"{message.get('role')}: {message.get('content') or json.dumps(message.get('function_call'), ensure_ascii=False)}"
+        for message in messages if message.get("role") != "system"
+    )
+    return _hash(scope), text
+
+
+class LLMResponseCache:
+    """LLM响应缓存类，实现AutoGen的AbstractCache协议，可作为llm_config中的cache使用
+    
+    - 精确匹配：按模型、消息、函数定义和采样参数计算缓存键
+    - 近似匹配（可选）：范围相同且文本向量的余弦相似度不低于阈值时复用响应
+    - 条目超过ttl秒后过期，超过max_entries条时淘汰最久未使用的条目
+    所有Agent共享同一实例，进入/退出上下文时不会关闭数据库连接。
+    """
+    
+    def __init__(self, path: str = None, ttl: float = None, max_entries: int = None, semantic: bool = None,
+                 similarity_threshold: float = None, embedding_function: Callable[[str], List[float]] = None,
+                 policy: Dict[str, Any] = None):
+        """初始化缓存，未指定的参数使用配置中的值；数据库在首次使用时才打开"""
+        policy = policy or config.get_llm_cache_config()
+        self.path = path or policy["path"]
+        self.ttl = policy["ttl"] if ttl is None else ttl
+        self.max_entries = policy["max_entries"] if max_entries is None else max_entries
+        self.semantic = policy["semantic"] if semantic is None else semantic
+        self.similarity_threshold = policy["similarity_threshold"] if similarity_threshold is None else similarity_threshold
+        self.semantic_candidates = policy["semantic_candidates"]
+        self._embedding_policy = policy
+        self._embedding_function = embedding_function
+        self._conn = None
+        self._lock = threading.RLock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.errors = 0
+    
+    def __enter__(self) -> "LLMResponseCache":
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+    
+    def __deepcopy__(self, memo) -> "LLMResponseCache":
+        """Agent会深拷贝llm_config，缓存实例需要在各Agent间共享"""
+        return self
+    
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库并建表"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    scope TEXT,
+                    embedding BLOB,
+                    value BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_scope ON llm_cache (scope, accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+    
+    def _embed(self, text: str) -> List[float]:
+        """计算文本向量，未指定向量函数时按配置选择本地向量或embeddings接口"""
+        if self._embedding_function is None:
+            policy = self._embedding_policy
+            if policy["embedding_model"] == "local":
+                self._embedding_function = local_embedding
+            else:
+                llm = config.get_llm_config()["config_list"][0]
+                # 未单独指定地址时与LLM使用同一地址（多端点时经负载均衡器发送）
+                self._embedding_function = openai_embedding(
+                    policy["embedding_model"],
+                    policy["embedding_base_url"] or llm["base_url"],
+                    policy["embedding_api_key"] or llm["api_key"],
+                    None if policy["embedding_base_url"] else llm.get("http_client")
+                )
+        return self._embedding_function(text)
+    
+    @staticmethod
+    def _exact_key(key: str, request: Optional[Dict[str, Any]]) -> str:
+        """精确匹配的缓存键：只取影响响应内容的请求参数"""
+        if request is None:
+            return hashlib.sha256(str(key).encode("utf-8")).hexdigest()
+        return _hash({field: request.get(field) for field in KEY_FIELDS})
+    
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        """判断条目是否过期"""
+        return bool(self.ttl) and now - created_at > self.ttl
+    
+    def get(self, key: str, default: Optional[Any] = None) -> Optional[Any]:
+        """读取缓存：先精确匹配，未命中且开启近似匹配时在同一范围内查找最相似的条目"""
+        request = _parse_request(key)
+        exact_key = self._exact_key(key, request)
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (exact_key,)).fetchone()
+                if row and self._is_expired(row[1], now):
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (exact_key,))
+                    conn.commit()
+                    self.expirations += 1
+                    row = None
+                if row:
+                    conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, exact_key))
+                    conn.commit()
+                    self.exact_hits += 1
+                    return pickle.loads(row[0])
+            except Exception:
+                self.errors += 1
+                self.misses += 1
+                return default
+        
+        if self.semantic and request is not None:
+            value = self._semantic_get(request, now)
+            if value is not None:
+                return value
+        with self._lock:
+            self.misses += 1
+        return default
+    
+    def _semantic_get(self, request: Dict[str, Any], now: float) -> Optional[Any]:
+        """在同一范围内查找相似度最高且不低于阈值的条目"""
+        scope, text = _split_request(request)
+        try:
+            query = self._embed(text)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            return None
+        
+        with self._lock:
+            try:
+                conn = self._connect()
+                rows = conn.execute(
+                    "SELECT key, embedding, created_at FROM llm_cache WHERE scope = ? "
+                    "ORDER BY accessed_at DESC LIMIT ?",
+                    (scope, self.semantic_candidates)
+                ).fetchall()
+                best_key, best_score = None, self.similarity_threshold
+                for key, blob, created_at in rows:
+                    if blob is None or self._is_expired(created_at, now):
+                        continue
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    if len(vector) != len(query):
+                        continue
+                    score = sum(a * b for a, b in zip(query, vector))
+                    if score >= best_score:
+                        best_key, best_score = key, score
+                if best_key is None:
+                    return None
+                row = conn.execute("SELECT value FROM llm_cache WHERE key = ?", (best_key,)).fetchone()
+                conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, best_key))
+                conn.commit()
+                self.semantic_hits += 1
+                return pickle.loads(row[0])
+            except Exception:
+                self.errors += 1
+                return None
+    
+    def set(self, key: str, value: Any) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目；无法序列化的响应不缓存"""
+        request = _parse_request(key)
+        exact_key = self._exact_key(key, request)
+        scope, blob = None, None
+        try:
+            data = pickle.dumps(value)
+            if self.semantic and request is not None:
+                scope, text = _split_request(request)
+                blob = array("f", self._embed(text)).tobytes()
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            return
+        
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, scope, embedding, value, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (exact_key, scope, blob, data, now, now)
+                )
+                self.sets += 1
+                self._evict(conn, now)
+                conn.commit()
+            except Exception:
+                self.errors += 1
+    
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """删除过期条目，并在超出容量时按最久未使用淘汰"""
+        if self.ttl:
+            self.expirations += conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,)).rowcount
+        if self.max_entries:
+            size = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            if size > self.max_entries:
+                self.evictions += conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                    (size - self.max_entries,)
+                ).rowcount
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+    
+    def close(self) -> None:
+        """关闭数据库连接，之后再使用时会重新打开"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            try:
+                size = self._connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            except Exception:
+                size = None
+            hits = self.exact_hits + self.semantic_hits
+            total = hits + self.misses
+            return {
+                "size": size,
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "semantic": self.semantic,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "sets": self.sets,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "errors": self.errors,
+                "hit_rate": round(hits / total, 4) if total else 0.0
+            }
+
+
+# 全局LLM响应缓存实例
+llm_cache = LLMResponseCache()
@@ -0,0 +1,206 @@
+"""
+LLM调用指标模块
+通过AutoGen的运行时日志接口记录每次LLM调用，按角色（路由、发言者选择、专业回答、汇总）统计延迟和token数
+"""
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+# 模型角色：router为路由和通用助手，speaker_selection为群组聊天的发言者选择，
+# specialist为专业Agent的回答，summary为工具结果和规划并发结果的汇总
+LLM_ROLES = ("router", "speaker_selection", "specialist", "summary")
+
+# AutoGen在GroupChat中用于LLM发言者选择的内部Agent名称
+SPEAKER_SELECTION_AGENT = "speaker_selection_agent"
+
+
+def _percentile(ordered: list, p: float) -> Optional[float]:
+    """已排序列表的p分位数"""
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 4)
+
+
+class RoleMetrics:
+    """单个角色的LLM调用统计"""
+    
+    def __init__(self, window: int = 1000):
+        self.calls = 0
+        self.cached = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.total_latency = 0.0
+        self.latencies = deque(maxlen=window)
+        self.models = {}
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典，延迟只统计未命中缓存的调用"""
+        ordered = sorted(self.latencies)
+        uncached = self.calls - self.cached
+        return {
+            "calls": self.calls,
+            "cached": self.cached,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost": round(self.cost, 6),
+            "avg_latency_s": round(self.total_latency / uncached, 4) if uncached else None,
+            "p50_latency_s": _percentile(ordered, 50),
+            "p95_latency_s": _percentile(ordered, 95),
+            "models": dict(self.models)
+        }
+
+
+class LLMMetrics:
+    """LLM调用指标类，Agent按名称、直接使用的OpenAIWrapper按实例登记所属角色"""
+    
+    def __init__(self):
+        """初始化指标"""
+        self._lock = threading.Lock()
+        self._agent_roles = {SPEAKER_SELECTION_AGENT: "speaker_selection"}
+        self._wrapper_roles = {}
+        self._roles: Dict[str, RoleMetrics] = {}
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._installed = False
+    
+    def install(self):
+        """注册到AutoGen运行时日志（只注册一次），之后所有LLM调用都会被记录"""
+        if self._installed:
+            return
+        with self._lock:
+            if self._installed:
+                return
+            from autogen import runtime_logging
+            
+            runtime_logging.start(logger=_create_logger(self))
+            self._installed = True
+    
+    def register_agent(self, agent_name: str, role: str):
+        """登记Agent所属的角色"""
+        with self._lock:
+            self._agent_roles[agent_name] = role
+    
+    def register_wrapper(self, wrapper, role: str):
+        """登记直接使用的OpenAIWrapper所属的角色，用完后应调用unregister_wrapper"""
+        with self._lock:
+            self._wrapper_roles[id(wrapper)] = role
+    
+    def unregister_wrapper(self, wrapper):
+        """取消OpenAIWrapper的角色登记"""
+        with self._lock:
+            self._wrapper_roles.pop(id(wrapper), None)
+    
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """注册LLM调用的回调，每次调用记录后在发起调用的线程中以调用详情为参数调用"""
+        with self._lock:
+            self._listeners.append(listener)
+    
+    def _resolve_role(self, wrapper_id: int, source) -> str:
+        """根据调用来源确定角色，无法确定时为other"""
+        role = self._wrapper_roles.get(wrapper_id)
+        if role:
+            return role
+        name = source if isinstance(source, str) else getattr(source, "name", None)
+        return self._agent_roles.get(name, "other")
+    
+    def record(self, wrapper_id: int, source, request: Dict[str, Any], response, is_cached: int,
+               cost: float, start_time: str):
+        """记录一次LLM调用"""
+        try:
+            started = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S.%f")
+            latency = max(0.0, (datetime.utcnow() - started).total_seconds())
+        except (TypeError, ValueError):
+            started, latency = None, None
+        usage = getattr(response, "usage", None)
+        model = getattr(response, "model", None) or request.get("model")
+        prompt_tokens = (getattr(usage, "prompt_tokens", 0) or 0) if usage is not None else 0
+        completion_tokens = (getattr(usage, "completion_tokens", 0) or 0) if usage is not None else 0
+        error = response if isinstance(response, str) else None
+        
+        with self._lock:
+            role = self._resolve_role(wrapper_id, source)
+            metrics = self._roles.setdefault(role, RoleMetrics())
+            metrics.calls += 1
+            metrics.models[model] = metrics.models.get(model, 0) + 1
+            if error is not None:
+                metrics.errors += 1
+            else:
+                if is_cached:
+                    metrics.cached += 1
+                elif latency is not None:
+                    metrics.total_latency += latency
+                    metrics.latencies.append(latency)
+                metrics.prompt_tokens += prompt_tokens
+                metrics.completion_tokens += completion_tokens
+                metrics.cost += cost or 0.0
+            listeners = list(self._listeners)
+        
+        call = {
+            "role": role,
+            "model": model,
+            "start_time": started.replace(tzinfo=timezone.utc).timestamp() if started else None,
+            "latency": latency,
+            "is_cached": bool(is_cached),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost": cost or 0.0,
+            "error": error
+        }
+        for listener in listeners:
+            try:
+                listener(call)
+            except Exception:
+                pass
+    
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """按角色获取LLM调用统计"""
+        with self._lock:
+            return {role: metrics.to_dict() for role, metrics in self._roles.items()}
+    
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._roles.clear()
+
+
+def _create_logger(metrics: LLMMetrics):
+    """创建只记录LLM调用指标的AutoGen运行时日志记录器"""
+    from autogen.logger.base_logger import BaseLogger
+    
+    class MetricsLogger(BaseLogger):
+        def start(self) -> str:
+            return "llm_metrics"
+        
+        def log_chat_completion(self, invocation_id, client_id, wrapper_id, source, request, response,
+                                is_cached, cost, start_time) -> None:
+            metrics.record(wrapper_id, source, request, response, is_cached, cost, start_time)
+        
+        def log_new_agent(self, agent, init_args) -> None:
+            pass
+        
+        def log_event(self, source, name, **kwargs) -> None:
+            pass
+        
+        def log_new_wrapper(self, wrapper, init_args) -> None:
+            pass
+        
+        def log_new_client(self, client, wrapper, init_args) -> None:
+            pass
+        
+        def log_function_use(self, source, function, args, returns) -> None:
+            pass
+        
+        def stop(self) -> None:
+            pass
+        
+        def get_connection(self):
+            return None
+    
+    return MetricsLogger()
+
+
+# 全局LLM调用指标实例
+llm_metrics = LLMMetrics()
@@ -0,0 +1,19 @@
+"""
+文件路径限制模块
+LLM或HTTP请求传入的文件路径只能位于配置的目录内，防止工具读写任意文件
+"""
+import os
+
+
+def resolve_in_directory(path: str, directory: str) -> str:
+    """将path解析为directory内的真实路径（相对路径相对于directory），解析后越出该目录时抛出ValueError
+    
+    解析会跟随符号链接，目录内指向目录外的链接同样被拒绝。
+    """
+    if not path:
+        raise ValueError("文件路径不能为空")
+    base = os.path.realpath(directory)
+    resolved = os.path.realpath(os.path.join(base, path))
+    if os.path.commonpath([base, resolved]) != base:
+        raise ValueError(f"文件路径必须位于目录 {directory} 内: {path}")
+    return resolved
@@ -0,0 +1,87 @@
+"""
+查询规划模块
+将包含多个意图的查询一次性分解为相互独立的子任务，供并发执行
+"""
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+from .intent_router import intent_router
+from mcp.tools_registry import tools_registry
+
+DATE_KEYWORDS = re.compile(r"日期|几号|星期几|今天是|当前时间|date|today", re.IGNORECASE)
+
+# 各意图子任务的说明，用于汇总时标注结果来源
+INTENT_LABELS = {
+    "weather": "天气",
+    "ip": "IP地址",
+    "domain": "域名",
+    "date": "日期",
+}
+
+
+def get_current_date() -> str:
+    """获取当前日期"""
+    return datetime.now().strftime("%Y年%m月%d日 %A")
+
+
+class SubTask:
+    """子任务类：直接调用工具、交给专业Agent或在本地计算，三者取其一"""
+    
+    def __init__(self, intent: str, tool_calls: List[Tuple[str, Dict[str, Any]]] = None,
+                 agent_type: str = None, message: str = None, function: Callable[[], str] = None):
+        """初始化子任务"""
+        self.intent = intent
+        self.label = INTENT_LABELS.get(intent, intent)
+        self.tool_calls = tool_calls or []
+        self.agent_type = agent_type
+        self.message = message
+        self.function = function
+    
+    @property
+    def kind(self) -> str:
+        """子任务类型：tool、agent或local"""
+        if self.tool_calls:
+            return "tool"
+        if self.agent_type:
+            return "agent"
+        return "local"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        task = {"intent": self.intent, "kind": self.kind}
+        if self.tool_calls:
+            task["tool_calls"] = [{"name": name, "arguments": arguments} for name, arguments in self.tool_calls]
+        if self.agent_type:
+            task["agent_type"] = self.agent_type
+        return task
+
+
+class QueryPlanner:
+    """查询规划器类，基于本地规则路由的打分和实体提取进行分解，不调用LLM"""
+    
+    def plan(self, message: str) -> List[SubTask]:
+        """分解查询；能直接映射为工具调用的意图直接调用工具，否则交给对应的专业Agent"""
+        decision = intent_router.classify(message)
+        subtasks = []
+        for intent, score in decision.scores.items():
+            if score < intent_router.threshold:
+                continue
+            tool_calls = tools_registry.plan_fast_path(intent, decision.entities, message)
+            if tool_calls:
+                subtasks.append(SubTask(intent, tool_calls=tool_calls))
+            else:
+                label = INTENT_LABELS.get(intent, intent)
+                subtasks.append(SubTask(
+                    intent,
+                    agent_type=intent,
+                    message=f"{message}\n\n（请只处理其中与{label}相关的部分）"
+                ))
+        
+        if DATE_KEYWORDS.search(message):
+            subtasks.append(SubTask("date", function=get_current_date))
+        return subtasks
+
+
+# 全局查询规划器实例
+query_planner = QueryPlanner()
@@ -0,0 +1,80 @@
+"""
+自适应限流模块
+提供令牌桶限流器，在上游返回429/5xx时自动退避
+"""
+import asyncio
+import time
+from typing import Dict, Any
+
+
+class AdaptiveRateLimiter:
+    """自适应令牌桶限流器类"""
+    
+    def __init__(self, rate: float, burst: float = None, min_rate: float = None,
+                 backoff_factor: float = 0.5, recovery_step: float = None):
+        """初始化限流器，rate为每秒请求数上限"""
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or max(rate * 0.05, 0.1)
+        self.capacity = burst or max(1.0, rate)
+        self.backoff_factor = backoff_factor
+        # 每次成功响应后线性恢复的速率
+        self.recovery_step = recovery_step or max(rate * 0.05, 0.1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self.throttled = 0
+    
+    def _refill(self, now: float):
+        """按当前速率补充令牌"""
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+    
+    async def acquire(self):
+        """获取一个令牌，令牌不足时等待"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                await asyncio.sleep(wait)
+    
+    def on_response(self, status_code: int, retry_after: float = None):
+        """根据响应状态码调整速率"""
+        if status_code == 429 or status_code >= 500:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        elif status_code < 400:
+            self.rate = min(self.max_rate, self.rate + self.recovery_step)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流器统计信息"""
+        return {
+            "rate": round(self.rate, 3),
+            "max_rate": self.max_rate,
+            "throttled": self.throttled
+        }
+
+
+def is_retryable_status(status_code: int) -> bool:
+    """判断状态码是否需要退避重试"""
+    return status_code == 429 or status_code >= 500
+
+
+def parse_retry_after(value: str) -> float:
+    """解析Retry-After响应头（仅支持秒数形式）"""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
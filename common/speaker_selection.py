@@ -0,0 +1,131 @@
+"""
+发言者选择模块
+为GroupChat提供本地规则的发言者选择函数，仅在无法判断时退回LLM选择
+"""
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+from .intent_router import intent_router
+from mcp.tools_registry import tools_registry
+
+
+def _pending_function_name(message: Dict[str, Any]) -> Optional[str]:
+    """获取消息中待执行的函数名"""
+    if message.get("function_call"):
+        return message["function_call"].get("name")
+    if message.get("tool_calls"):
+        return message["tool_calls"][0].get("function", {}).get("name")
+    return None
+
+
+def _is_text_reply(message: Dict[str, Any]) -> bool:
+    """判断消息是否为Agent的文本回答（非函数调用或函数结果）"""
+    return (
+        bool(message.get("content"))
+        and message.get("role") not in ("function", "tool")
+        and not message.get("function_call")
+        and not message.get("tool_calls")
+    )
+
+
+class SpeakerSelector:
+    """本地发言者选择类，作为GroupChat的speaker_selection_method使用
+    
+    选择顺序：
+    1. 上一条消息是函数调用时，交给能执行该函数的Agent
+    2. 上一条消息是函数结果时，交回发起调用的Agent整理回答
+    3. 按用户请求的意图，依次交给尚未作答的专业Agent（由其工具所属意图确定）
+    4. 全部意图都已作答时，多个专业Agent参与过则由汇总Agent汇总一次，然后交回用户代理结束
+    5. 无法判断时返回"auto"，由GroupChatManager调用LLM选择
+    每个选择器实例只用于一次群组聊天。
+    """
+    
+    def __init__(self, user_proxy_name: str = "user_proxy", summarizer_name: str = "general_assistant",
+                 fallback: str = "auto"):
+        """初始化选择器"""
+        self.user_proxy_name = user_proxy_name
+        self.summarizer_name = summarizer_name
+        self.fallback = fallback
+        self._lock = threading.Lock()
+        self.selections = 0
+        self.local = 0
+        self.llm_fallback = 0
+        self.llm_calls_saved = 0
+    
+    def __call__(self, last_speaker, groupchat) -> Union[Any, str]:
+        """GroupChat回调：返回下一位发言的Agent，或"auto"表示交给LLM选择"""
+        agents = {agent.name: agent for agent in groupchat.agents}
+        messages = groupchat.messages
+        last = messages[-1] if messages else {}
+        
+        # 1. 待执行的函数调用；只有一个可执行者时AutoGen本身也不会调用LLM，不计入节省
+        function_name = _pending_function_name(last)
+        if function_name:
+            executors = [agent for agent in groupchat.agents if agent.can_execute_function(function_name)]
+            if executors:
+                chosen = last_speaker if last_speaker in executors else executors[0]
+                return self._select(chosen, saved=len(executors) != 1)
+        
+        # 2. 函数结果交回发起调用的Agent
+        if last.get("role") in ("function", "tool"):
+            for message in reversed(messages[:-1]):
+                if _pending_function_name(message) and message.get("name") in agents:
+                    return self._select(agents[message["name"]])
+        
+        # 3/4. 按意图依次分派
+        chosen = self._next_by_intent(messages, agents)
+        if chosen is not None:
+            return self._select(chosen)
+        
+        with self._lock:
+            self.selections += 1
+            self.llm_fallback += 1
+        return self.fallback
+    
+    def _select(self, agent, saved: bool = True):
+        """记录一次本地选择"""
+        with self._lock:
+            self.selections += 1
+            self.local += 1
+            self.llm_calls_saved += int(saved)
+        return agent
+    
+    def _next_by_intent(self, messages: List[Dict[str, Any]], agents: Dict[str, Any]):
+        """根据首条用户消息的意图选择尚未作答的专业Agent，无法判断时返回None"""
+        if not messages:
+            return None
+        decision = intent_router.classify(str(messages[0].get("content") or ""))
+        intents = [intent for intent, score in decision.scores.items() if score >= intent_router.threshold]
+        if not intents:
+            return None
+        
+        # 通过工具注册表将各Agent的可用函数映射为其负责的意图
+        function_intents = tools_registry.get_function_intents()
+        specialists = {}
+        for agent in agents.values():
+            for function_name in agent.function_map:
+                intent = function_intents.get(function_name)
+                if intent:
+                    specialists.setdefault(intent, agent)
+        if any(intent not in specialists for intent in intents):
+            return None
+        
+        answered = [message.get("name") for message in messages[1:] if _is_text_reply(message)]
+        for intent in intents:
+            if specialists[intent].name not in answered:
+                return specialists[intent]
+        
+        summarizer = agents.get(self.summarizer_name)
+        if len(intents) > 1 and summarizer is not None and answered[-1] != summarizer.name:
+            return summarizer
+        return agents.get(self.user_proxy_name)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取选择统计信息，llm_calls_saved为相比LLM选择节省的调用次数"""
+        with self._lock:
+            return {
+                "selections": self.selections,
+                "local": self.local,
+                "llm_fallback": self.llm_fallback,
+                "llm_calls_saved": self.llm_calls_saved
+            }
@@ -0,0 +1,109 @@
+"""
+流式输出模块
+将对话过程中的LLM增量token和工具调用转换为事件流
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List
+
+# 事件流结束标记
+_END = object()
+
+
+class StreamEvent:
+    """对话流事件类"""
+    
+    def __init__(self, type: str, agent: str = None, content: str = None, data: Dict[str, Any] = None):
+        """初始化事件，type取值为token、message、tool_call、tool_result、done"""
+        self.type = type
+        self.agent = agent
+        self.content = content
+        self.data = data or {}
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        event = {"type": self.type}
+        if self.agent is not None:
+            event["agent"] = self.agent
+        if self.content is not None:
+            event["content"] = self.content
+        if self.data:
+            event["data"] = self.data
+        return event
+    
+    def to_sse(self) -> bytes:
+        """编码为server-sent events格式"""
+        payload = json.dumps(self.to_dict(), ensure_ascii=False)
+        return f"event: {self.type}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class ConversationStream:
+    """对话事件流类，实现AutoGen的IOStream协议以接收流式token"""
+    
+    def __init__(self):
+        """初始化事件流，必须在目标事件循环中创建"""
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.speaker = None
+    
+    def print(self, *objects: Any, sep: str = " ", end: str = "\n", flush: bool = False):
+        """IOStream输出接口：流式模式下LLM每个增量以end=""且flush=True的方式输出"""
+        if end != "" or not flush:
+            return
+        text = sep.join(str(obj) for obj in objects)
+        if text:
+            self.emit(StreamEvent("token", agent=self.speaker, content=text))
+    
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        """IOStream输入接口：非交互式对话不接受人工输入"""
+        return ""
+    
+    def emit(self, event: Any):
+        """投递事件，可在任意线程中调用"""
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+    
+    def close(self):
+        """结束事件流"""
+        self.emit(_END)
+    
+    def attach(self, agents: List):
+        """为Agent注册钩子，记录当前发言者并转发完整消息和工具调用事件"""
+        for agent in agents:
+            agent.register_hook(
+                "process_all_messages_before_reply",
+                lambda messages, name=agent.name: self._on_reply_start(name, messages)
+            )
+            agent.register_hook("process_message_before_send", self._on_send)
+    
+    def _on_reply_start(self, name: str, messages: list) -> list:
+        """Agent开始生成回复"""
+        self.speaker = name
+        return messages
+    
+    def _on_send(self, sender, message, recipient, silent):
+        """Agent发出消息时转换为事件"""
+        if isinstance(message, str):
+            message = {"content": message}
+        if message.get("function_call"):
+            function_call = message["function_call"]
+            self.emit(StreamEvent("tool_call", agent=sender.name, data={
+                "name": function_call.get("name"),
+                "arguments": function_call.get("arguments")
+            }))
+        elif message.get("role") == "function":
+            self.emit(StreamEvent("tool_result", agent=sender.name, content=message.get("content"), data={
+                "name": message.get("name")
+            }))
+        elif message.get("content"):
+            self.emit(StreamEvent("message", agent=sender.name, content=message.get("content"), data={
+                "recipient": recipient.name
+            }))
+        return message
+    
+    async def events(self) -> AsyncIterator[StreamEvent]:
+        """按产生顺序异步迭代事件，直到事件流结束"""
+        while True:
+            event = await self._queue.get()
+            if event is _END:
+                return
+            yield event
@@ -0,0 +1,54 @@
+"""
+工具输出格式模块
+工具结果除面向用户的文本格式外，还可输出紧凑表格或JSON，减少送入LLM上下文的token数
+"""
+import json
+from typing import Any, Dict, List, Sequence
+
+# text：面向用户的完整文本；compact：以|分隔的紧凑表格；json：结构化JSON
+OUTPUT_FORMATS = ("text", "compact", "json")
+
+
+def check_output_format(output_format: str) -> str:
+    """校验输出格式，不支持时抛出ValueError"""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {output_format}，可选: {', '.join(OUTPUT_FORMATS)}")
+    return output_format
+
+
+def parse_fields(fields: str, available: Sequence[str]) -> List[str]:
+    """解析逗号分隔的字段列表，忽略不存在的字段；为空时返回全部字段"""
+    if not fields:
+        return list(available)
+    selected = [field.strip() for field in fields.split(",") if field.strip() in available]
+    return selected or list(available)
+
+
+def render_table(rows: List[Dict[str, Any]], columns: Sequence[str]) -> str:
+    """渲染为紧凑表格：首行为列名，每行一条记录，以|分隔，缺失值为空"""
+    def cell(value: Any) -> str:
+        return "" if value is None else str(value).replace("|", "/").replace("\n", " ")
+    
+    lines = ["|".join(columns)]
+    lines.extend("|".join(cell(row.get(column)) for column in columns) for row in rows)
+    return "\n".join(lines)
+
+
+def render_json(data: Any) -> str:
+    """渲染为不含多余空白的JSON"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def _is_empty(value: Any) -> bool:
+    """判断字段值是否为空"""
+    return value is None or value == ""
+
+
+def render(rows: List[Dict[str, Any]], columns: Sequence[str], output_format: str) -> str:
+    """按compact或json格式渲染记录列表，只包含指定的列，并省略全部为空的列和空值"""
+    columns = [column for column in columns if any(not _is_empty(row.get(column)) for row in rows)] or list(columns)
+    if output_format == "json":
+        return render_json([
+            {column: row.get(column) for column in columns if not _is_empty(row.get(column))} for row in rows
+        ])
+    return render_table(rows, columns)
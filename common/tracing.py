@@ -0,0 +1,532 @@
+"""
+调用链路追踪模块
+为每次对话记录一棵span树（对话 -> 轮次 -> Agent回复 -> LLM调用/工具调用 -> HTTP请求），
+包含耗时、token数和结果状态；对话结束后导出到本地JSON文件或OpenTelemetry(OTLP/HTTP)采集端，
+并按span名称维护p50/p95/p99延迟分布
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import config
+from .llm_metrics import llm_metrics
+
+# span类型，延迟分布按此顺序展示
+SPAN_KINDS = ("conversation", "round", "speaker_selection", "agent", "llm", "tool", "http")
+
+TRACING_EXPORTERS = ("none", "json", "otlp")
+
+# 当前所在的span，异步任务和asyncio.to_thread会自动继承
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _percentile(ordered: list, p: float) -> Optional[float]:
+    """已排序列表的p分位数"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class Span:
+    """调用链路中的一个节点"""
+    
+    def __init__(self, name: str, kind: str, parent: "Span" = None, attributes: Dict[str, Any] = None,
+                 start_time: float = None):
+        """start_time为Unix时间戳（秒），为None时取当前时间"""
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time() if start_time is None else start_time
+        self._started = time.perf_counter()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+        self.children: List["Span"] = []
+        if parent is not None:
+            parent.children.append(self)
+    
+    @property
+    def root(self) -> "Span":
+        """所在调用链路的根span"""
+        span = self
+        while span.parent is not None:
+            span = span.parent
+        return span
+    
+    def set_attribute(self, key: str, value: Any):
+        """设置属性"""
+        self.attributes[key] = value
+    
+    def set_error(self, error):
+        """标记为失败"""
+        self.status = "error"
+        self.error = str(error) or type(error).__name__
+    
+    def end(self, duration: float = None) -> bool:
+        """结束span，返回是否为首次结束"""
+        if self.duration is not None:
+            return False
+        self.duration = time.perf_counter() - self._started if duration is None else max(0.0, duration)
+        return True
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的嵌套字典"""
+        data = {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "status": self.status,
+            "attributes": dict(self.attributes)
+        }
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["children"] = [child.to_dict() for child in self.children]
+        return data
+
+
+class LatencyHistogram:
+    """单个span名称的延迟分布，保留最近window次的耗时用于计算分位数"""
+    
+    def __init__(self, kind: str, window: int = 1000):
+        self.kind = kind
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.durations = deque(maxlen=window)
+    
+    def add(self, duration: float, error: bool = False):
+        """记录一次耗时"""
+        self.count += 1
+        self.errors += error
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.durations.append(duration)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典，耗时单位为毫秒"""
+        ordered = sorted(self.durations)
+        
+        def ms(value):
+            return round(value * 1000, 2) if value is not None else None
+        
+        return {
+            "kind": self.kind,
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": ms(self.total / self.count) if self.count else None,
+            "p50_ms": ms(_percentile(ordered, 50)),
+            "p95_ms": ms(_percentile(ordered, 95)),
+            "p99_ms": ms(_percentile(ordered, 99)),
+            "max_ms": ms(self.max)
+        }
+
+
+class JSONFileExporter:
+    """将每个完成的调用链路作为一行JSON追加到本地文件"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.exported = 0
+        self._lock = threading.Lock()
+    
+    def export(self, root: Span):
+        """导出一个调用链路"""
+        line = json.dumps(root.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.exported += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """导出统计"""
+        return {"type": "json", "path": self.path, "exported": self.exported}
+    
+    def close(self):
+        """无需释放资源"""
+
+
+class OTLPExporter:
+    """以OTLP/HTTP JSON格式将调用链路发送到OpenTelemetry采集端（如OpenTelemetry Collector、Jaeger）
+    
+    发送在单独的后台线程中进行，不阻塞对话；采集端不可用时只计数，不影响对话。
+    """
+    
+    # OTLP的SpanKind：1为INTERNAL，3为CLIENT
+    _SPAN_KINDS = {"llm": 3, "http": 3}
+    
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 10):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+        self.exported = 0
+        self.failed = 0
+        self._client = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="otlp-exporter")
+    
+    @staticmethod
+    def _attribute_value(value: Any) -> Dict[str, Any]:
+        """转换为OTLP的AnyValue"""
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+    
+    def _to_otlp(self, span: Span, spans: List[Dict[str, Any]]):
+        """将span树展平为OTLP的span列表"""
+        attributes = [{"key": "span.kind", "value": {"stringValue": span.kind}}]
+        attributes.extend(
+            {"key": key, "value": self._attribute_value(value)}
+            for key, value in span.attributes.items() if value is not None
+        )
+        start = int(span.start_time * 1e9)
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": self._SPAN_KINDS.get(span.kind, 1),
+            "startTimeUnixNano": str(start),
+            "endTimeUnixNano": str(start + int((span.duration or 0) * 1e9)),
+            "attributes": attributes,
+            "status": {"code": 2, "message": span.error or ""} if span.status == "error" else {"code": 1}
+        }
+        if span.parent is not None:
+            otlp_span["parentSpanId"] = span.parent.span_id
+        spans.append(otlp_span)
+        for child in span.children:
+            self._to_otlp(child, spans)
+    
+    def _send(self, payload: Dict[str, Any]):
+        """在后台线程中发送"""
+        import httpx
+        
+        try:
+            if self._client is None:
+                self._client = httpx.Client(timeout=self.timeout)
+            response = self._client.post(self.url, json=payload)
+            response.raise_for_status()
+            self.exported += 1
+        except Exception:
+            self.failed += 1
+    
+    def export(self, root: Span):
+        """导出一个调用链路"""
+        spans = []
+        self._to_otlp(root, spans)
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}]
+        }]}
+        self._executor.submit(self._send, payload)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """导出统计"""
+        return {"type": "otlp", "url": self.url, "exported": self.exported, "failed": self.failed}
+    
+    def close(self):
+        """等待未发送完的链路并关闭连接"""
+        self._executor.shutdown(wait=True)
+        if self._client is not None:
+            self._client.close()
+
+
+def _create_exporter(tracing_config: Dict[str, Any]):
+    """按配置创建导出器，不导出时返回None"""
+    exporter = tracing_config["exporter"]
+    if exporter not in TRACING_EXPORTERS:
+        raise ValueError(f"不支持的追踪导出方式: {exporter}，可选: {', '.join(TRACING_EXPORTERS)}")
+    if exporter == "json":
+        return JSONFileExporter(tracing_config["json_path"])
+    if exporter == "otlp":
+        return OTLPExporter(tracing_config["otlp_endpoint"], tracing_config["service_name"])
+    return None
+
+
+class _ContextThreadPoolExecutor(concurrent.futures.ThreadPoolExecutor):
+    """在提交任务的上下文中执行任务的线程池
+    
+    AutoGen的异步LLM调用通过loop.run_in_executor在线程池中执行，默认线程池不传递上下文变量，
+    LLM调用的span会脱离所在的Agent回复。
+    """
+    
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class Tracer:
+    """调用链路追踪器，span通过上下文变量关联父子关系"""
+    
+    def __init__(self, tracing_config: Dict[str, Any] = None):
+        """初始化追踪器"""
+        tracing_config = tracing_config or config.get_tracing_config()
+        self.enabled = tracing_config["enabled"]
+        self.histogram_window = tracing_config["histogram_window"]
+        self._exporter = _create_exporter(tracing_config) if self.enabled else None
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._traces = deque(maxlen=tracing_config["max_traces"])
+        self._loops = weakref.WeakSet()
+        self._lock = threading.Lock()
+        if self.enabled:
+            llm_metrics.add_listener(self.record_llm_call)
+    
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        """当前所在的span"""
+        return _current_span.get()
+    
+    def start_span(self, name: str, kind: str, attributes: Dict[str, Any] = None, parent: Span = None,
+                   start_time: float = None) -> Span:
+        """创建span，parent为None时挂在当前span下；需调用end_span结束"""
+        return Span(name, kind, parent or _current_span.get(), attributes, start_time)
+    
+    def end_span(self, span: Span, duration: float = None):
+        """结束span并记录耗时，根span结束时保存并导出整个调用链路"""
+        if not span.end(duration):
+            return
+        with self._lock:
+            histogram = self._histograms.get(span.name)
+            if histogram is None:
+                histogram = self._histograms[span.name] = LatencyHistogram(span.kind, self.histogram_window)
+            histogram.add(span.duration, span.status == "error")
+            if span.parent is None:
+                self._traces.append(span)
+        if span.parent is None and self._exporter is not None:
+            try:
+                self._exporter.export(span)
+            except Exception:
+                pass
+    
+    @contextlib.contextmanager
+    def span(self, name: str, kind: str, **attributes) -> Iterator[Optional[Span]]:
+        """在with块内创建span并设为当前span，块内抛出的异常标记为失败；未开启追踪时返回None"""
+        if not self.enabled:
+            yield None
+            return
+        span = self.start_span(name, kind, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+    
+    def record_llm_call(self, call: Dict[str, Any]):
+        """记录一次已完成的LLM调用（由llm_metrics回调），挂在当前span下，token数同时累加到根span"""
+        attributes = {
+            "role": call["role"],
+            "model": call["model"],
+            "cached": bool(call["is_cached"]),
+            "prompt_tokens": call["prompt_tokens"],
+            "completion_tokens": call["completion_tokens"],
+            "cost": call["cost"]
+        }
+        start_time = call["start_time"]
+        latency = call["latency"]
+        if latency is None or start_time is None:
+            latency, start_time = 0.0, time.time()
+        span = self.start_span(f"llm.{call['role']}", "llm", attributes, start_time=start_time)
+        if call["error"]:
+            span.set_error(call["error"])
+        parent = span.parent
+        if parent is not None:
+            with self._lock:
+                root = parent.root
+                root.attributes["llm_calls"] = root.attributes.get("llm_calls", 0) + 1
+                for key in ("prompt_tokens", "completion_tokens"):
+                    root.attributes[key] = root.attributes.get(key, 0) + call[key]
+        self.end_span(span, latency)
+    
+    def bind_loop(self, loop: asyncio.AbstractEventLoop = None):
+        """将事件循环的默认线程池替换为传递上下文变量的线程池，使run_in_executor中的LLM调用保留所在的span"""
+        if not self.enabled:
+            return
+        loop = loop or asyncio.get_running_loop()
+        with self._lock:
+            if loop in self._loops:
+                return
+            self._loops.add(loop)
+        loop.set_default_executor(_ContextThreadPoolExecutor(thread_name_prefix="traced-executor"))
+    
+    @contextlib.contextmanager
+    def _agent_reply(self, agent, sender) -> Iterator[Span]:
+        """Agent生成一次回复的span；两个Agent的对话中每次回复作为一轮"""
+        parent = _current_span.get()
+        round_span = None
+        # 群组聊天管理器的回复包含整个群组聊天，其中的轮次由发言者选择划分
+        if parent is not None and parent.kind == "conversation" and not hasattr(agent, "groupchat"):
+            parent.attributes["rounds"] = parent.attributes.get("rounds", 0) + 1
+            round_span = self.start_span("round", "round", {"round": parent.attributes["rounds"], "speaker": agent.name},
+                                         parent)
+            parent = round_span
+        span = self.start_span(f"agent.{agent.name}", "agent",
+                               {"agent": agent.name, "sender": getattr(sender, "name", None)}, parent)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            # 群组聊天管理器回复结束时，最后一轮仍为当前span
+            current = _current_span.get()
+            if current is not span and current is not None and current.kind == "round" and current.parent is span:
+                self.end_span(current)
+            _current_span.reset(token)
+            self.end_span(span)
+            if round_span is not None:
+                round_span.status, round_span.error = span.status, span.error
+                self.end_span(round_span)
+    
+    @staticmethod
+    def _describe_reply(span: Span, reply):
+        """记录回复的类型"""
+        if isinstance(reply, dict):
+            outcome = "tool_call" if reply.get("tool_calls") or reply.get("function_call") else "message"
+        else:
+            outcome = "message" if reply else "none"
+        span.set_attribute("outcome", outcome)
+    
+    def instrument_agent(self, agent):
+        """包装Agent实例的generate_reply和a_generate_reply，每次回复记录为一个span；同一实例只包装一次"""
+        if not self.enabled or getattr(agent, "_tracing_instrumented", False):
+            return agent
+        generate_reply, a_generate_reply = agent.generate_reply, agent.a_generate_reply
+        
+        @functools.wraps(generate_reply)
+        def traced_generate_reply(*args, **kwargs):
+            with self._agent_reply(agent, kwargs.get("sender")) as span:
+                reply = generate_reply(*args, **kwargs)
+                self._describe_reply(span, reply)
+                return reply
+        
+        @functools.wraps(a_generate_reply)
+        async def traced_a_generate_reply(*args, **kwargs):
+            with self._agent_reply(agent, kwargs.get("sender")) as span:
+                reply = await a_generate_reply(*args, **kwargs)
+                self._describe_reply(span, reply)
+                return reply
+        
+        agent.generate_reply = traced_generate_reply
+        agent.a_generate_reply = traced_a_generate_reply
+        agent._tracing_instrumented = True
+        return agent
+    
+    @contextlib.contextmanager
+    def _speaker_selection(self) -> Iterator[Span]:
+        """群组聊天的一轮从选择发言者开始：结束上一轮，新一轮设为当前span直到下一次选择或管理器回复结束"""
+        current = _current_span.get()
+        if current is not None and current.kind == "round":
+            self.end_span(current)
+            current = current.parent
+        number = 1
+        if current is not None:
+            number = current.attributes["rounds"] = current.attributes.get("rounds", 0) + 1
+        round_span = self.start_span("round", "round", {"round": number}, current)
+        _current_span.set(round_span)
+        with self.span("speaker_selection", "speaker_selection") as span:
+            yield span
+        round_span.set_attribute("speaker", span.attributes.get("speaker"))
+    
+    def instrument_group_chat(self, group_chat):
+        """包装群组聊天的发言者选择，使每轮（选择发言者及其回复）成为一个span
+        
+        GroupChatManager注册回复函数时保存的是GroupChat的浅拷贝，需在创建管理器之前调用；
+        管理器本身用instrument_agent包装。
+        """
+        if not self.enabled:
+            return group_chat
+        select_speaker, a_select_speaker = group_chat.select_speaker, group_chat.a_select_speaker
+        
+        def traced_select_speaker(*args, **kwargs):
+            with self._speaker_selection() as span:
+                speaker = select_speaker(*args, **kwargs)
+                span.set_attribute("speaker", getattr(speaker, "name", None))
+                return speaker
+        
+        async def traced_a_select_speaker(*args, **kwargs):
+            with self._speaker_selection() as span:
+                speaker = await a_select_speaker(*args, **kwargs)
+                span.set_attribute("speaker", getattr(speaker, "name", None))
+                return speaker
+        
+        group_chat.select_speaker = traced_select_speaker
+        group_chat.a_select_speaker = traced_a_select_speaker
+        return group_chat
+    
+    def get_histograms(self) -> Dict[str, Dict[str, Any]]:
+        """按span名称获取延迟分布，按span类型排序"""
+        with self._lock:
+            histograms = {name: histogram.to_dict() for name, histogram in self._histograms.items()}
+        order = {kind: i for i, kind in enumerate(SPAN_KINDS)}
+        return dict(sorted(histograms.items(), key=lambda item: (order.get(item[1]["kind"], len(order)), item[0])))
+    
+    def get_recent_traces(self, limit: int = None) -> List[Dict[str, Any]]:
+        """获取最近完成的调用链路，最新的在前"""
+        with self._lock:
+            traces = list(self._traces)[::-1]
+        return [trace.to_dict() for trace in traces[:limit]]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取追踪统计信息"""
+        with self._lock:
+            traces = len(self._traces)
+        return {
+            "enabled": self.enabled,
+            "traces": traces,
+            "exporter": self._exporter.get_stats() if self._exporter else None
+        }
+    
+    def reset(self):
+        """清空延迟分布和保存的调用链路"""
+        with self._lock:
+            self._histograms.clear()
+            self._traces.clear()
+    
+    def close(self):
+        """关闭导出器"""
+        if self._exporter is not None:
+            self._exporter.close()
+
+
+def format_trace(trace: Dict[str, Any], indent: int = 0) -> List[str]:
+    """将调用链路格式化为缩进的文本行"""
+    attributes = trace["attributes"]
+    details = []
+    for key in ("speaker", "model", "cached", "method", "url", "status_code", "cache_hit", "outcome"):
+        if attributes.get(key) is not None:
+            details.append(f"{key}={attributes[key]}")
+    if attributes.get("prompt_tokens") is not None:
+        details.append(f"tokens={attributes['prompt_tokens']}+{attributes.get('completion_tokens', 0)}")
+    status = "" if trace["status"] == "ok" else f" ❌ {trace.get('error', '')}"
+    lines = [f"{'  ' * indent}{trace['name']} {trace['duration_ms']}ms {' '.join(details)}{status}".rstrip()]
+    for child in trace.get("children", []):
+        lines.extend(format_trace(child, indent + 1))
+    return lines
+
+
+# 全局调用链路追踪器实例
+tracer = Tracer()
@@ -2,6 +2,9 @@
 多Agent系统主程序
 重构后的模块化入口程序
 """
+import argparse
+import concurrent.futures
+
 from common.agent_manager import agent_manager
 from mcp.tools_registry import tools_registry
 
@@ -17,6 +20,7 @@ def display_menu():
     print("4. 智能路由对话")
     print("5. 显示Agent信息")
     print("6. 显示可用工具")
+    print("7. 显示调用延迟分布")
     print("0. 退出系统")
     print("="*50)
 
@@ -31,6 +35,25 @@ def display_agent_info():
         for capability in info['capabilities']:
             print(f"   • {capability}")
         print()
+    
+    stats = agent_manager.get_routing_stats()
+    print(f"🧭 本地规则路由: {stats['local']}/{stats['total']} "
+          f"(占比 {stats['local_ratio']:.0%}, 交给LLM路由 {stats['llm_fallback']})")
+    
+    llm_cache_stats = agent_manager.get_llm_cache_stats()
+    if llm_cache_stats:
+        print(f"💾 LLM响应缓存: 精确命中 {llm_cache_stats['exact_hits']} / 近似命中 {llm_cache_stats['semantic_hits']} / "
+              f"未命中 {llm_cache_stats['misses']} (命中率 {llm_cache_stats['hit_rate']:.0%}, "
+              f"条目 {llm_cache_stats['size']}/{llm_cache_stats['max_entries']})")
+    
+    llm_metrics = agent_manager.get_llm_metrics()
+    if llm_metrics:
+        print("📈 LLM调用(按角色):")
+        for role, metrics in llm_metrics.items():
+            models = ", ".join(metrics["models"])
+            print(f"   {role}: 调用 {metrics['calls']} 次 (缓存 {metrics['cached']}), "
+                  f"平均延迟 {metrics['avg_latency_s']}s, p95 {metrics['p95_latency_s']}s, "
+                  f"token {metrics['prompt_tokens']}+{metrics['completion_tokens']}, 模型 {models}")
 
 
 def display_tools_info():
@@ -43,6 +66,47 @@ def display_tools_info():
         print(f"   描述: {tool['description']}")
         print(f"   函数: {tool['function_name']}")
         print()
+    
+    cache_stats = tools_registry.get_cache_stats()
+    if cache_stats:
+        print("📦 工具缓存统计:")
+        for name, stats in cache_stats.items():
+            print(f"   {name}: 命中 {stats['hits']} / 未命中 {stats['misses']} "
+                  f"(命中率 {stats['hit_rate']:.0%}, 条目 {stats['size']}/{stats['max_size']})")
+    
+    print("🔗 并发调用合并统计:")
+    for name, stats in tools_registry.get_coalescing_stats().items():
+        print(f"   {name}: 调用 {stats['calls']} / 实际执行 {stats['executions']} / 合并 {stats['coalesced']}")
+
+
+def display_latency_stats():
+    """显示各类调用的延迟分布和最近一次对话的调用链路"""
+    from common.tracing import format_trace
+    
+    stats = agent_manager.get_tracing_stats()
+    if not stats["enabled"]:
+        print("\n⚠️ 调用链路追踪未开启（TRACING_ENABLED=false）")
+        return
+    
+    print("\n⏱️ 调用延迟分布 (ms):")
+    print("-" * 40)
+    histograms = agent_manager.get_latency_histograms()
+    if not histograms:
+        print("暂无记录，请先进行对话")
+        return
+    # 中文表头每个字符占两列宽度
+    print(f"{'名称':<36}{'次数':>4}{'失败':>4}{'平均':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, histogram in histograms.items():
+        print(f"{name:<38}{histogram['count']:>6}{histogram['errors']:>6}{histogram['avg_ms']:>10}"
+              f"{histogram['p50_ms']:>10}{histogram['p95_ms']:>10}{histogram['p99_ms']:>10}")
+    
+    exporter = stats["exporter"]
+    if exporter:
+        print(f"\n📤 导出: {exporter['type']} 已导出 {exporter['exported']} 条调用链路")
+    traces = agent_manager.get_recent_traces(1)
+    if traces:
+        print("\n🌲 最近一次对话的调用链路:")
+        print("\n".join(format_trace(traces[0], 1)))
 
 
 def chat_with_weather_assistant():
@@ -76,17 +140,99 @@ def chat_with_router():
     print("输入'quit'退出对话")
     user_input = input("请输入您的问题: ").strip()
     if user_input.lower() != 'quit':
-        agent_manager.chat_with_agent("router", user_input)
+        agent_manager.route_chat(user_input)
+
+
+def run_domain_bulk(args):
+    """从文件批量处理域名，逐批打印进度，Ctrl+C中断后重新运行相同命令可从检查点继续"""
+    from agents.domain_agent.domain_bulk import format_bulk_summary, process_domains_file
+    from common.async_runner import async_runner
+    
+    def report(progress):
+        print(f"\r⏳ [{progress['processed']}/{progress['total']}] {progress['percent']}% "
+              f"成功 {progress['succeeded']} 失败 {progress['failed']} "
+              f"速率 {progress['rate_per_s']}/s", end="", flush=True)
+    
+    print(f"\n📂 批量处理域名文件: {args.input} (模式: {args.mode})")
+    future = async_runner.submit(
+        process_domains_file(args.input, args.mode, args.output, args.format, not args.no_resume, report),
+        timeout=0,
+        limited=False
+    )
+    try:
+        summary = future.result()
+        print(f"\n✅ {format_bulk_summary(summary)}")
+    except KeyboardInterrupt:
+        future.cancel()
+        print("\n⏸️ 已中断，重新运行相同命令可从检查点继续")
+    except concurrent.futures.CancelledError:
+        print("\n⏸️ 处理已取消")
+    except Exception as e:
+        print(f"\n❌ 域名批量处理失败: {str(e)}")
+
+
+def run_ip_batch(args):
+    """批量查询IP归属地并打印汇总，远程查询时逐批打印进度"""
+    from agents.ip_agent.ip_batch import batch_get_ip_locations
+    from common.async_runner import async_runner
+    
+    def report(summary):
+        print(f"\r⏳ 已解析 {summary['resolved']}/{summary['ips']} "
+              f"(本地 {summary['local']} / 远程 {summary['remote']})", end="", flush=True)
+    
+    future = async_runner.submit(
+        batch_get_ip_locations(",".join(args.ips), args.file or "", args.group_by, args.top, args.format, report),
+        timeout=0,
+        limited=False
+    )
+    try:
+        print(f"\n{future.result()}")
+    except KeyboardInterrupt:
+        future.cancel()
+        print("\n⏸️ 已中断")
+
+
+def parse_args():
+    """解析命令行参数，不带子命令时进入交互式菜单"""
+    parser = argparse.ArgumentParser(description="多Agent智能助手系统")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    bulk_parser = subparsers.add_parser("domain-bulk", help="从文件批量查询域名信息或检测域名状态")
+    bulk_parser.add_argument("input", help="域名文件，每行一个或多个逗号分隔的域名")
+    bulk_parser.add_argument("--mode", choices=["info", "status"], default="info",
+                             help="info为查询基础信息，status为检测是否可申请")
+    bulk_parser.add_argument("-o", "--output", help="结果文件路径，默认写在域名文件旁")
+    bulk_parser.add_argument("--format", choices=["jsonl", "csv"], help="结果文件格式，默认按扩展名判断")
+    bulk_parser.add_argument("--no-resume", action="store_true", help="忽略检查点，从头处理")
+    
+    ip_parser = subparsers.add_parser("ip-batch", help="批量查询IP归属地并按国家、运营商等汇总")
+    ip_parser.add_argument("ips", nargs="*", help="IP地址或CIDR网段")
+    ip_parser.add_argument("-f", "--file", help="日志文件，提取其中所有IP并统计出现次数")
+    ip_parser.add_argument("--group-by", choices=["country", "region", "city", "org"], default="country",
+                           help="汇总维度")
+    ip_parser.add_argument("--top", type=int, default=20, help="显示出现次数最多的前N个分组")
+    ip_parser.add_argument("--format", choices=["text", "compact", "json"], default="text", help="输出格式")
+    return parser.parse_args()
 
 
 def main():
     """主程序"""
+    args = parse_args()
+    if args.command == "domain-bulk":
+        run_domain_bulk(args)
+        agent_manager.shutdown()
+        return
+    if args.command == "ip-batch":
+        run_ip_batch(args)
+        agent_manager.shutdown()
+        return
+    
     print("🚀 系统初始化完成!")
     
     while True:
         try:
             display_menu()
-            choice = input("\n请选择功能 (0-6): ").strip()
+            choice = input("\n请选择功能 (0-7): ").strip()
             
             if choice == "0":
                 print("\n👋 感谢使用多Agent智能助手系统，再见!")
@@ -103,15 +249,19 @@ def main():
                 display_agent_info()
             elif choice == "6":
                 display_tools_info()
+            elif choice == "7":
+                display_latency_stats()
             else:
-                print("❌ 无效选择，请输入0-6之间的数字")
-                
+                print("❌ 无效选择，请输入0-7之间的数字")
+        
         except KeyboardInterrupt:
             print("\n\n👋 用户中断，系统退出")
             break
         except Exception as e:
             print(f"\n❌ 系统错误: {str(e)}")
             print("请重试或联系管理员")
+    
+    agent_manager.shutdown()
 
 
 if __name__ == "__main__":
@@ -2,83 +2,385 @@
 MCP工具注册表
 统一管理和定义所有可用的工具
 """
-from typing import Dict, List, Any, Callable
-from agents.weather_agent.weather_tools import get_weather_sync, get_weather_function_schema
-from agents.ip_agent.ip_tools import get_ip_location_sync, get_ip_function_schema
+import functools
+import importlib
+import inspect
+import re
+import threading
+from typing import Dict, List, Any, Callable, Tuple
+
+from common.cache import TTLCache, MISSING
+from common.config import config
+from common.singleflight import SingleFlight
+from common.tool_output import check_output_format
+from common.tracing import tracer
+
+# 只影响结果呈现方式的参数，不参与规范化缓存键的计算，单独附加到缓存键中
+OUTPUT_ARGUMENTS = ("output_format", "fields")
 
 
 class ToolsRegistry:
     """工具注册表类"""
     
+    # 默认工具定义：工具模块在首次使用该工具时才导入，
+    # 其余字段为模块中的属性名，cache_ttl为缓存配置中的键；
+    # fast_path描述如何由本地路由提取的实体直接构造调用参数：
+    # intent为对应意图，entity为实体类别，argument为参数名，
+    # batch表示将全部实体以逗号拼接后一次调用（否则每个实体调用一次），
+    # keywords为同一意图有多个工具时用于区分的关键词；
+    # llm_output_format可为单个工具指定送入LLM上下文的输出格式
+    DEFAULT_TOOLS = {
+        "weather": {
+            "module": "agents.weather_agent.weather_tools",
+            "function": "get_weather_sync",
+            "schema": "get_weather_function_schema",
+            "function_name": "get_weather",
+            "description": "天气查询工具，可以查询指定城市的天气信息",
+            "cache_ttl": "weather_ttl",
+            "cache_key": "normalize_weather_args",
+            "error_prefixes": "WEATHER_ERROR_PREFIXES",
+            "fast_path": {
+                "intent": "weather",
+                "entity": "cities",
+                "argument": "city"
+            }
+        },
+        # 多城市天气对比，不设fast_path，避免与单城市查询的快速路径同时匹配
+        "weather_batch": {
+            "module": "agents.weather_agent.weather_tools",
+            "function": "get_weather_batch_sync",
+            "schema": "get_weather_batch_function_schema",
+            "function_name": "get_weather_batch",
+            "description": "多城市天气查询工具，可以一次并发查询多个城市的天气并返回对比表格",
+            "cache_ttl": "weather_ttl",
+            "cache_key": "normalize_weather_batch_args",
+            "error_prefixes": "WEATHER_ERROR_PREFIXES"
+        },
+        "ip_location": {
+            "module": "agents.ip_agent.ip_tools",
+            "function": "get_ip_location_sync",
+            "schema": "get_ip_function_schema",
+            "function_name": "get_ip_location",
+            "description": "IP地址查询工具，可以查询IP地址的归属地信息",
+            "cache_ttl": "ip_ttl",
+            "cache_key": "normalize_ip_args",
+            "error_prefixes": "IP_ERROR_PREFIXES",
+            "fast_path": {
+                "intent": "ip",
+                "entity": "ips",
+                "argument": "ip"
+            }
+        },
+        # 批量IP归属地汇总，日志文件内容可能变化，不缓存
+        "ip_batch": {
+            "module": "agents.ip_agent.ip_batch",
+            "function": "batch_get_ip_locations_sync",
+            "schema": "get_batch_ip_locations_schema",
+            "function_name": "batch_get_ip_locations",
+            "description": "IP批量查询工具，可以对IP列表、CIDR网段或日志文件中的IP去重查询并按国家、运营商等汇总"
+        },
+        "domain_info": {
+            "module": "agents.domain_agent.domain_tools",
+            "function": "batch_get_domains_info_sync",
+            "schema": "get_batch_domains_info_schema",
+            "function_name": "batch_get_domains_info",
+            "description": "域名信息查询工具，可以批量查询域名的基础信息",
+            "cache_ttl": "domain_info_ttl",
+            "cache_key": "normalize_domains_args",
+            "error_prefixes": "DOMAIN_INFO_ERROR_PREFIXES",
+            "fast_path": {
+                "intent": "domain",
+                "entity": "domains",
+                "argument": "domains",
+                "batch": True,
+                "keywords": r"信息|详情|whois|注册商|到期|info"
+            }
+        },
+        # 域名状态实时变化，不缓存
+        "domain_status": {
+            "module": "agents.domain_agent.domain_tools",
+            "function": "batch_check_domains_status_sync",
+            "schema": "get_batch_domains_status_schema",
+            "function_name": "batch_check_domains_status",
+            "description": "域名状态检测工具，可以批量检测域名是否可申请",
+            "fast_path": {
+                "intent": "domain",
+                "entity": "domains",
+                "argument": "domains",
+                "batch": True,
+                "keywords": r"状态|可申请|被占用|可用|检测|检查|status|check|available"
+            }
+        },
+        # 从文件批量处理域名，结果写入文件，只返回处理汇总，不缓存
+        "domain_bulk": {
+            "module": "agents.domain_agent.domain_bulk",
+            "function": "bulk_process_domains_file_sync",
+            "schema": "get_bulk_domains_schema",
+            "function_name": "bulk_process_domains_file",
+            "description": "域名文件批量处理工具，可以从文件批量查询域名信息或检测状态并将结果写入文件"
+        },
+    }
+    
     def __init__(self):
-        """初始化工具注册表"""
+        """初始化工具注册表，默认工具在首次获取时才加载"""
         self._tools = {}
         self._schemas = {}
+        self._caches = {}
+        self._flights = {}
+        self._lazy_tools = {}
+        self._fast_paths = {}
+        self._llm_formats = {}
+        self._lock = threading.RLock()
+        self.cache_config = config.get_cache_config()
+        self.output_config = config.get_tool_output_config()
         self._register_default_tools()
     
     def _register_default_tools(self):
-        """注册默认工具"""
-        # 注册天气查询工具
-        self.register_tool(
-            name="weather",
-            function=get_weather_sync,
-            schema=get_weather_function_schema(),
-            description="天气查询工具，可以查询指定城市的天气信息"
-        )
-        
-        # 注册IP查询工具
-        self.register_tool(
-            name="ip_location",
-            function=get_ip_location_sync,
-            schema=get_ip_function_schema(),
-            description="IP地址查询工具，可以查询IP地址的归属地信息"
-        )
+        """注册默认工具（延迟加载）"""
+        for name, spec in self.DEFAULT_TOOLS.items():
+            self.register_lazy_tool(name, spec)
+    
+    def register_lazy_tool(self, name: str, spec: Dict[str, Any]):
+        """按DEFAULT_TOOLS格式的定义注册工具，首次获取时才导入工具模块"""
+        self._lazy_tools[name] = spec
+        if spec.get("fast_path"):
+            self._fast_paths[name] = spec["fast_path"]
+        if spec.get("llm_output_format"):
+            self._llm_formats.setdefault(name, spec["llm_output_format"])
+    
+    def _load_tool(self, name: str):
+        """导入延迟注册的工具模块并完成注册"""
+        with self._lock:
+            spec = self._lazy_tools.get(name)
+            if spec is None or name in self._tools:
+                return
+            module = importlib.import_module(spec["module"])
+            self.register_tool(
+                name=name,
+                function=getattr(module, spec["function"]),
+                schema=getattr(module, spec["schema"])(),
+                description=spec.get("description", ""),
+                cache_ttl=self.cache_config[spec["cache_ttl"]] if spec.get("cache_ttl") else None,
+                cache_key=getattr(module, spec["cache_key"]) if spec.get("cache_key") else None,
+                error_prefixes=getattr(module, spec["error_prefixes"]) if spec.get("error_prefixes") else (),
+                fast_path=spec.get("fast_path"),
+                llm_output_format=spec.get("llm_output_format")
+            )
     
-    def register_tool(self, name: str, function: Callable, schema: Dict[str, Any], description: str = ""):
-        """注册工具"""
+    def _ensure_tool(self, name: str):
+        """确保工具已加载"""
+        if name not in self._tools and name in self._lazy_tools:
+            self._load_tool(name)
+    
+    def _ensure_all_tools(self):
+        """加载全部延迟注册的工具"""
+        for name in list(self._lazy_tools):
+            self._ensure_tool(name)
+    
+    def register_tool(self, name: str, function: Callable, schema: Dict[str, Any], description: str = "",
+                      cache_ttl: float = None, cache_key: Callable = None, error_prefixes: Tuple[str, ...] = (),
+                      fast_path: Dict[str, Any] = None, llm_output_format: str = None):
+        """注册工具，相同参数的并发调用会被合并，指定cache_ttl时对调用结果进行缓存
+        
+        工具函数接受output_format参数时，Agent调用的结果按llm_output_format（缺省时按配置）格式送入LLM上下文。
+        """
+        cache = None
+        if cache_ttl:
+            cache = TTLCache(max_size=self.cache_config["max_size"], ttl=cache_ttl)
+            self._caches[name] = cache
+        flight = SingleFlight()
+        self._flights[name] = flight
+        self._lazy_tools.pop(name, None)
+        if fast_path:
+            self._fast_paths[name] = fast_path
+        if llm_output_format:
+            self._llm_formats.setdefault(name, check_output_format(llm_output_format))
+        
         self._tools[name] = {
-            "function": function,
+            "function": self._build_tool_function(name, function, flight, cache, cache_key, error_prefixes),
+            "raw_function": function,
             "schema": schema,
-            "description": description
+            "description": description,
+            "formattable": "output_format" in inspect.signature(function).parameters
         }
         self._schemas[name] = schema
     
+    @staticmethod
+    def _build_tool_function(name: str, function: Callable, flight: SingleFlight, cache: TTLCache = None,
+                             cache_key: Callable = None, error_prefixes: Tuple[str, ...] = ()) -> Callable:
+        """包装工具函数：按规范化后的参数查缓存，未命中时合并相同的并发调用；每次调用记录一个追踪span"""
+        signature = inspect.signature(function)
+        
+        def is_error(result) -> bool:
+            return isinstance(result, str) and result.lstrip().startswith(error_prefixes or ())
+        
+        def execute(key, args, kwargs):
+            result = function(*args, **kwargs)
+            if cache is not None and not is_error(result):
+                cache.set(key, result)
+            return result
+        
+        def call(args, kwargs) -> Tuple[Any, bool]:
+            """返回(结果, 是否命中缓存)"""
+            arguments = dict(signature.bind(*args, **kwargs).arguments)
+            output_arguments = tuple(
+                (argument, arguments.pop(argument)) for argument in OUTPUT_ARGUMENTS if argument in arguments
+            )
+            if cache_key:
+                key = (name, cache_key(**arguments), output_arguments)
+            else:
+                key = (name, tuple(sorted(arguments.items())), output_arguments)
+            
+            if cache is not None:
+                result = cache.get(key)
+                if result is not MISSING:
+                    return result, True
+            
+            return flight.do(key, execute, key, args, kwargs), False
+        
+        @functools.wraps(function)
+        def tool_function(*args, **kwargs):
+            with tracer.span(f"tool.{name}", "tool", tool=name) as span:
+                result, cache_hit = call(args, kwargs)
+                if span is not None:
+                    span.set_attribute("cache_hit", cache_hit)
+                    if is_error(result):
+                        span.set_error(result.strip()[:200])
+                return result
+        
+        return tool_function
+    
     def get_tool(self, name: str) -> Dict[str, Any]:
         """获取工具"""
+        self._ensure_tool(name)
         return self._tools.get(name)
     
-    def get_tool_function(self, name: str) -> Callable:
-        """获取工具函数"""
-        tool = self._tools.get(name)
-        return tool["function"] if tool else None
+    def get_tool_function(self, name: str, output_format: str = None) -> Callable:
+        """获取工具函数（带缓存和并发调用合并的版本），指定output_format时绑定该输出格式"""
+        tool = self.get_tool(name)
+        if not tool:
+            return None
+        if not output_format or not tool["formattable"]:
+            return tool["function"]
+        return functools.partial(tool["function"], output_format=check_output_format(output_format))
+    
+    def get_llm_tool_function(self, name: str) -> Callable:
+        """获取供Agent注册的工具函数，结果按该工具送入LLM上下文的格式输出
+        
+        格式在每次调用时读取，set_llm_output_format的修改对已注册的Agent立即生效。
+        """
+        tool = self.get_tool(name)
+        if not tool:
+            return None
+        if not tool["formattable"]:
+            return tool["function"]
+        
+        @functools.wraps(tool["function"])
+        def llm_tool_function(*args, **kwargs):
+            kwargs.setdefault("output_format", self.get_llm_output_format(name))
+            return tool["function"](*args, **kwargs)
+        
+        return llm_tool_function
+    
+    def get_llm_output_format(self, name: str) -> str:
+        """获取工具送入LLM上下文的输出格式：环境变量单独指定 > 运行时设置或工具定义 > 全局默认"""
+        return (
+            self.output_config["llm_formats"].get(name)
+            or self._llm_formats.get(name)
+            or self.output_config["llm_format"]
+        )
+    
+    def set_llm_output_format(self, name: str, output_format: str):
+        """运行时修改工具送入LLM上下文的输出格式"""
+        self.output_config["llm_formats"].pop(name, None)
+        self._llm_formats[name] = check_output_format(output_format)
+    
+    def get_display_output_format(self) -> str:
+        """获取工具结果直接展示给用户时的输出格式"""
+        return self.output_config["display_format"]
     
     def get_tool_schema(self, name: str) -> Dict[str, Any]:
         """获取工具schema"""
+        self._ensure_tool(name)
         return self._schemas.get(name)
     
     def get_all_tools(self) -> Dict[str, Dict[str, Any]]:
         """获取所有工具"""
+        self._ensure_all_tools()
         return self._tools.copy()
     
     def get_all_schemas(self) -> Dict[str, Dict[str, Any]]:
         """获取所有工具schema"""
+        self._ensure_all_tools()
         return self._schemas.copy()
     
     def list_tool_names(self) -> List[str]:
-        """列出所有工具名称"""
-        return list(self._tools.keys())
+        """列出所有工具名称（不触发加载）"""
+        return list(self._tools.keys()) + [name for name in self._lazy_tools if name not in self._tools]
     
     def get_tools_info(self) -> List[Dict[str, str]]:
-        """获取工具信息摘要"""
+        """获取工具信息摘要（不触发加载）"""
         info = []
-        for name, tool in self._tools.items():
+        for name in self.list_tool_names():
+            tool = self._tools.get(name)
+            if tool:
+                description, function_name = tool["description"], tool["schema"]["name"]
+            else:
+                spec = self._lazy_tools[name]
+                description, function_name = spec.get("description", ""), spec["function_name"]
             info.append({
                 "name": name,
-                "description": tool["description"],
-                "function_name": tool["schema"]["name"]
+                "description": description,
+                "function_name": function_name,
+                "llm_output_format": self.get_llm_output_format(name)
             })
         return info
+    
+    def plan_fast_path(self, intent: str, entities: Dict[str, List[str]], message: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """根据本地路由结果直接构造工具调用列表，只有唯一工具匹配时才返回，否则返回空列表"""
+        # 提到文件的请求（如从文件批量处理）需要Agent选择文件类工具，不走快速路径
+        if entities.get("files"):
+            return []
+        candidates = [
+            (name, fast_path) for name, fast_path in self._fast_paths.items()
+            if fast_path["intent"] == intent and entities.get(fast_path["entity"])
+            and (not fast_path.get("keywords") or re.search(fast_path["keywords"], message, re.IGNORECASE))
+        ]
+        if len(candidates) != 1:
+            return []
+        
+        name, fast_path = candidates[0]
+        values = entities[fast_path["entity"]]
+        if fast_path.get("batch"):
+            return [(name, {fast_path["argument"]: ",".join(values)})]
+        return [(name, {fast_path["argument"]: value}) for value in values]
+    
+    def get_function_intents(self) -> Dict[str, str]:
+        """获取函数名到所属意图的映射（不触发加载）"""
+        intents = {}
+        for name, fast_path in self._fast_paths.items():
+            tool = self._tools.get(name)
+            function_name = tool["schema"]["name"] if tool else self._lazy_tools[name]["function_name"]
+            intents[function_name] = fast_path["intent"]
+        return intents
+    
+    def get_cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各工具的缓存命中统计"""
+        return {name: cache.get_stats() for name, cache in self._caches.items()}
+    
+    def get_coalescing_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各工具的并发调用合并统计"""
+        return {name: flight.get_stats() for name, flight in self._flights.items()}
+    
+    def clear_cache(self, name: str = None):
+        """清空指定工具的缓存，name为None时清空全部工具的缓存；工具不存在或未启用缓存时不做任何操作"""
+        if name is None:
+            caches = list(self._caches.values())
+        else:
+            caches = [self._caches[name]] if name in self._caches else []
+        for cache in caches:
+            cache.clear()
 
 
 # 全局工具注册表实例
-tools_registry = ToolsRegistry()
\ No newline at end of file
+tools_registry = ToolsRegistry()
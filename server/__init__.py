@@ -0,0 +1,4 @@
+"""
+HTTP服务包
+以ASGI应用的形式对外提供Agent对话接口
+"""
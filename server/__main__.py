@@ -0,0 +1,34 @@
+"""
+HTTP服务启动入口
+
+用法: python -m server --host 0.0.0.0 --port 8000 --workers 4
+"""
+import argparse
+
+import uvicorn
+
+from common.config import config
+
+
+def main():
+    """命令行入口"""
+    server_config = config.get_server_config()
+    parser = argparse.ArgumentParser(description="多Agent智能助手HTTP服务")
+    parser.add_argument("--host", default=server_config["host"], help="监听地址")
+    parser.add_argument("--port", type=int, default=server_config["port"], help="监听端口")
+    parser.add_argument("--workers", type=int, default=server_config["workers"], help="工作进程数")
+    args = parser.parse_args()
+    
+    # 以导入字符串的形式传入应用，多进程模式下每个工作进程各自初始化Agent管理器
+    uvicorn.run(
+        "server.app:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        lifespan="on",
+        timeout_graceful_shutdown=int(server_config["shutdown_timeout"])
+    )
+
+
+if __name__ == "__main__":
+    main()
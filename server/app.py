@@ -0,0 +1,330 @@
+"""
+ASGI应用
+以JSON接口提供单Agent对话、智能路由对话和群组聊天
+"""
+import asyncio
+import json
+import math
+from typing import Any, Dict, Optional
+
+from common.agent_manager import agent_manager
+from common.config import config
+
+
+class RequestError(Exception):
+    """请求处理失败时抛出的异常，携带HTTP状态码"""
+    
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class AdmissionController:
+    """请求准入控制类，限制并发处理数，排队已满时拒绝新请求"""
+    
+    def __init__(self, max_concurrency: int, max_queue: int):
+        """初始化准入控制器"""
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.queued = 0
+        self.rejected = 0
+        self.draining = False
+        self._semaphore = None
+        self._idle = None
+    
+    def _ensure_primitives(self):
+        """在服务事件循环中延迟创建同步原语"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._idle = asyncio.Event()
+            self._idle.set()
+    
+    def admit(self) -> bool:
+        """尝试接收一个新请求，正在关闭或排队已满时返回False"""
+        if self.draining or self.active + self.queued >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            return False
+        self._ensure_primitives()
+        self.queued += 1
+        self._idle.clear()
+        return True
+    
+    async def __aenter__(self):
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self.active -= 1
+        self._semaphore.release()
+        if self.active == 0 and self.queued == 0:
+            self._idle.set()
+    
+    async def wait_idle(self, timeout: float):
+        """等待所有处理中和排队中的请求完成"""
+        if self._idle is None:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取准入控制统计信息"""
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "draining": self.draining
+        }
+
+
+class AgentServerApp:
+    """Agent对话服务ASGI应用类"""
+    
+    # (方法, 路径) 到处理函数名的映射
+    ROUTES = {
+        ("POST", "/chat"): "_handle_chat",
+        ("POST", "/route"): "_handle_route",
+        ("POST", "/group_chat"): "_handle_group_chat",
+        ("POST", "/fanout"): "_handle_fanout",
+    }
+    
+    # 流式接口，以server-sent events返回对话事件
+    STREAM_ROUTES = {
+        ("POST", "/chat/stream"): "_stream_chat",
+        ("POST", "/route/stream"): "_stream_route",
+        ("POST", "/group_chat/stream"): "_stream_group_chat",
+        ("POST", "/fanout/stream"): "_stream_fanout",
+    }
+    
+    def __init__(self, manager=None, server_config: Dict[str, Any] = None):
+        """初始化服务应用"""
+        self.manager = manager or agent_manager
+        self.server_config = server_config or config.get_server_config()
+        # 请求可指定更短的对话超时，不能超过配置的对话超时
+        self.max_timeout = config.get_chat_config()["timeout"]
+        self.admission = AdmissionController(
+            self.server_config["max_concurrency"],
+            self.server_config["max_queue"]
+        )
+    
+    async def __call__(self, scope, receive, send):
+        """ASGI入口"""
+        if scope["type"] == "lifespan":
+            await self._handle_lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._handle_http(scope, receive, send)
+    
+    async def _handle_lifespan(self, receive, send):
+        """处理启动和优雅关闭事件"""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # 长驻服务在启动时预热Agent，避免首个请求承担导入autogen的开销
+                await asyncio.to_thread(self.manager.preload)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                # 停止接收新请求，等待处理中的对话完成后释放资源
+                self.admission.draining = True
+                await self.admission.wait_idle(self.server_config["shutdown_timeout"])
+                await asyncio.to_thread(self.manager.shutdown)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    
+    async def _handle_http(self, scope, receive, send):
+        """处理HTTP请求"""
+        method, path = scope["method"], scope["path"]
+        if method == "GET" and path == "/health":
+            await self._send_json(send, 200, {
+                "status": "ok",
+                "admission": self.admission.get_stats(),
+                "routing": self.manager.get_routing_stats(),
+                "llm_cache": self.manager.get_llm_cache_stats(),
+                "llm_endpoints": self.manager.get_llm_endpoint_stats(),
+                "llm_metrics": self.manager.get_llm_metrics(),
+                "ip_geo": self.manager.get_ip_geo_stats(),
+                "tracing": self.manager.get_tracing_stats(),
+                "latency": self.manager.get_latency_histograms()
+            })
+            return
+        
+        stream_handler_name = self.STREAM_ROUTES.get((method, path))
+        handler_name = self.ROUTES.get((method, path)) or stream_handler_name
+        if handler_name is None:
+            await self._send_json(send, 404, {"error": f"未知接口: {method} {path}"})
+            return
+        
+        try:
+            body = await self._read_json(receive)
+        except RequestError as e:
+            await self._send_json(send, e.status, {"error": e.message})
+            return
+        
+        if not self.admission.admit():
+            status = 503 if self.admission.draining else 429
+            await self._send_json(send, status, {"error": "服务繁忙，请稍后重试"}, {"retry-after": "1"})
+            return
+        
+        if stream_handler_name:
+            await self._handle_stream(stream_handler_name, body, receive, send)
+            return
+        
+        try:
+            async with self.admission:
+                result = await getattr(self, handler_name)(body)
+        except asyncio.CancelledError:
+            raise
+        except RequestError as e:
+            await self._send_json(send, e.status, {"error": e.message})
+            return
+        except Exception as e:
+            await self._send_json(send, 500, {"error": f"服务内部错误: {str(e)}"})
+            return
+        await self._send_json(send, 200, result.to_dict())
+    
+    async def _read_json(self, receive) -> Dict[str, Any]:
+        """读取并解析JSON请求体"""
+        chunks = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise RequestError(400, "客户端已断开连接")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.server_config["max_body_bytes"]:
+                raise RequestError(413, "请求体过大")
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+        
+        try:
+            body = json.loads(b"".join(chunks) or b"{}")
+        except ValueError:
+            raise RequestError(400, "请求体不是合法的JSON")
+        if not isinstance(body, dict):
+            raise RequestError(400, "请求体必须是JSON对象")
+        return body
+    
+    @staticmethod
+    def _require_message(body: Dict[str, Any]) -> str:
+        """读取必填的message字段"""
+        message = body.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise RequestError(400, "缺少message字段")
+        return message
+    
+    def _read_timeout(self, body: Dict[str, Any]) -> Optional[float]:
+        """读取可选的timeout字段（秒），必须是正数，超过配置的对话超时时按配置值截断"""
+        timeout = body.get("timeout")
+        if timeout is None:
+            return None
+        if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or not 0 < timeout < math.inf:
+            raise RequestError(400, "timeout必须是正数（秒）")
+        return min(float(timeout), self.max_timeout)
+    
+    async def _handle_chat(self, body: Dict[str, Any]):
+        """单Agent对话"""
+        message = self._require_message(body)
+        agent_type = body.get("agent_type")
+        if not agent_type:
+            raise RequestError(400, "缺少agent_type字段")
+        try:
+            return await self.manager.achat_with_agent(agent_type, message, self._read_timeout(body))
+        except ValueError as e:
+            raise RequestError(404, str(e))
+    
+    async def _handle_route(self, body: Dict[str, Any]):
+        """智能路由对话"""
+        return await self.manager.aroute_chat(self._require_message(body), self._read_timeout(body))
+    
+    async def _handle_group_chat(self, body: Dict[str, Any]):
+        """群组聊天"""
+        return await self.manager.arun_group_chat(self._require_message(body), self._read_timeout(body))
+    
+    async def _handle_fanout(self, body: Dict[str, Any]):
+        """规划并发对话"""
+        return await self.manager.afanout_chat(self._require_message(body), self._read_timeout(body))
+    
+    async def _handle_stream(self, handler_name: str, body: Dict[str, Any], receive, send):
+        """以server-sent events逐个发送对话事件，客户端断开时取消对话"""
+        async with self.admission:
+            try:
+                events = getattr(self, handler_name)(body)
+            except RequestError as e:
+                await self._send_json(send, e.status, {"error": e.message})
+                return
+            
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream; charset=utf-8"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ]
+            })
+            disconnected = asyncio.create_task(self._wait_disconnect(receive))
+            try:
+                async for event in events:
+                    if disconnected.done():
+                        break
+                    await send({"type": "http.response.body", "body": event.to_sse(), "more_body": True})
+            finally:
+                await events.aclose()
+                disconnected.cancel()
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+    
+    @staticmethod
+    async def _wait_disconnect(receive):
+        """等待客户端断开连接"""
+        while (await receive())["type"] != "http.disconnect":
+            pass
+    
+    def _stream_chat(self, body: Dict[str, Any]):
+        """流式单Agent对话"""
+        message = self._require_message(body)
+        agent_type = body.get("agent_type")
+        if not agent_type:
+            raise RequestError(400, "缺少agent_type字段")
+        try:
+            return self.manager.astream_chat(agent_type, message, self._read_timeout(body))
+        except ValueError as e:
+            raise RequestError(404, str(e))
+    
+    def _stream_route(self, body: Dict[str, Any]):
+        """流式智能路由对话"""
+        return self.manager.astream_route_chat(self._require_message(body), self._read_timeout(body))
+    
+    def _stream_group_chat(self, body: Dict[str, Any]):
+        """流式群组聊天"""
+        return self.manager.astream_group_chat(self._require_message(body), self._read_timeout(body))
+    
+    def _stream_fanout(self, body: Dict[str, Any]):
+        """流式规划并发对话"""
+        return self.manager.astream_fanout_chat(self._require_message(body), self._read_timeout(body))
+    
+    @staticmethod
+    async def _send_json(send, status: int, payload: Dict[str, Any], headers: Dict[str, str] = None):
+        """发送JSON响应"""
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        raw_headers = [
+            (b"content-type", b"application/json; charset=utf-8"),
+            (b"content-length", str(len(data)).encode()),
+        ]
+        for name, value in (headers or {}).items():
+            raw_headers.append((name.encode(), value.encode()))
+        await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+        await send({"type": "http.response.body", "body": data})
+
+
+# 全局ASGI应用实例，可直接交给uvicorn等ASGI服务器运行
+app = AgentServerApp()
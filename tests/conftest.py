@@ -0,0 +1,68 @@
+"""
+测试公共配置
+在导入任何业务模块前启动本地桩服务并把上游地址指向它们（配置在首次导入时读取）
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_servers import DomainAPIStub, IPAPIStub, MockLLMStub, WeatherAPIStub
+
+_work_dir = tempfile.mkdtemp(prefix="agents-tests-")
+
+llm_stub = MockLLMStub().start()
+weather_stub = WeatherAPIStub().start()
+ip_stub = IPAPIStub().start()
+domain_stub = DomainAPIStub().start()
+
+os.environ.update({
+    "LLM_BASE_URL": f"{llm_stub.base_url}/v1",
+    "WEATHER_API_BASE_URL": f"{weather_stub.base_url}/data/2.5/weather",
+    "IP_API_BASE_URL": ip_stub.base_url,
+    "DOMAIN_API_BASE_URL": f"{domain_stub.base_url}/V1/Dns",
+    "LLM_CACHE_ENABLED": "false",
+    "LLM_CACHE_PATH": os.path.join(_work_dir, "llm_cache.sqlite"),
+    "TRACING_EXPORTER": "none",
+})
+
+from common.config import config
+
+# 关闭AutoGen的磁盘缓存，保证每次LLM调用都到达桩服务
+config.llm_config["cache_seed"] = None
+
+
+def pytest_sessionfinish(session, exitstatus):
+    for stub in (llm_stub, weather_stub, ip_stub, domain_stub):
+        stub.stop()
+
+
+@pytest.fixture
+def domain_api() -> DomainAPIStub:
+    """域名API桩服务，用例结束后恢复默认行为"""
+    yield domain_stub
+    domain_stub.throttle_every = 0
+    domain_stub.fail_domains = set()
+
+
+@pytest.fixture
+def ip_api() -> IPAPIStub:
+    """IP归属地API桩服务"""
+    return ip_stub
+
+
+@pytest.fixture
+def weather_api() -> WeatherAPIStub:
+    """天气API桩服务，用例结束后恢复默认行为"""
+    yield weather_stub
+    weather_stub.fail_cities = set()
+
+
+@pytest.fixture
+def llm_api() -> MockLLMStub:
+    """LLM桩服务，用例结束后恢复默认行为"""
+    yield llm_stub
+    llm_stub.fail_status = 0
@@ -0,0 +1,121 @@
+"""AgentManager的同步入口和非交互式对话"""
+import asyncio
+import warnings
+
+import pytest
+
+from common.agent_manager import agent_manager
+from common.config import config
+
+
+def test_route_chat_fast_path_inside_running_loop(capsys, domain_api):
+    async def main():
+        agent_manager.route_chat("查询 loop.example.com 的域名信息")
+    
+    asyncio.run(main())
+    
+    assert "loop.example.com" in capsys.readouterr().out
+
+
+def test_route_chat_fast_path_does_not_deadlock_when_runner_is_full(monkeypatch, capsys, domain_api):
+    from common.async_runner import async_runner
+    
+    # 只有一个并发名额时，外层快速路径若占用名额，内层工具调用会一直等待到超时
+    async_runner.run(asyncio.sleep(0))
+    monkeypatch.setattr(async_runner, "_semaphore", asyncio.Semaphore(1))
+    monkeypatch.setitem(config.chat_config, "timeout", 5)
+    
+    agent_manager.route_chat("查询 full.example.com 的域名信息")
+    
+    out = capsys.readouterr().out
+    assert "full.example.com" in out and "超时" not in out
+
+
+def test_start_group_chat_uses_configured_max_round(monkeypatch):
+    import autogen
+    
+    captured = {}
+    
+    class Stop(Exception):
+        pass
+    
+    def fake_group_chat(**kwargs):
+        captured.update(kwargs)
+        raise Stop
+    
+    monkeypatch.setitem(config.chat_config, "group_max_round", 3)
+    monkeypatch.setattr(autogen, "GroupChat", fake_group_chat)
+    with pytest.raises(Stop):
+        agent_manager.start_group_chat("北京天气怎么样")
+    
+    assert captured["max_round"] == 3
+
+
+def test_interactive_group_chat_does_not_compact_shared_agents(monkeypatch):
+    import autogen
+    
+    captured = {}
+    
+    class Stop(Exception):
+        pass
+    
+    def fake_group_chat(**kwargs):
+        captured.update(kwargs)
+        raise Stop
+    
+    monkeypatch.setitem(config.compaction_config, "enabled", True)
+    monkeypatch.setattr(autogen, "GroupChat", fake_group_chat)
+    with pytest.raises(Stop):
+        agent_manager.start_group_chat("北京天气怎么样")
+    
+    shared = agent_manager.get_agent("weather")
+    participant = next(agent for agent in captured["agents"] if agent.name == shared.name)
+    assert participant is not shared
+    assert participant.hook_lists["process_all_messages_before_reply"]
+    assert not shared.hook_lists["process_all_messages_before_reply"]
+
+
+def test_achat_with_agent_runs_tool_and_returns_answer(llm_api, weather_api):
+    result = asyncio.run(agent_manager.achat_with_agent("weather", "上海天气怎么样"))
+    
+    assert result.succeeded, result.error
+    assert result.mode == "chat" and result.agent_type == "weather"
+    assert result.final_answer.startswith("mock answer")
+    assert any(message.get("function_call") for message in result.transcript)
+    assert result.to_dict()["conversation_id"] == result.conversation_id
+
+
+def test_conversation_agents_do_not_warn_about_overridden_functions():
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        agent = agent_manager._create_conversation_agent("weather")
+    
+    assert not [warning for warning in caught if "is being overridden" in str(warning.message)]
+    assert all(asyncio.iscoroutinefunction(function) for function in agent.function_map.values())
+
+
+def test_concurrent_chats_are_isolated(llm_api, weather_api):
+    async def run():
+        return await asyncio.gather(*(
+            agent_manager.achat_with_agent("weather", f"{city}天气怎么样") for city in ("北京", "广州", "成都")
+        ))
+    
+    results = asyncio.run(run())
+    
+    assert all(result.succeeded for result in results)
+    for result, city in zip(results, ("北京", "广州", "成都")):
+        assert result.transcript[0]["content"].startswith(city)
+    assert len({result.conversation_id for result in results}) == 3
+
+
+def test_chat_timeout_and_unknown_agent(llm_api):
+    llm_api.latency = 0.5
+    try:
+        result = asyncio.run(agent_manager.achat_with_agent("weather", "北京天气怎么样", timeout=0.1))
+    finally:
+        llm_api.latency = 0
+    
+    assert not result.succeeded
+    assert "超时" in result.error
+    with pytest.raises(ValueError):
+        asyncio.run(agent_manager.achat_with_agent("nope", "你好"))
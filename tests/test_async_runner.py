@@ -0,0 +1,108 @@
+"""后台事件循环运行器：同步调用、超时、并发限制和上下文传递"""
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+
+from common.async_runner import AsyncRunner
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+@pytest.fixture
+def runner():
+    runner = AsyncRunner({"max_concurrency": 2, "default_timeout": 5})
+    yield runner
+    runner.shutdown()
+
+
+def test_run_returns_result_on_background_thread(runner):
+    async def work():
+        await asyncio.sleep(0.01)
+        return threading.current_thread().name
+    
+    assert runner.run(work()) == "async-runner"
+
+
+def test_run_inside_running_loop(runner):
+    async def work():
+        return 42
+    
+    async def main():
+        return runner.run(work())
+    
+    assert asyncio.run(main()) == 42
+
+
+def test_timeout(runner):
+    with pytest.raises(asyncio.TimeoutError):
+        runner.run(asyncio.sleep(1), timeout=0.05)
+
+
+def test_concurrency_is_limited(runner):
+    running, peak = 0, 0
+    
+    async def work():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+    
+    futures = [runner.submit(work()) for _ in range(6)]
+    for future in futures:
+        future.result()
+    
+    assert peak == 2
+
+
+def test_unlimited_submissions_bypass_the_limit(runner):
+    release = threading.Event()
+    
+    async def blocked():
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+    
+    async def quick():
+        return "done"
+    
+    blockers = [runner.submit(blocked()) for _ in range(2)]
+    start = time.monotonic()
+    assert runner.submit(quick(), limited=False).result(timeout=1) == "done"
+    assert time.monotonic() - start < 0.5
+    release.set()
+    for future in blockers:
+        future.result()
+
+
+def test_context_variables_are_propagated(runner):
+    async def read():
+        return request_id.get()
+    
+    token = request_id.set("abc")
+    try:
+        assert runner.run(read()) == "abc"
+    finally:
+        request_id.reset(token)
+
+
+def test_iterate(runner):
+    async def numbers():
+        for i in range(3):
+            await asyncio.sleep(0)
+            yield i
+    
+    assert list(runner.iterate(numbers())) == [0, 1, 2]
+
+
+def test_run_on_runner_thread_is_rejected(runner):
+    async def nested():
+        async def inner():
+            return 1
+        
+        runner.run(inner())
+    
+    with pytest.raises(RuntimeError):
+        runner.run(nested())
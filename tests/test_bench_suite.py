@@ -0,0 +1,49 @@
+"""端到端基准测试套件：查询构造、单个并发度的统计和结果对比"""
+import asyncio
+
+from benchmarks.bench_suite import ROUTE_QUERIES, build_query, compare_results, percentile, run_level
+from common.agent_manager import agent_manager
+
+
+def level(concurrency, throughput, p95, calls=2.0):
+    return {"concurrency": concurrency, "throughput_per_s": throughput, "latency_s": {"p95": p95},
+            "llm_calls_per_request": calls}
+
+
+def test_build_query_rotates_cities_and_ips():
+    assert build_query("chat", 0) == "北京天气怎么样"
+    assert build_query("chat", 9) == "上海天气怎么样"
+    assert build_query("route", 0) == "8.8.0.0"
+    assert build_query("route", len(ROUTE_QUERIES) * 65) == "8.8.1.4"
+    assert build_query("group", 1) == "请查询上海的天气和8.8.0.1的归属地"
+
+
+def test_percentile():
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile([1, 2, 3, 4], 99) == 4
+
+
+def test_compare_results():
+    baseline = {"scenarios": {"chat": [level(1, 10.0, 0.2), level(4, 0, 0)]}}
+    current = {"scenarios": {"chat": [level(1, 12.0, 0.1, 1.5), level(4, 5.0, 0.3), level(16, 9.0, 0.5)],
+                             "route": [level(1, 1.0, 1.0)]}}
+    
+    comparison = compare_results(baseline, current)
+    
+    assert list(comparison) == ["chat"]
+    first, second = comparison["chat"]
+    assert first["throughput_change_pct"] == 20.0 and first["p95_change_pct"] == -50.0
+    assert first["llm_calls_per_request"] == [2.0, 1.5]
+    assert second["throughput_change_pct"] is None and second["p95_change_pct"] is None
+
+
+def test_run_level_on_stub_servers(llm_api, weather_api, ip_api, domain_api):
+    stubs = [weather_api, ip_api, domain_api]
+    
+    result = asyncio.run(run_level(agent_manager, "chat", 2, 4, llm_api, stubs))
+    
+    assert result["requests"] == 4 and result["errors"] == 0
+    assert result["llm_calls_by_kind"]["function_call"] == 4
+    assert result["llm_calls_per_request"] >= 2
+    assert result["api_requests"] == 4
+    assert result["latency_s"]["p50"] <= result["latency_s"]["max"]
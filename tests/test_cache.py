@@ -0,0 +1,83 @@
+"""TTL + LRU缓存和工具注册表的结果缓存"""
+import time
+
+from agents.domain_agent.domain_tools import normalize_domains_args
+from agents.ip_agent.ip_tools import normalize_ip_args
+from agents.weather_agent.weather_tools import normalize_weather_args
+from common.cache import MISSING, TTLCache
+from mcp.tools_registry import ToolsRegistry
+
+SCHEMA = {"name": "lookup", "parameters": {"type": "object", "properties": {}}}
+
+
+def test_lru_eviction():
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_ttl_expiration():
+    cache = TTLCache(ttl=0.05)
+    cache.set("a", None)
+    cache.set("b", 2, ttl=10)
+    assert cache.get("a") is None
+    
+    time.sleep(0.06)
+    
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 2
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (2, 1, 1)
+
+
+def test_argument_normalization():
+    assert normalize_weather_args("  New   York ") == normalize_weather_args("new york")
+    assert normalize_ip_args("2001:DB8:0:0::1") == "2001:db8::1"
+    assert normalize_domains_args("Example.COM., foo.org") == ("example.com", "foo.org")
+
+
+def test_registry_caches_results_by_normalized_arguments():
+    calls = []
+    
+    def lookup(city: str) -> str:
+        calls.append(city)
+        return f"结果: {city}"
+    
+    registry = ToolsRegistry()
+    registry.register_tool("lookup", lookup, SCHEMA, cache_ttl=60, cache_key=normalize_weather_args)
+    tool = registry.get_tool_function("lookup")
+    
+    assert tool("Beijing") == "结果: Beijing"
+    assert tool(" beijing ") == "结果: Beijing"
+    assert calls == ["Beijing"]
+    assert registry.get_cache_stats()["lookup"]["hits"] == 1
+    
+    # 名称不存在时不影响其他工具的缓存
+    registry.clear_cache("lookpu")
+    tool("Beijing")
+    assert len(calls) == 1
+    
+    registry.clear_cache("lookup")
+    tool("Beijing")
+    assert len(calls) == 2
+
+
+def test_registry_does_not_cache_errors():
+    results = iter(["查询失败: 上游错误", "结果: ok"])
+    
+    def lookup(city: str) -> str:
+        return next(results)
+    
+    registry = ToolsRegistry()
+    registry.register_tool("lookup", lookup, SCHEMA, cache_ttl=60, error_prefixes=("查询失败",))
+    tool = registry.get_tool_function("lookup")
+    
+    assert tool("Beijing").startswith("查询失败")
+    assert tool("Beijing") == "结果: ok"
+    assert tool("Beijing") == "结果: ok"
@@ -0,0 +1,104 @@
+"""域名文件批量处理：检查点续跑、输入文件变化检测、文件路径限制和覆盖保护"""
+import asyncio
+import json
+import os
+
+import pytest
+
+from agents.domain_agent import domain_bulk
+from common.config import config
+
+
+@pytest.fixture
+def bulk_dir(tmp_path, monkeypatch):
+    monkeypatch.setitem(config.domain_config, "bulk_dir", str(tmp_path))
+    monkeypatch.setitem(config.domain_config, "bulk_window", 2)
+    monkeypatch.setitem(config.domain_config, "info_chunk_size", 1)
+    return tmp_path
+
+
+def write_domains(directory, count, name="domains.txt"):
+    path = directory / name
+    path.write_text("# 注释\n" + "\n".join(f"d{i}.example.com" for i in range(count)) + "\nD0.example.com.\n",
+                    encoding="utf-8")
+    return path
+
+
+def read_rows(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_process_file(bulk_dir, domain_api):
+    path = write_domains(bulk_dir, 5)
+    
+    summary = asyncio.run(domain_bulk.process_domains_file(str(path), "info"))
+    
+    output = bulk_dir / "domains.txt.info.jsonl"
+    assert summary["total"] == 5 and summary["succeeded"] == 5
+    assert [row["domain"] for row in read_rows(output)] == [f"d{i}.example.com" for i in range(5)]
+    assert not os.path.exists(str(output) + domain_bulk.CHECKPOINT_SUFFIX)
+
+
+def interrupted_run(path, fail_after):
+    """处理fail_after个批次后中断，留下检查点"""
+    def progress(state):
+        if state["processed"] >= fail_after:
+            raise KeyboardInterrupt
+    
+    with pytest.raises(KeyboardInterrupt):
+        asyncio.run(domain_bulk.process_domains_file(str(path), "info", progress=progress))
+
+
+def test_resume_from_checkpoint(bulk_dir, domain_api):
+    path = write_domains(bulk_dir, 6)
+    interrupted_run(path, 2)
+    before = domain_api.request_count
+    
+    summary = asyncio.run(domain_bulk.process_domains_file(str(path), "info"))
+    
+    assert summary["skipped"] == 2 and summary["processed"] == 6
+    assert domain_api.request_count - before == 4
+    assert len(read_rows(bulk_dir / "domains.txt.info.jsonl")) == 6
+
+
+def test_modified_input_restarts(bulk_dir, domain_api):
+    path = write_domains(bulk_dir, 6)
+    interrupted_run(path, 2)
+    write_domains(bulk_dir, 7)
+    
+    summary = asyncio.run(domain_bulk.process_domains_file(str(path), "info"))
+    
+    assert summary["skipped"] == 0
+    assert len(read_rows(bulk_dir / "domains.txt.info.jsonl")) == 7
+
+
+def test_tool_paths_are_limited_to_bulk_dir(bulk_dir, tmp_path_factory, domain_api):
+    outside = tmp_path_factory.mktemp("outside")
+    write_domains(outside, 2)
+    write_domains(bulk_dir, 2)
+    
+    assert "必须位于目录" in domain_bulk.bulk_process_domains_file_sync(str(outside / "domains.txt"))
+    assert "必须位于目录" in domain_bulk.bulk_process_domains_file_sync("../outside/domains.txt")
+    assert "必须位于目录" in domain_bulk.bulk_process_domains_file_sync("domains.txt", output=str(outside / "x.jsonl"))
+    
+    result = domain_bulk.bulk_process_domains_file_sync("domains.txt", output="out/result.csv")
+    assert result.startswith("域名批量处理完成")
+    assert (bulk_dir / "out" / "result.csv").read_text(encoding="utf-8").startswith("domain,status")
+
+
+def test_refuses_to_overwrite_other_files(bulk_dir, domain_api):
+    write_domains(bulk_dir, 2)
+    notes = bulk_dir / "notes.txt"
+    notes.write_text("important\n", encoding="utf-8")
+    
+    for output in ("notes.txt", "domains.txt"):
+        result = domain_bulk.bulk_process_domains_file_sync("domains.txt", output=output)
+        assert result.startswith("错误")
+    (bulk_dir / "r.jsonl.checkpoint").write_text("important\n", encoding="utf-8")
+    assert domain_bulk.bulk_process_domains_file_sync("domains.txt", output="r.jsonl").startswith("错误")
+    
+    assert notes.read_text(encoding="utf-8") == "important\n"
+    assert (bulk_dir / "r.jsonl.checkpoint").read_text(encoding="utf-8") == "important\n"
+    # 本工具之前的结果文件可以覆盖
+    assert domain_bulk.bulk_process_domains_file_sync("domains.txt").startswith("域名批量处理完成")
+    assert domain_bulk.bulk_process_domains_file_sync("domains.txt", resume=False).startswith("域名批量处理完成")
@@ -0,0 +1,65 @@
+"""域名信息批量查询：按域名缓存、分块查询和部分失败"""
+import pytest
+
+from agents.domain_agent import domain_tools
+from common.config import config
+from mcp.tools_registry import ToolsRegistry
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    """每块只查一个域名，便于让单个分块失败"""
+    monkeypatch.setitem(config.domain_config, "info_chunk_size", 1)
+    domain_tools._domain_info_cache.clear()
+    yield
+    domain_tools._domain_info_cache.clear()
+
+
+def test_only_missing_domains_are_fetched(domain_api):
+    domain_tools.batch_get_domains_info_sync("a.example.com")
+    before = domain_api.request_count
+    
+    result = domain_tools.batch_get_domains_info_sync("A.example.com., b.example.com")
+    
+    assert result.startswith("域名基础信息查询结果 (共 2 个域名)")
+    assert domain_api.request_count - before == 1
+
+
+def test_partial_failure_is_marked_and_not_cached(domain_api):
+    domain_api.fail_domains = {"bad.example.com"}
+    registry = ToolsRegistry()
+    tool = registry.get_tool_function("domain_info", output_format="text")
+    
+    result = tool("good.example.com,bad.example.com")
+    
+    assert result.startswith(domain_tools.DOMAIN_INFO_PARTIAL_PREFIX)
+    assert "good.example.com" in result
+    assert registry.get_cache_stats()["domain_info"]["size"] == 0
+    
+    # 上游恢复后再次调用只补查失败的域名，成功的域名来自按域名缓存
+    domain_api.fail_domains = set()
+    before = domain_api.request_count
+    result = tool("good.example.com,bad.example.com")
+    
+    assert result.startswith("域名基础信息查询结果 (共 2 个域名)")
+    assert domain_api.request_count - before == 1
+
+
+def test_all_chunks_failed_returns_error(domain_api):
+    domain_api.fail_domains = {"bad.example.com"}
+    
+    result = domain_tools.batch_get_domains_info_sync("bad.example.com")
+    
+    assert result.startswith(domain_tools.DOMAIN_INFO_ERROR_PREFIXES)
+
+
+def test_requests_use_configured_http_timeout(monkeypatch, domain_api):
+    monkeypatch.setitem(config.http_config, "timeout", 0.05)
+    domain_api.latency = 0.3
+    try:
+        result = domain_tools.batch_get_domains_info_sync("slow.example.com")
+    finally:
+        domain_api.latency = 0
+    
+    assert result.startswith(domain_tools.DOMAIN_INFO_ERROR_PREFIXES)
+    assert domain_tools._domain_info_cache.get("slow.example.com") is domain_tools.MISSING
@@ -0,0 +1,84 @@
+"""群组聊天历史压缩：token估算、无关函数调用过滤、结果截断和预算控制"""
+from common.history_compaction import (HistoryCompactor, count_message_tokens, estimate_tokens,
+                                       merge_compaction_stats)
+
+POLICY = {"max_tokens": 10000, "keep_recent": 2, "tool_output_max_chars": 20, "relevant_only": True}
+
+
+def call(agent, function):
+    return {"role": "assistant", "name": agent, "content": None,
+            "function_call": {"name": function, "arguments": "{}"}}
+
+
+def result(function, content):
+    return {"role": "function", "name": function, "content": content}
+
+
+def make_history():
+    return [
+        {"role": "user", "content": "查询北京天气和8.8.8.8的归属地"},
+        call("ip_agent", "ip_location"),
+        result("ip_location", "8.8.8.8 位于 美国" * 10),
+        call("weather_agent", "get_weather"),
+        result("get_weather", "北京 晴 25度" * 10),
+        {"role": "assistant", "name": "ip_agent", "content": "8.8.8.8 位于美国"},
+        {"role": "user", "content": "继续"},
+        {"role": "assistant", "name": "weather_agent", "content": "北京晴"},
+    ]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("北京天气") == 4
+    assert estimate_tokens("abcdefgh") == 2
+    assert count_message_tokens([{"content": "abcd"}, {"content": None}]) == 4 + 1 + 4
+
+
+def test_irrelevant_calls_are_dropped_and_results_truncated():
+    compactor = HistoryCompactor("weather_agent", ["get_weather"], POLICY)
+    messages = make_history()
+    
+    compacted = compactor.apply_transform(messages)
+    
+    # 首条和最近2条原样保留，ip_agent的调用及结果被丢弃，文本回答保留
+    assert compacted[0] is messages[0] and compacted[-2:] == messages[-2:]
+    assert [m.get("name") for m in compacted[1:-2]] == ["weather_agent", "get_weather", "ip_agent"]
+    assert compacted[2]["content"].startswith("北京 晴 25度") and "已截断" in compacted[2]["content"]
+    assert messages[4]["content"] == "北京 晴 25度" * 10
+    
+    stats = compactor.get_stats()
+    assert (stats["applied"], stats["dropped"], stats["truncated"]) == (1, 2, 1)
+    assert stats["tokens_saved"] == count_message_tokens(messages) - count_message_tokens(compacted) > 0
+
+
+def test_budget_drops_oldest_messages_first():
+    compactor = HistoryCompactor("weather_agent", ["get_weather"], {**POLICY, "max_tokens": 40, "relevant_only": False})
+    messages = make_history()
+    
+    compacted = compactor.apply_transform(messages)
+    
+    # 首条和最近2条约29个token，预算内只能再保留最近的一条较早消息
+    assert compacted == [messages[0], messages[5]] + messages[-2:]
+    assert count_message_tokens(compacted) <= 40
+    assert compactor.get_stats()["dropped"] == 4
+
+
+def test_short_history_is_untouched():
+    compactor = HistoryCompactor("weather_agent", ["get_weather"], POLICY)
+    messages = make_history()[:3]
+    
+    assert compactor.apply_transform(messages) == messages
+    assert compactor.get_logs(messages, messages)[1] is False
+
+
+def test_merge_compaction_stats():
+    weather = HistoryCompactor("weather_agent", ["get_weather"], POLICY)
+    ip = HistoryCompactor("ip_agent", ["ip_location"], POLICY)
+    weather.apply_transform(make_history())
+    ip.apply_transform(make_history())
+    
+    stats = merge_compaction_stats([weather, ip])
+    
+    assert set(stats) == {"weather_agent", "ip_agent", "total"}
+    assert stats["total"]["applied"] == 2
+    assert stats["total"]["dropped"] == stats["weather_agent"]["dropped"] + stats["ip_agent"]["dropped"]
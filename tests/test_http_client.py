@@ -0,0 +1,45 @@
+"""共享HTTP连接池：按事件循环和主机复用客户端"""
+import asyncio
+
+from common.config import config
+from common.http_client import HTTPClientPool
+
+WEATHER_URL = "http://weather.test"
+IP_URL = "http://ip.test"
+
+
+def test_clients_are_shared_per_host_and_loop():
+    pool = HTTPClientPool(config.get_http_config())
+    
+    async def get_clients():
+        first = pool.get_client(f"{WEATHER_URL}/data/2.5/weather?q=a")
+        second = pool.get_client(f"{WEATHER_URL}/other")
+        other_host = pool.get_client(f"{IP_URL}/8.8.8.8/json/")
+        await pool.aclose()
+        return first, second, other_host
+    
+    first, second, other_host = asyncio.run(get_clients())
+    
+    assert first is second
+    assert first is not other_host
+    assert first.is_closed
+    assert pool.get_stats()["event_loops"] == 0
+    # 另一个事件循环使用新的客户端
+    assert asyncio.run(get_clients())[0] is not first
+
+
+def test_close_from_outside_the_loop():
+    pool = HTTPClientPool(config.get_http_config())
+    loop = asyncio.new_event_loop()
+    
+    async def get_client():
+        return pool.get_client(WEATHER_URL)
+    
+    client = loop.run_until_complete(get_client())
+    assert pool.get_stats()["hosts"] == [WEATHER_URL]
+    
+    pool.close()
+    
+    assert client.is_closed
+    assert pool.get_stats()["event_loops"] == 0
+    loop.close()
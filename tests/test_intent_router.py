@@ -0,0 +1,105 @@
+"""本地规则路由和工具快速路径"""
+import re
+
+import pytest
+
+from common.intent_router import IntentRouter, extract_domains, extract_files, extract_ips
+from mcp.tools_registry import tools_registry
+
+
+@pytest.fixture
+def router():
+    return IntentRouter({"enabled": True, "confidence_threshold": 0.5})
+
+
+def plan(router, message):
+    decision = router.classify(message)
+    if not decision.is_local:
+        return []
+    return tools_registry.plan_fast_path(decision.agent_type, decision.entities, message)
+
+
+def test_extract_entities():
+    assert extract_ips("8.8.8.8 和 2001:db8::1 以及 999.1.1.1") == ["8.8.8.8", "2001:db8::1"]
+    assert extract_domains("Example.COM、foo.org 和 user@mail.com") == ["example.com", "foo.org"]
+
+
+@pytest.mark.parametrize("message, agent_type", [
+    ("北京天气怎么样", "weather"),
+    ("查询8.8.8.8的归属地", "ip"),
+    ("example.com 的域名信息", "domain"),
+    ("你好", None),
+    ("北京天气和8.8.8.8的归属地", None),
+])
+def test_classify(router, message, agent_type):
+    assert router.classify(message).agent_type == agent_type
+
+
+def test_fast_path_single_tool(router):
+    assert plan(router, "查询8.8.8.8的归属地") == [("ip_location", {"ip": "8.8.8.8"})]
+    assert plan(router, "检测 a.com, b.com 是否可申请") == [("domain_status", {"domains": "a.com,b.com"})]
+
+
+def test_fast_path_needs_unique_tool(router):
+    # 同时命中域名信息和状态检测的关键词，交给Agent选择
+    assert plan(router, "example.com 的注册信息和状态") == []
+
+
+@pytest.mark.parametrize("message", [
+    "检查 domains.txt 中的域名状态",
+    "请批量处理文件 /data/domains.txt 检测状态",
+    "请批量处理文件/data/domains.txt检测状态",
+    "检测 ./lists/new 里的域名和 example.com 的状态",
+])
+def test_file_names_are_not_domains(router, message):
+    assert "domains.txt" not in extract_domains(message)
+    assert extract_files(message)
+    assert router.classify(message).agent_type == "domain"
+    assert plan(router, message) == []
+
+
+@pytest.mark.parametrize("message", [
+    "检查 main.py 和 README.md 以及 run.sh",
+    "看看 app.js、index.html 和 pyproject.toml",
+    "检查 config.yaml 和 release.zip",
+])
+def test_code_and_config_files_are_not_domains(router, message):
+    assert extract_domains(message) == []
+    assert len(extract_files(message)) == len(re.findall(r"\w+\.\w+", message))
+    assert router.classify(message).agent_type is None
+    assert plan(router, message) == []
+
+
+def test_route_file_name_is_not_sent_to_domain_agent(router):
+    decision = router.route("检查 main.py")
+    
+    assert not decision.is_local
+    assert decision.entities["domains"] == [] and decision.entities["files"] == ["main.py"]
+    assert extract_domains("检查 example.com 和 main.py") == ["example.com"]
+
+
+def test_urls_are_not_files():
+    assert extract_files("检查 https://example.com/a/b 的状态") == []
+    assert extract_domains("检查 https://example.com/a/b 的状态") == ["example.com"]
+
+
+def test_route_updates_stats(router):
+    router.route("北京天气怎么样")
+    router.route("查询8.8.8.8的归属地")
+    router.route("你好")
+    router.route("北京天气和8.8.8.8的归属地")
+    
+    stats = router.get_stats()
+    assert (stats["total"], stats["local"], stats["llm_fallback"]) == (4, 2, 2)
+    assert (stats["no_match"], stats["ambiguous"]) == (1, 1)
+    assert stats["by_agent"] == {"weather": 1, "ip": 1}
+    assert stats["local_ratio"] == 0.5
+
+
+def test_disabled_router_falls_back_to_llm():
+    router = IntentRouter({"enabled": False, "confidence_threshold": 0.5})
+    
+    decision = router.route("北京天气怎么样")
+    
+    assert not decision.is_local and decision.reason == "disabled"
+    assert router.get_stats()["disabled"] == 1
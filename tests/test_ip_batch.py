@@ -0,0 +1,58 @@
+"""IP批量归属地查询：IP列表和日志解析、日志目录限制和超时"""
+import asyncio
+
+import pytest
+
+from agents.ip_agent import ip_batch
+from common.config import config
+
+
+@pytest.fixture
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.setitem(config.ip_batch_config, "input_dir", str(tmp_path))
+    return tmp_path
+
+
+def test_parse_ip_targets():
+    counts, invalid, truncated = ip_batch.parse_ip_targets("8.8.8.8, 8.8.8.8;10.0.0.0/30 bad 2001:DB8::1", 100)
+    assert counts == {"8.8.8.8": 2, "10.0.0.0": 1, "10.0.0.1": 1, "10.0.0.2": 1, "10.0.0.3": 1, "2001:db8::1": 1}
+    assert invalid == ["bad"]
+    assert not truncated
+    assert ip_batch.parse_ip_targets("10.0.0.0/24", 10)[2]
+
+
+def test_extract_log_ips():
+    line = '192.168.1.8 - - [10/Oct/2024:13:55:36 +0800] "GET / HTTP/1.1" 200 from ::ffff:1.2.3.4 via 2001:db8::2'
+    assert ip_batch._extract_log_ips(line) == ["192.168.1.8", "1.2.3.4", "2001:db8::2"]
+
+
+def test_extract_log_ips_rejects_leading_zeros():
+    # inet_aton会把192.168.001.010按八进制解析为192.168.1.8
+    assert ip_batch._extract_log_ips("client 192.168.001.010 and 010.8.8.8 and 8.8.8.8") == ["8.8.8.8"]
+
+
+def test_log_file_in_input_dir(log_dir, ip_api):
+    (log_dir / "access.log").write_text("8.8.8.8 GET /\n8.8.8.8 GET /a\n1.1.1.1 GET /\n", encoding="utf-8")
+    
+    result = ip_batch.batch_get_ip_locations_sync(path="access.log", group_by="org")
+    
+    assert result.startswith("IP批量归属地统计 (共 2 个IP，出现 3 次")
+
+
+def test_log_file_outside_input_dir(log_dir, tmp_path_factory):
+    outside = tmp_path_factory.mktemp("outside") / "secret.log"
+    outside.write_text("8.8.8.8\n", encoding="utf-8")
+    
+    for path in (str(outside), "../" + outside.parent.name + "/secret.log", "/etc/passwd"):
+        assert "必须位于目录" in ip_batch.batch_get_ip_locations_sync(path=path)
+
+
+def test_timeout_is_bounded(monkeypatch):
+    monkeypatch.setitem(config.ip_batch_config, "timeout", 0.01)
+    
+    async def slow(*args):
+        await asyncio.sleep(1)
+    
+    monkeypatch.setattr(ip_batch, "batch_get_ip_locations", slow)
+    
+    assert "超时" in ip_batch.batch_get_ip_locations_sync("8.8.8.8")
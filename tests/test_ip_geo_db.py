@@ -0,0 +1,91 @@
+"""本地IP地理位置库：CSV编译为索引、二分查找、批量查找和严格的IP解析"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from agents.ip_agent.ip_geo_db import (IndexBackend, IPGeoDatabase, IPGeoDatabaseError, build_index, iter_csv_ranges,
+                                       parse_ipv4)
+
+CSV_DATA = """network,start_ip,end_ip,country_name,city,org
+8.8.8.0/24,,,United States,Mountain View,Google
+,1.0.0.0,1.0.0.255,Australia,Sydney,APNIC
+,10.0.0.0,10.255.255.255,Private,,LAN
+2001:db8::/32,,,Documentation,,TEST-NET
+"""
+
+
+@pytest.fixture
+def geo_db(tmp_path):
+    path = tmp_path / "ranges.csv"
+    path.write_text(CSV_DATA, encoding="utf-8")
+    db = IPGeoDatabase({"db_path": str(path), "index_path": "", "remote_fallback": False})
+    yield db
+    db.close()
+
+
+def test_lookup_ranges(geo_db):
+    assert geo_db.lookup("8.8.8.8")["city"] == "Mountain View"
+    assert geo_db.lookup("1.0.0.255")["country_name"] == "Australia"
+    assert geo_db.lookup("2001:db8::1")["org"] == "TEST-NET"
+    assert geo_db.lookup("::ffff:8.8.8.8")["org"] == "Google"
+    assert geo_db.lookup("9.9.9.9") is None
+    assert geo_db.lookup("not-an-ip") is None
+
+
+def test_lookup_many_matches_lookup(geo_db):
+    ips = ["8.8.8.8", "10.1.2.3", "9.9.9.9", "2001:db8::1", "bad", "1.0.0.1"]
+    assert geo_db.lookup_many(ips) == [geo_db.lookup(ip) for ip in ips]
+
+
+@pytest.mark.parametrize("ip", ["010.8.8.8", "8.8.8.010", "0x8.8.8.8", "8.8.2056", "134744072", "256.8.8.8"])
+def test_lenient_ipv4_forms_are_rejected(geo_db, ip):
+    # inet_aton会把这些形式解析为合法地址（如010.8.8.8 -> 8.8.8.8）
+    assert parse_ipv4(ip) is None
+    assert geo_db.lookup(ip) is None
+    assert geo_db.lookup_many([ip]) == [None]
+
+
+def test_parse_ipv4():
+    assert parse_ipv4("8.8.8.8") == 0x08080808
+    assert parse_ipv4("0.0.0.0") == 0
+    assert parse_ipv4("255.255.255.255") == 0xFFFFFFFF
+
+
+def test_build_index_uses_unique_temp_files(tmp_path):
+    csv_path = tmp_path / "ranges.csv"
+    csv_path.write_text(CSV_DATA, encoding="utf-8")
+    index_path = str(tmp_path / "ranges.idx")
+    
+    # 多个进程同时编译时各自写入临时文件，最终的索引完整且不留下临时文件
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: build_index(iter_csv_ranges(str(csv_path)), index_path), range(8)))
+    
+    assert all(result == results[0] for result in results)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["ranges.csv", "ranges.idx"]
+    db = IPGeoDatabase({"db_path": index_path, "index_path": "", "remote_fallback": False})
+    assert db.lookup("8.8.8.8")["org"] == "Google"
+    db.close()
+
+
+def test_build_index_removes_temp_file_on_failure(tmp_path):
+    def broken_ranges():
+        yield 4, 1, 2, {"country_name": "A"}
+        raise OSError("读取失败")
+    
+    with pytest.raises(OSError):
+        build_index(broken_ranges(), str(tmp_path / "ranges.idx"))
+    
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("truncate", [0, 10, -1])
+def test_empty_or_truncated_index_is_rejected(tmp_path, truncate):
+    csv_path = tmp_path / "ranges.csv"
+    csv_path.write_text(CSV_DATA, encoding="utf-8")
+    index_path = tmp_path / "ranges.idx"
+    build_index(iter_csv_ranges(str(csv_path)), str(index_path))
+    data = index_path.read_bytes()
+    index_path.write_bytes(data[:truncate])
+    
+    with pytest.raises(IPGeoDatabaseError):
+        IndexBackend(str(index_path))
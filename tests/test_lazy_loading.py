@@ -0,0 +1,47 @@
+"""延迟创建Agent和工具：导入和列出工具时不加载autogen和工具模块"""
+import json
+import os
+import subprocess
+import sys
+
+from mcp.tools_registry import ToolsRegistry
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, sys
+from common.agent_manager import agent_manager
+from mcp.tools_registry import tools_registry
+state = {"after_import": "autogen" in sys.modules}
+tools_registry.get_tools_info()
+state["after_tools_info"] = "autogen" in sys.modules or "agents.ip_agent.ip_tools" in sys.modules
+agent_manager.get_agent("ip")
+state["agents_after_get"] = sorted(agent_manager.agents)
+state["autogen_after_get"] = "autogen" in sys.modules
+print(json.dumps(state))
+"""
+
+
+def test_import_does_not_load_autogen():
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, capture_output=True, text=True,
+                            check=True, timeout=120).stdout
+    state = json.loads(output.strip().splitlines()[-1])
+    
+    assert state == {
+        "after_import": False,
+        "after_tools_info": False,
+        "agents_after_get": ["ip"],
+        "autogen_after_get": True,
+    }
+
+
+def test_tool_module_is_imported_on_first_use():
+    registry = ToolsRegistry()
+    names = registry.list_tool_names()
+    
+    assert "weather" in names and "domain_bulk" in names
+    assert registry.get_tools_info()[0]["function_name"] == "get_weather"
+    assert registry._tools == {}
+    
+    assert registry.get_tool_schema("weather")["name"] == "get_weather"
+    assert list(registry._tools) == ["weather"]
@@ -0,0 +1,120 @@
+"""LLM多端点负载均衡：模型名映射、故障转移、熔断和对冲请求"""
+import httpx
+import pytest
+
+from benchmarks.stub_servers import MockLLMStub
+from common.llm_balancer import BALANCER_BASE_URL, CircuitBreaker, LLMLoadBalancer
+
+
+@pytest.fixture
+def endpoints():
+    stubs = [MockLLMStub().start(), MockLLMStub().start()]
+    yield stubs
+    for stub in stubs:
+        stub.stop()
+
+
+def make_balancer(stubs, weights=(1.0, 1.0), **overrides):
+    policy = {
+        "endpoints": [
+            {"name": f"ep{i}", "base_url": f"{stub.base_url}/v1", "api_key": "sk-test",
+             "models": {"deepseek-chat": f"model-{i}"}, "weight": weight}
+            for i, (stub, weight) in enumerate(zip(stubs, weights))
+        ],
+        "strategy": "least_outstanding",
+        "failure_threshold": 2,
+        "reset_timeout": 60,
+        "hedge": False,
+        "hedge_percentile": 95,
+        "hedge_min_samples": 20,
+        "hedge_min_delay": 0.1,
+        **overrides
+    }
+    return LLMLoadBalancer(policy)
+
+
+def chat(balancer):
+    return balancer.http_client.post(
+        f"{BALANCER_BASE_URL}/v1/chat/completions",
+        json={"model": "deepseek-chat", "messages": [{"role": "user", "content": "你好"}]}
+    )
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.on_failure(0)
+    assert breaker.available(0)
+    breaker.on_failure(0)
+    assert breaker.state == "open" and not breaker.available(5)
+    
+    # 熔断超时后放行一个探测请求，探测失败再次熔断
+    assert breaker.available(10)
+    breaker.on_acquire()
+    assert breaker.state == "half_open" and not breaker.available(10)
+    breaker.on_failure(10)
+    assert breaker.state == "open" and breaker.opened == 2
+    breaker.on_acquire()
+    breaker.on_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_requests_are_spread_and_models_mapped(endpoints):
+    balancer = make_balancer(endpoints)
+    try:
+        for _ in range(10):
+            assert chat(balancer).status_code == 200
+    finally:
+        balancer.close()
+    
+    assert endpoints[0].models.get("model-0", 0) + endpoints[1].models.get("model-1", 0) == 10
+    stats = balancer.get_stats()["endpoints"]
+    assert all(endpoint["outstanding"] == 0 for endpoint in stats.values())
+
+
+def test_failover_and_circuit_opening(endpoints):
+    endpoints[0].fail_status = 503
+    # ep0权重较高，未熔断时总是优先选择
+    balancer = make_balancer(endpoints, weights=(2.0, 1.0))
+    try:
+        responses = [chat(balancer) for _ in range(6)]
+    finally:
+        balancer.close()
+    
+    assert all(response.status_code == 200 for response in responses)
+    stats = balancer.get_stats()
+    assert stats["endpoints"]["ep0"]["state"] == "open"
+    assert stats["endpoints"]["ep0"]["failures"] == 2
+    assert stats["failovers"] == 2
+    assert endpoints[1].request_count == 6
+
+
+def test_all_endpoints_failing(endpoints):
+    for stub in endpoints:
+        stub.fail_status = 500
+    balancer = make_balancer(endpoints)
+    try:
+        # 最后一个端点的错误响应原样返回，全部熔断后抛出连接错误
+        assert chat(balancer).status_code == 500
+        assert chat(balancer).status_code == 500
+        with pytest.raises(httpx.ConnectError):
+            chat(balancer)
+    finally:
+        balancer.close()
+
+
+def test_hedged_request_wins_over_slow_endpoint(endpoints):
+    balancer = make_balancer(endpoints, hedge=True, hedge_min_samples=2, hedge_min_delay=0.05)
+    try:
+        for _ in range(4):
+            chat(balancer)
+        balancer.endpoints[1].outstanding += 1
+        endpoints[0].latency = 1.0
+        # ep1的进行中计数较高，首个请求发往变慢的ep0，超过等待时间后对冲到ep1
+        response = chat(balancer)
+        balancer.endpoints[1].outstanding -= 1
+    finally:
+        balancer.close()
+    
+    assert response.status_code == 200
+    assert balancer.get_stats()["hedged"] == 1
+    assert balancer.get_stats()["hedge_wins"] == 1
@@ -0,0 +1,95 @@
+"""LLM响应缓存：精确匹配、近似匹配、过期和LRU淘汰"""
+import json
+import threading
+import time
+
+import pytest
+
+from common.llm_cache import LLMResponseCache, local_embedding
+
+
+def request_key(content, model="deepseek-chat", system="你是天气助手", **extra):
+    """按AutoGen的方式将请求参数序列化为缓存键"""
+    messages = [{"role": "system", "content": system}, {"role": "user", "content": content}]
+    return json.dumps({"model": model, "messages": messages, **extra}, sort_keys=True)
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    caches = []
+    
+    def make(**kwargs):
+        kwargs.setdefault("ttl", 0)
+        kwargs.setdefault("max_entries", 100)
+        kwargs.setdefault("semantic", False)
+        cache = LLMResponseCache(path=str(tmp_path / "llm_cache.db"), **kwargs)
+        caches.append(cache)
+        return cache
+    
+    yield make
+    for cache in caches:
+        cache.close()
+
+
+def test_exact_match_and_persistence(make_cache):
+    cache = make_cache()
+    cache.set(request_key("北京天气怎么样"), {"answer": "晴"})
+    
+    assert cache.get(request_key("北京天气怎么样")) == {"answer": "晴"}
+    # 不影响响应内容的参数不参与缓存键
+    assert cache.get(request_key("北京天气怎么样", cache_seed=42)) == {"answer": "晴"}
+    assert cache.get(request_key("北京天气怎么样", temperature=0.9)) is None
+    assert cache.get(request_key("上海天气怎么样"), "default") == "default"
+    
+    cache.close()
+    assert make_cache().get(request_key("北京天气怎么样")) == {"answer": "晴"}
+    stats = cache.get_stats()
+    assert (stats["exact_hits"], stats["misses"], stats["sets"]) == (2, 2, 1)
+
+
+def test_ttl_expiration(make_cache):
+    cache = make_cache(ttl=0.05)
+    cache.set(request_key("北京天气怎么样"), "晴")
+    time.sleep(0.1)
+    
+    assert cache.get(request_key("北京天气怎么样")) is None
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_lru_eviction(make_cache):
+    cache = make_cache(max_entries=2)
+    cache.set(request_key("a"), "A")
+    cache.set(request_key("b"), "B")
+    time.sleep(0.01)
+    cache.get(request_key("a"))
+    cache.set(request_key("c"), "C")
+    
+    assert cache.get(request_key("b")) is None
+    assert cache.get(request_key("a")) == "A" and cache.get(request_key("c")) == "C"
+    assert cache.get_stats()["evictions"] == 1 and cache.get_stats()["size"] == 2
+
+
+def test_semantic_match_within_scope(make_cache):
+    cache = make_cache(semantic=True, similarity_threshold=0.9, embedding_function=local_embedding)
+    cache.set(request_key("请问北京今天的天气怎么样？"), "晴")
+    
+    assert cache.get(request_key("请问北京今天的天气怎么样")) == "晴"
+    assert cache.get(request_key("查询 8.8.8.8 的归属地")) is None
+    # 系统消息或模型不同时不做近似匹配
+    assert cache.get(request_key("请问北京今天的天气怎么样", system="你是IP助手")) is None
+    assert cache.get(request_key("请问北京今天的天气怎么样", model="other")) is None
+    assert cache.get_stats()["semantic_hits"] == 1
+
+
+def test_unpicklable_value_is_not_cached(make_cache):
+    cache = make_cache()
+    cache.set(request_key("北京天气怎么样"), threading.Lock())
+    
+    assert cache.get(request_key("北京天气怎么样")) is None
+    assert cache.get_stats()["errors"] == 1 and cache.get_stats()["size"] == 0
+
+
+def test_local_embedding_is_normalized():
+    vector = local_embedding("北京天气")
+    assert abs(sum(value * value for value in vector) - 1.0) < 1e-9
+    assert local_embedding("") == [0.0] * len(vector)
@@ -0,0 +1,72 @@
+"""按角色的模型配置和LLM调用指标"""
+from types import SimpleNamespace
+
+from common import agent_manager as agent_manager_module
+from common.config import config
+from common.llm_metrics import SPEAKER_SELECTION_AGENT, LLMMetrics, llm_metrics
+
+START_TIME = "2026-01-01 00:00:00.000000"
+
+
+def response(prompt_tokens=10, completion_tokens=5, model="stub"):
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    return SimpleNamespace(usage=usage, model=model)
+
+
+def test_role_model_overrides(monkeypatch):
+    default = config.get_llm_config()["config_list"][0]
+    monkeypatch.setitem(config.llm_roles_config, "router", {"model": "small", "base_url": "", "api_key": ""})
+    monkeypatch.setitem(config.llm_roles_config, "summary",
+                        {"model": "", "base_url": "http://summary/v1", "api_key": "sk-summary"})
+    
+    router = config.get_llm_config("router")["config_list"][0]
+    summary = config.get_llm_config("summary")["config_list"][0]
+    specialist = config.get_llm_config("specialist")["config_list"][0]
+    
+    assert (router["model"], router["base_url"]) == ("small", default["base_url"])
+    assert (summary["model"], summary["base_url"], summary["api_key"]) == (default["model"], "http://summary/v1", "sk-summary")
+    assert specialist == default
+    assert config.llm_config["config_list"][0] == default
+
+
+def test_record_resolves_roles():
+    metrics = LLMMetrics()
+    wrapper = object()
+    metrics.register_agent("weather_agent", "specialist")
+    metrics.register_wrapper(wrapper, "summary")
+    calls = []
+    metrics.add_listener(calls.append)
+    
+    metrics.record(1, SimpleNamespace(name="weather_agent"), {}, response(), 0, 0.01, START_TIME)
+    metrics.record(2, SPEAKER_SELECTION_AGENT, {}, response(3, 1), 1, 0, START_TIME)
+    metrics.record(id(wrapper), None, {"model": "m"}, "rate limited", 0, 0, START_TIME)
+    metrics.record(3, "unknown", {}, response(), 0, 0, "bad time")
+    metrics.unregister_wrapper(wrapper)
+    metrics.record(id(wrapper), None, {}, response(), 0, 0, START_TIME)
+    
+    stats = metrics.get_stats()
+    assert stats["specialist"]["calls"] == 1 and stats["specialist"]["prompt_tokens"] == 10
+    assert stats["specialist"]["cost"] == 0.01 and stats["specialist"]["p50_latency_s"] is not None
+    assert stats["speaker_selection"]["cached"] == 1 and stats["speaker_selection"]["avg_latency_s"] is None
+    assert stats["summary"]["errors"] == 1 and stats["summary"]["models"] == {"m": 1}
+    assert stats["other"]["calls"] == 2
+    assert [call["role"] for call in calls] == ["specialist", "speaker_selection", "summary", "other", "other"]
+    assert calls[2]["error"] == "rate limited" and calls[3]["latency"] is None
+    
+    metrics.reset()
+    assert metrics.get_stats() == {}
+
+
+def test_summary_call_uses_role_model(monkeypatch, llm_api):
+    monkeypatch.setitem(config.llm_roles_config, "summary", {"model": "summary-model", "base_url": "", "api_key": ""})
+    before = llm_metrics.get_stats().get("summary", {}).get("calls", 0)
+    requests_before = llm_api.models.get("summary-model", 0)
+    
+    answer = agent_manager_module._summarize_tool_output("北京天气怎么样", "北京 晴 25度")
+    
+    assert answer.startswith("mock answer")
+    assert llm_api.models["summary-model"] - requests_before == 1
+    stats = llm_metrics.get_stats()["summary"]
+    assert stats["calls"] - before == 1
+    assert stats["models"]["summary-model"] >= 1
+
@@ -0,0 +1,53 @@
+"""多意图查询的规划和并发执行"""
+import asyncio
+
+import pytest
+
+from common.agent_manager import agent_manager
+from common.config import config
+from common.planner import query_planner
+
+
+def test_plan_splits_independent_intents():
+    plan = [task.to_dict() for task in query_planner.plan("北京天气怎么样，8.8.8.8的归属地，今天是几号")]
+    
+    assert plan == [
+        {"intent": "weather", "kind": "tool", "tool_calls": [{"name": "weather", "arguments": {"city": "Beijing"}}]},
+        {"intent": "ip", "kind": "tool", "tool_calls": [{"name": "ip_location", "arguments": {"ip": "8.8.8.8"}}]},
+        {"intent": "date", "kind": "local"},
+    ]
+
+
+def test_intent_without_tool_mapping_goes_to_agent():
+    plan = query_planner.plan("明天天气适合出门吗，还有8.8.8.8的归属地")
+    
+    assert [task.kind for task in plan] == ["agent", "tool"]
+    assert plan[0].agent_type == "weather" and "天气" in plan[0].message
+
+
+def test_no_plan_for_small_talk():
+    assert query_planner.plan("你好") == []
+
+
+@pytest.fixture
+def no_summary(monkeypatch):
+    monkeypatch.setitem(config.routing_config, "fanout_summarize", False)
+
+
+def test_fanout_runs_subtasks_without_llm(no_summary, llm_api, weather_api, ip_api):
+    before = llm_api.request_count
+    
+    result = asyncio.run(agent_manager.afanout_chat("上海天气怎么样，1.1.1.1的归属地"))
+    
+    assert result.succeeded, result.error
+    assert result.mode == "fanout"
+    assert "【天气】" in result.final_answer and "【IP地址】" in result.final_answer
+    assert "1.1.1.1" in result.final_answer
+    assert llm_api.request_count == before
+
+
+def test_fanout_falls_back_to_route_chat(no_summary, llm_api):
+    result = asyncio.run(agent_manager.afanout_chat("你好"))
+    
+    assert result.metadata["plan"] == []
+    assert result.mode != "fanout"
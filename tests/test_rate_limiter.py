@@ -0,0 +1,77 @@
+"""自适应令牌桶限流器和并发域名状态检测"""
+import asyncio
+import time
+
+import pytest
+
+from agents.domain_agent import domain_tools
+from common.rate_limiter import AdaptiveRateLimiter, is_retryable_status, parse_retry_after
+
+
+def test_rate_is_enforced_after_burst():
+    limiter = AdaptiveRateLimiter(rate=50, burst=5)
+    
+    async def take(count):
+        start = time.monotonic()
+        for _ in range(count):
+            await limiter.acquire()
+        return time.monotonic() - start
+    
+    # 前5个令牌来自突发容量，其余10个按每秒50个发放
+    elapsed = asyncio.run(take(15))
+    assert 0.15 <= elapsed < 0.5
+
+
+def test_backoff_and_recovery():
+    limiter = AdaptiveRateLimiter(rate=10, min_rate=1, recovery_step=1)
+    
+    limiter.on_response(429)
+    limiter.on_response(503)
+    assert limiter.rate == 2.5
+    assert limiter.throttled == 2
+    
+    for _ in range(3):
+        limiter.on_response(200)
+    assert limiter.rate == 5.5
+    
+    for _ in range(20):
+        limiter.on_response(429)
+    assert limiter.rate == 1
+    for _ in range(50):
+        limiter.on_response(200)
+    assert limiter.rate == 10
+
+
+def test_retry_after_pauses_acquire():
+    limiter = AdaptiveRateLimiter(rate=100)
+    
+    async def run():
+        limiter.on_response(429, retry_after=0.1)
+        start = time.monotonic()
+        await limiter.acquire()
+        return time.monotonic() - start
+    
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_helpers():
+    assert is_retryable_status(429) and is_retryable_status(502)
+    assert not is_retryable_status(404)
+    assert parse_retry_after("1.5") == 1.5
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
+    assert parse_retry_after(None) is None
+
+
+def test_batch_status_retries_throttled_requests(domain_api):
+    domain_api.throttle_every = 3
+    domains = [f"s{i}.example.com" for i in range(12)]
+    before = domain_api.request_count
+    
+    result = asyncio.run(domain_tools.batch_check_domains_status(",".join(domains), concurrency=4, rate=200,
+                                                                 output_format="json"))
+    
+    assert "error" not in result
+    for domain in domains:
+        assert domain in result
+    # 每3个请求有1个被限流，重试后全部成功
+    assert domain_api.request_count - before > len(domains)
@@ -0,0 +1,113 @@
+"""ASGI服务：请求校验、超时参数和准入控制"""
+import asyncio
+import json
+
+import pytest
+
+from common.config import config
+from common.conversation import ConversationResult
+from server.app import AgentServerApp
+
+
+class FakeManager:
+    """记录调用参数的Agent管理器替身，delay控制每次对话的耗时"""
+    
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.timeouts = []
+    
+    async def aroute_chat(self, message, timeout=None):
+        self.timeouts.append(timeout)
+        await asyncio.sleep(self.delay)
+        return ConversationResult("route", message)
+    
+    def astream_route_chat(self, message, timeout=None):
+        self.timeouts.append(timeout)
+        
+        async def events():
+            return
+            yield
+        
+        return events()
+
+
+async def call(app, path, body, method="POST"):
+    """以ASGI协议发送一个请求，返回(状态码, 响应体)"""
+    messages = [{"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}]
+    sent = []
+    
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+    
+    async def send(message):
+        sent.append(message)
+    
+    await app({"type": "http", "method": method, "path": path}, receive, send)
+    status = sent[0]["status"]
+    body = b"".join(message.get("body", b"") for message in sent[1:])
+    return status, body
+
+
+def make_app(manager, max_concurrency=4, max_queue=4):
+    server_config = {**config.get_server_config(), "max_concurrency": max_concurrency, "max_queue": max_queue}
+    return AgentServerApp(manager, server_config)
+
+
+def test_unknown_route_and_bad_body():
+    app = make_app(FakeManager())
+    assert asyncio.run(call(app, "/nope", {}))[0] == 404
+    assert asyncio.run(call(app, "/route", {}))[0] == 400
+
+
+@pytest.mark.parametrize("path", ["/route", "/route/stream"])
+@pytest.mark.parametrize("timeout", [0, -5, "10", True, float("nan"), [1]])
+def test_invalid_timeout_is_rejected(path, timeout):
+    manager = FakeManager()
+    status, body = asyncio.run(call(make_app(manager), path, {"message": "你好", "timeout": timeout}))
+    assert status == 400
+    assert "timeout" in json.loads(body)["error"]
+    assert manager.timeouts == []
+
+
+@pytest.mark.parametrize("path", ["/route", "/route/stream"])
+def test_timeout_is_capped_at_chat_timeout(path):
+    manager = FakeManager()
+    app = make_app(manager)
+    
+    assert asyncio.run(call(app, path, {"message": "你好", "timeout": 5}))[0] == 200
+    assert asyncio.run(call(app, path, {"message": "你好", "timeout": 1e9}))[0] == 200
+    assert asyncio.run(call(app, path, {"message": "你好"}))[0] == 200
+    assert manager.timeouts == [5.0, config.get_chat_config()["timeout"], None]
+
+
+def test_admission_rejects_when_queue_is_full():
+    app = make_app(FakeManager(delay=0.2), max_concurrency=1, max_queue=1)
+    
+    async def burst():
+        return await asyncio.gather(*(call(app, "/route", {"message": "你好"}) for _ in range(4)))
+    
+    statuses = sorted(status for status, _ in asyncio.run(burst()))
+    assert statuses == [200, 200, 429, 429]
+    assert app.admission.get_stats()["rejected"] == 2
+
+
+def test_draining_server_returns_503():
+    app = make_app(FakeManager())
+    app.admission.draining = True
+    
+    status, _ = asyncio.run(call(app, "/route", {"message": "你好"}))
+    
+    assert status == 503
+
+
+def test_route_end_to_end(ip_api):
+    app = AgentServerApp()
+    
+    status, body = asyncio.run(call(app, "/route", {"message": "查询 8.8.8.8 的归属地", "timeout": 30}))
+    
+    result = json.loads(body)
+    assert status == 200
+    assert result["metadata"]["fast_path"]["tool_calls"] == [{"name": "ip_location", "arguments": {"ip": "8.8.8.8"}}]
+    assert "8.8.8.8" in result["final_answer"]
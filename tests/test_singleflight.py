@@ -0,0 +1,67 @@
+"""相同参数的并发工具调用合并"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from common.singleflight import SingleFlight
+from mcp.tools_registry import ToolsRegistry
+
+
+def slow_call(release: threading.Event, started: threading.Event, calls: list, value):
+    calls.append(value)
+    started.set()
+    release.wait(5)
+    return f"结果: {value}"
+
+
+def test_concurrent_identical_calls_execute_once():
+    flight = SingleFlight()
+    release, started, calls = threading.Event(), threading.Event(), []
+    
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(flight.do, "k", slow_call, release, started, calls, 1)
+        started.wait(5)
+        followers = [pool.submit(flight.do, "k", slow_call, release, started, calls, 1) for _ in range(3)]
+        while flight.get_stats()["coalesced"] < 3:
+            time.sleep(0.001)
+        release.set()
+        results = [leader.result()] + [future.result() for future in followers]
+    
+    assert results == ["结果: 1"] * 4
+    assert calls == [1]
+    assert flight.get_stats() == {"calls": 4, "executions": 1, "coalesced": 3, "in_flight": 0}
+
+
+def test_errors_are_shared_and_not_remembered():
+    flight = SingleFlight()
+    
+    def fail():
+        raise RuntimeError("boom")
+    
+    with pytest.raises(RuntimeError):
+        flight.do("k", fail)
+    assert flight.do("k", lambda: "ok") == "ok"
+
+
+def test_registry_coalesces_in_flight_tool_calls():
+    release, started, calls = threading.Event(), threading.Event(), []
+    
+    def lookup(ip: str) -> str:
+        return slow_call(release, started, calls, ip)
+    
+    registry = ToolsRegistry()
+    registry.register_tool("lookup", lookup, {"name": "lookup", "parameters": {}})
+    tool = registry.get_tool_function("lookup")
+    
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(tool, "8.8.8.8")]
+        started.wait(5)
+        futures += [pool.submit(tool, "8.8.8.8") for _ in range(2)]
+        while registry.get_coalescing_stats()["lookup"]["coalesced"] < 2:
+            time.sleep(0.001)
+        release.set()
+        assert [future.result() for future in futures] == ["结果: 8.8.8.8"] * 3
+    
+    assert calls == ["8.8.8.8"]
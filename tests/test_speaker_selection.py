@@ -0,0 +1,52 @@
+"""群组聊天的本地发言者选择"""
+import asyncio
+
+import pytest
+
+from common.agent_manager import agent_manager
+from common.config import config
+
+
+def run_group_chat(monkeypatch, speaker_selection, message):
+    monkeypatch.setitem(config.chat_config, "speaker_selection", speaker_selection)
+    return asyncio.run(agent_manager.arun_group_chat(message))
+
+
+@pytest.mark.parametrize("message", ["北京天气怎么样", "请查询北京的天气和8.8.8.8的归属地"])
+def test_local_selection_avoids_llm_calls(monkeypatch, llm_api, weather_api, ip_api, message):
+    before = llm_api.calls_by_kind["speaker_selection"]
+    
+    result = run_group_chat(monkeypatch, "local", message)
+    
+    assert result.succeeded, result.error
+    stats = result.metadata["speaker_selection"]
+    assert stats["local"] > 0 and stats["llm_fallback"] == 0
+    assert llm_api.calls_by_kind["speaker_selection"] == before
+    speakers = [entry["name"] for entry in result.transcript]
+    assert "weather_assistant" in speakers
+
+
+def test_multi_intent_chat_is_summarized(monkeypatch, llm_api, weather_api, ip_api):
+    result = run_group_chat(monkeypatch, "local", "请查询北京的天气和8.8.8.8的归属地")
+    
+    speakers = [entry["name"] for entry in result.transcript if entry.get("content")]
+    assert {"weather_assistant", "ip_assistant"} <= set(speakers)
+    assert speakers[-1] == "general_assistant"
+
+
+def test_unknown_intent_falls_back_to_llm(monkeypatch, llm_api):
+    before = llm_api.calls_by_kind["speaker_selection"]
+    
+    result = run_group_chat(monkeypatch, "local", "你好")
+    
+    assert result.metadata["speaker_selection"]["llm_fallback"] > 0
+    assert llm_api.calls_by_kind["speaker_selection"] > before
+
+
+def test_auto_selection_uses_llm(monkeypatch, llm_api, weather_api):
+    before = llm_api.calls_by_kind["speaker_selection"]
+    
+    result = run_group_chat(monkeypatch, "auto", "北京天气怎么样")
+    
+    assert "speaker_selection" not in result.metadata
+    assert llm_api.calls_by_kind["speaker_selection"] > before
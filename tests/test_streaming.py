@@ -0,0 +1,59 @@
+"""流式对话事件"""
+import asyncio
+import json
+
+import pytest
+
+from common.agent_manager import agent_manager
+from common.streaming import StreamEvent
+
+
+def test_sse_encoding():
+    event = StreamEvent("token", agent="weather_agent", content="晴")
+    
+    assert event.to_sse() == 'event: token\ndata: {"type": "token", "agent": "weather_agent", "content": "晴"}\n\n'.encode()
+    assert StreamEvent("done").to_dict() == {"type": "done"}
+
+
+@pytest.fixture
+def tiktoken_encoding():
+    """AutoGen流式输出时用tiktoken统计token，编码文件需联网下载，无法获取时跳过"""
+    tiktoken = pytest.importorskip("tiktoken")
+    try:
+        tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        pytest.skip(f"tiktoken编码不可用: {e}")
+
+
+def test_stream_chat_emits_tool_and_token_events(llm_api, weather_api, tiktoken_encoding):
+    events = list(agent_manager.stream_chat("weather", "杭州天气怎么样"))
+    types = [event.type for event in events]
+    
+    assert types[-1] == "done"
+    assert types.index("tool_call") < types.index("tool_result") < types.index("done")
+    assert "token" in types
+    tool_call = events[types.index("tool_call")]
+    assert tool_call.data["name"] == "get_weather"
+    assert json.loads(tool_call.data["arguments"]) == {"city": "Hangzhou"}
+    assert events[-1].data["error"] is None
+
+
+def test_stopping_iteration_cancels_the_conversation(llm_api, weather_api, tiktoken_encoding):
+    async def first_event():
+        stream = agent_manager.astream_chat("weather", "杭州天气怎么样")
+        async for event in stream:
+            await stream.aclose()
+            return event
+    
+    assert asyncio.run(first_event()).type in ("token", "message", "tool_call")
+
+
+def test_fast_path_stream_without_llm(ip_api):
+    async def collect():
+        return [event async for event in agent_manager.astream_route_chat("查询 1.1.1.1 的归属地")]
+    
+    events = asyncio.run(collect())
+    
+    assert [event.type for event in events] == ["tool_call", "tool_result", "message", "done"]
+    assert "1.1.1.1" in events[1].content
+    assert events[-1].data["final_answer"] == events[2].content
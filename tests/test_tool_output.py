@@ -0,0 +1,72 @@
+"""工具输出格式：紧凑表格、JSON和送入LLM上下文的格式选择"""
+import json
+
+import pytest
+
+from agents.domain_agent import domain_tools
+from common.tool_output import check_output_format, parse_fields, render, render_table
+from mcp.tools_registry import ToolsRegistry
+
+ROWS = [
+    {"domain": "a.com", "status": 1, "owner": "x|y", "remark": None},
+    {"domain": "b.com", "status": 0, "owner": "", "remark": None},
+]
+
+
+@pytest.fixture(autouse=True)
+def clear_domain_cache():
+    domain_tools._domain_info_cache.clear()
+    yield
+    domain_tools._domain_info_cache.clear()
+
+
+def test_check_output_format():
+    assert check_output_format("compact") == "compact"
+    with pytest.raises(ValueError):
+        check_output_format("xml")
+
+
+def test_parse_fields():
+    available = ("domain", "status", "owner")
+    assert parse_fields("", available) == list(available)
+    assert parse_fields("status, domain,nope", available) == ["status", "domain"]
+    assert parse_fields("nope", available) == list(available)
+
+
+def test_render_table_escapes_separators():
+    assert render_table([{"a": "1|2", "b": "x\ny"}, {"a": None}], ("a", "b")) == "a|b\n1/2|x y\n|"
+
+
+def test_render_omits_empty_columns_and_values():
+    columns = ("domain", "status", "owner", "remark")
+    assert render(ROWS, columns, "compact") == "domain|status|owner\na.com|1|x/y\nb.com|0|"
+    assert json.loads(render(ROWS, columns, "json")) == [
+        {"domain": "a.com", "status": 1, "owner": "x|y"},
+        {"domain": "b.com", "status": 0},
+    ]
+
+
+def test_domain_info_formats(domain_api):
+    text = domain_tools.batch_get_domains_info_sync("a.example.com,b.example.com")
+    compact = domain_tools.batch_get_domains_info_sync("a.example.com,b.example.com", "domain,owner", "compact")
+    data = json.loads(domain_tools.batch_get_domains_info_sync("a.example.com", "domain,status", "json"))
+    
+    assert compact == "domain|owner\na.example.com|stub\nb.example.com|stub"
+    assert len(compact) < len(text)
+    assert data == [{"domain": "a.example.com", "status": 1}]
+
+
+def test_llm_output_format_is_applied_to_agent_calls(domain_api):
+    registry = ToolsRegistry()
+    registry.output_config["llm_format"] = "compact"
+    tool = registry.get_llm_tool_function("domain_status")
+    
+    assert tool("a.example.com").startswith("domain|status|available|msg")
+    
+    registry.set_llm_output_format("domain_status", "json")
+    assert json.loads(tool("a.example.com"))[0]["domain"] == "a.example.com"
+    
+    # 直接调用时仍为面向用户的文本格式
+    assert registry.get_tool_function("domain_status")("a.example.com").startswith("域名状态批量检测结果")
+    with pytest.raises(ValueError):
+        registry.set_llm_output_format("domain_status", "xml")
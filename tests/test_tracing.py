@@ -0,0 +1,127 @@
+"""调用链路追踪：span树、延迟分布、JSON导出和对话的完整链路"""
+import asyncio
+import json
+
+import pytest
+
+from common.agent_manager import agent_manager
+from common.llm_metrics import llm_metrics
+from common.tracing import Tracer, format_trace, tracer as global_tracer
+
+
+@pytest.fixture
+def make_tracer(tmp_path):
+    tracers = []
+    
+    def make(**overrides):
+        tracing_config = {
+            "enabled": True,
+            "exporter": "none",
+            "json_path": str(tmp_path / "traces.jsonl"),
+            "otlp_endpoint": "http://localhost:4318",
+            "service_name": "test",
+            "histogram_window": 100,
+            "max_traces": 2,
+            **overrides
+        }
+        tracer = Tracer(tracing_config)
+        tracers.append(tracer)
+        return tracer
+    
+    yield make
+    for tracer in tracers:
+        if tracer.enabled:
+            llm_metrics._listeners.remove(tracer.record_llm_call)
+        tracer.close()
+
+
+def collect_kinds(trace):
+    kinds = {trace["kind"]}
+    for child in trace.get("children", []):
+        kinds |= collect_kinds(child)
+    return kinds
+
+
+def test_nested_spans_and_errors(make_tracer):
+    tracer = make_tracer()
+    
+    with tracer.span("conversation.chat", "conversation", agent_type="weather") as root:
+        with tracer.span("tool.weather", "tool"):
+            pass
+        with pytest.raises(RuntimeError):
+            with tracer.span("http.api", "http"):
+                raise RuntimeError("boom")
+    
+    assert tracer.current_span() is None
+    trace = tracer.get_recent_traces()[0]
+    assert trace["span_id"] == root.span_id and trace["attributes"] == {"agent_type": "weather"}
+    assert [child["name"] for child in trace["children"]] == ["tool.weather", "http.api"]
+    assert trace["children"][1]["status"] == "error" and trace["children"][1]["error"] == "boom"
+    assert {child["trace_id"] for child in trace["children"]} == {trace["trace_id"]}
+    assert format_trace(trace)[2].startswith("  http.api") and "❌ boom" in format_trace(trace)[2]
+
+
+def test_histograms_and_trace_limit(make_tracer):
+    tracer = make_tracer()
+    for _ in range(3):
+        with tracer.span("conversation.chat", "conversation"):
+            with tracer.span("tool.weather", "tool"):
+                pass
+    span = tracer.start_span("llm.router", "llm")
+    tracer.end_span(span, duration=0.25)
+    tracer.end_span(span, duration=1.0)
+    
+    histograms = tracer.get_histograms()
+    assert list(histograms) == ["conversation.chat", "llm.router", "tool.weather"]
+    assert histograms["tool.weather"]["count"] == 3
+    assert histograms["llm.router"]["count"] == 1 and histograms["llm.router"]["p99_ms"] == 250.0
+    assert tracer.get_stats()["traces"] == 2
+    
+    tracer.reset()
+    assert tracer.get_histograms() == {} and tracer.get_recent_traces() == []
+
+
+def test_llm_calls_are_attached_to_current_span(make_tracer):
+    tracer = make_tracer()
+    call = {"role": "specialist", "model": "m", "start_time": None, "latency": None, "is_cached": False,
+            "prompt_tokens": 10, "completion_tokens": 3, "cost": 0.0, "error": None}
+    
+    with tracer.span("conversation.chat", "conversation"):
+        with tracer.span("agent.weather_agent", "agent"):
+            tracer.record_llm_call(call)
+            tracer.record_llm_call(call)
+    
+    trace = tracer.get_recent_traces()[0]
+    assert trace["attributes"] == {"llm_calls": 2, "prompt_tokens": 20, "completion_tokens": 6}
+    assert [child["name"] for child in trace["children"][0]["children"]] == ["llm.specialist"] * 2
+
+
+def test_json_exporter(make_tracer, tmp_path):
+    tracer = make_tracer(exporter="json")
+    with tracer.span("conversation.chat", "conversation"):
+        with tracer.span("tool.weather", "tool"):
+            pass
+    
+    lines = (tmp_path / "traces.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["children"][0]["name"] == "tool.weather"
+    assert tracer.get_stats()["exporter"]["exported"] == 1
+
+
+def test_disabled_and_invalid_exporter(make_tracer):
+    tracer = make_tracer(enabled=False)
+    with tracer.span("conversation.chat", "conversation") as span:
+        assert span is None
+    assert tracer.get_histograms() == {}
+    with pytest.raises(ValueError):
+        make_tracer(exporter="zipkin")
+
+
+def test_conversation_trace(llm_api, weather_api):
+    result = asyncio.run(agent_manager.achat_with_agent("weather", "杭州天气怎么样"))
+    
+    trace = next(trace for trace in global_tracer.get_recent_traces()
+                 if trace["attributes"].get("conversation_id") == result.conversation_id)
+    assert trace["name"] == "conversation.chat" and trace["status"] == "ok"
+    assert {"agent", "llm", "tool"} <= collect_kinds(trace)
+    assert trace["attributes"]["llm_calls"] >= 2
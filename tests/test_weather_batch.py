@@ -0,0 +1,72 @@
+"""多城市天气查询：并发查询、按城市缓存和部分失败"""
+import json
+
+import pytest
+
+from agents.weather_agent import weather_tools
+from mcp.tools_registry import ToolsRegistry
+
+
+@pytest.fixture(autouse=True)
+def clear_weather_cache():
+    weather_tools._weather_cache.clear()
+    yield
+    weather_tools._weather_cache.clear()
+
+
+def test_batch_dedupes_and_reuses_city_cache(weather_api):
+    weather_tools.get_weather_sync("Beijing")
+    before = weather_api.request_count
+    
+    result = weather_tools.get_weather_batch_sync("beijing，Shanghai、 Guangzhou ;SHANGHAI")
+    
+    assert result.startswith("多城市天气对比 (共 3 个城市)")
+    assert weather_api.request_count - before == 2
+    assert weather_tools.normalize_weather_batch_args("beijing，Shanghai、SHANGHAI") == ("beijing", "shanghai")
+
+
+def test_partial_failure_keeps_other_cities(weather_api):
+    weather_api.fail_cities = {"Atlantis"}
+    
+    result = weather_tools.get_weather_batch_sync("Beijing,Atlantis", "json")
+    
+    marker, rows = result.split("\n\n", 1)
+    assert marker == f"{weather_tools.WEATHER_PARTIAL_PREFIX}: Atlantis"
+    rows = json.loads(rows)
+    assert rows[0] == {"city": "Beijing", "weather": "晴", "temp_c": 21.5, "humidity": 40, "wind_speed": 3.2}
+    assert rows[1] == {"city": "Atlantis", "error": "获取天气信息失败: 404"}
+    # 失败的城市不写入缓存
+    weather_api.fail_cities = set()
+    assert "error" not in json.loads(weather_tools.get_weather_batch_sync("Atlantis", "json"))[0]
+
+
+def test_partial_failure_is_not_cached(weather_api):
+    weather_api.fail_cities = {"Atlantis"}
+    registry = ToolsRegistry()
+    tool = registry.get_tool_function("weather_batch")
+    
+    result = tool("Beijing,Atlantis")
+    
+    assert result.startswith(weather_tools.WEATHER_PARTIAL_PREFIX)
+    assert "Beijing | 晴" in result
+    assert registry.get_cache_stats()["weather_batch"]["size"] == 0
+    
+    # 上游恢复后再次调用只补查失败的城市，成功的城市来自单城市缓存
+    weather_api.fail_cities = set()
+    before = weather_api.request_count
+    result = tool("Beijing,Atlantis")
+    
+    assert result.startswith("多城市天气对比 (共 2 个城市)")
+    assert weather_api.request_count - before == 1
+    assert registry.get_cache_stats()["weather_batch"]["size"] == 1
+
+
+def test_all_failed_returns_error(weather_api):
+    weather_api.fail_cities = {"Atlantis", "Lemuria"}
+    registry = ToolsRegistry()
+    
+    result = registry.get_tool_function("weather_batch")("Atlantis,Lemuria")
+    
+    assert result.startswith(weather_tools.WEATHER_ERROR_PREFIXES)
+    assert registry.get_cache_stats()["weather_batch"]["size"] == 0
+    assert weather_tools.get_weather_batch_sync(" ,、") == "天气查询错误: 请提供至少一个城市名称"